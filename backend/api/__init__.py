@@ -4,12 +4,21 @@ API Routes Module
 Senior Python Developer - RESTful API Design
 """
 
+import hmac
+import json
 import logging
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, Response, render_template, request, jsonify, current_app, stream_with_context
 
 from core import AIAgent, RequestProcessor
+from core.cache import ResponseCache
+from core.metrics import metrics
+from core.profiler import profiler, profile_command
+from core.quota import QuotaExceeded
+from core.singleflight import SingleFlight
+from core.tracing import tracer
 from services import GeminiService
+from services.batch import BatchRunner
 from config import SYSTEM_PROMPTS
 
 logger = logging.getLogger(__name__)
@@ -18,11 +27,431 @@ logger = logging.getLogger(__name__)
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 
-def init_api(app, gemini_service: GeminiService, config):
+def init_api(app, gemini_service: GeminiService, config, response_cache: ResponseCache = None):
     """Initialize API with services"""
     app.register_blueprint(api_bp)
     app.gemini_service = gemini_service
+    app.response_cache = response_cache
     app.config_obj = config
+    # Identical concurrent analyses share one Gemini call
+    app.analysis_flight = SingleFlight(wait_timeout=config.COALESCE_WAIT_TIMEOUT)
+    app.batch_runner = BatchRunner(
+        gemini_service,
+        max_workers=config.BATCH_MAX_WORKERS,
+        pack_size=config.BATCH_PACK_SIZE,
+        pack_max_chars=config.BATCH_PACK_MAX_CHARS
+    )
+    # Component statistics exported by /api/metrics
+    if response_cache is not None:
+        metrics.register_collector('response_cache', response_cache.stats)
+    metrics.register_collector('gemini', gemini_service.stats)
+    metrics.register_collector('coalescing', app.analysis_flight.stats)
+
+
+# ==================== SHARED HANDLER LOGIC ====================
+# Used by the Flask views below and by the ASGI routes in api/asgi.py,
+# so both serving modes keep the same JSON contract.
+
+class InputError(Exception):
+    """Invalid request payload (reported as a plain 400)"""
+
+
+def health_payload(app, is_healthy: bool) -> tuple:
+    """
+    Build the health check response
+    
+    Returns:
+        Tuple of (payload, status_code)
+    """
+    cache = app.response_cache
+    return {
+        'status': 'healthy' if is_healthy else 'unhealthy',
+        'service': 'IsItTrue AI Agent',
+        'version': '4.0',
+        'timestamp': datetime.now().isoformat(),
+        'ai_model': app.config_obj.AI_MODEL,
+        'cache': cache.stats() if cache is not None else None,
+        'gemini': app.gemini_service.stats(),
+        'coalescing': app.analysis_flight.stats(),
+    }, 200 if is_healthy else 503
+
+
+def admin_authorized(app, headers) -> bool:
+    """True when the request carries the configured X-Admin-Token"""
+    token = getattr(app.config_obj, 'ADMIN_TOKEN', '')
+    given = headers.get('x-admin-token') or ''
+    return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+
+def trace_forced(app, headers) -> bool:
+    """Admin requests sent with `X-Trace: 1` are always traced"""
+    return headers.get('x-trace') == '1' and admin_authorized(app, headers)
+
+
+def parse_analyze_request(data: dict, app) -> dict:
+    """
+    Validate an analysis payload and resolve type, prompt and cache key
+    
+    Args:
+        data: Decoded JSON body
+        app: Flask application holding the services
+        
+    Returns:
+        Analysis job dictionary
+        
+    Raises:
+        InputError: If the text is missing or invalid
+    """
+    # Extract and validate text
+    is_valid, result = AIAgent.validate_input(data.get('text', ''))
+    if not is_valid:
+        logger.warning(f"Invalid input: {result}")
+        raise InputError(result)
+    
+    text = result
+    
+    # Get optional parameters
+    request_type = data.get('request_type')
+    temperature = float(data.get('temperature', 0.7))
+    
+    logger.info(f"📊 Analyze request: text_len={len(text)}, type={request_type}")
+    
+    # Auto-detect request type if not specified
+    if not request_type:
+        request_type = AIAgent.detect_request_type(text)
+        logger.info(f"🔍 Auto-detected type: {request_type}")
+    
+    # Validate request type
+    if request_type not in SYSTEM_PROMPTS:
+        request_type = 'general_chat'
+    
+    # Get system prompt
+    system_prompt = SYSTEM_PROMPTS.get(request_type)
+    
+    # Same key for the response cache and in-flight coalescing
+    key = ResponseCache.make_key(
+        text, request_type, temperature,
+        app.config_obj.AI_MODEL, system_prompt
+    )
+    
+    return {
+        'text': text,
+        'request_type': request_type,
+        'temperature': temperature,
+        'system_prompt': system_prompt,
+        'key': key,
+        'cache_key': key if app.response_cache is not None else None,
+    }
+
+
+def lookup_cached_response(app, job: dict):
+    """Serve repeated claims from the response cache (None on miss)"""
+    if job['cache_key'] is None:
+        return None
+    
+    ai_response = app.response_cache.get(job['cache_key'])
+    if ai_response is not None:
+        logger.info(f"⚡ Cache hit ({job['request_type']})")
+    return ai_response
+
+
+async def lookup_cached_response_async(app, job: dict):
+    """Async counterpart of lookup_cached_response (disk tier off the event loop)"""
+    if job['cache_key'] is None:
+        return None
+    
+    ai_response = await app.response_cache.get_async(job['cache_key'])
+    if ai_response is not None:
+        logger.info(f"⚡ Cache hit ({job['request_type']})")
+    return ai_response
+
+
+def store_cached_response(app, job: dict, ai_response: str) -> None:
+    """Store a freshly generated response"""
+    if job['cache_key'] is not None:
+        app.response_cache.set(job['cache_key'], ai_response)
+
+
+async def store_cached_response_async(app, job: dict, ai_response: str) -> None:
+    """Async counterpart of store_cached_response"""
+    if job['cache_key'] is not None:
+        await app.response_cache.set_async(job['cache_key'], ai_response)
+
+
+def generate_analysis(app, job: dict) -> str:
+    """
+    Generate and cache a response, sharing one Gemini call between
+    identical concurrent requests (threaded Flask path)
+    
+    Raises:
+        TimeoutError: If a duplicate waited too long for the first request
+    """
+    @metrics.timed('analysis')
+    def generate():
+        logger.info(f"Calling Gemini AI ({job['request_type']})...")
+        ai_response = app.gemini_service.generate_response(
+            prompt=job['text'],
+            system_prompt=job['system_prompt'],
+            temperature=job['temperature']
+        )
+        store_cached_response(app, job, ai_response)
+        return ai_response
+    
+    return app.analysis_flight.do(job['key'], generate)
+
+
+async def generate_analysis_async(app, job: dict) -> str:
+    """Async counterpart of generate_analysis (ASGI path)"""
+    @metrics.timed('analysis')
+    async def generate():
+        logger.info(f"Calling Gemini AI async ({job['request_type']})...")
+        ai_response = await app.gemini_service.generate_response_async(
+            prompt=job['text'],
+            system_prompt=job['system_prompt'],
+            temperature=job['temperature']
+        )
+        await store_cached_response_async(app, job, ai_response)
+        return ai_response
+    
+    return await app.analysis_flight.do_async(job['key'], generate)
+
+
+def build_analyze_response(app, job: dict, ai_response: str, cached: bool) -> dict:
+    """Format a successful analysis response"""
+    response_data = RequestProcessor.format_response(
+        result=ai_response,
+        request_type=job['request_type'],
+        metadata={
+            'timestamp': datetime.now().isoformat(),
+            'model': app.config_obj.AI_MODEL,
+            'cached': cached,
+        }
+    )
+    logger.info(f"✅ Analysis complete: {job['request_type']}")
+    return response_data
+
+
+def analyze_error_response(e: Exception) -> tuple:
+    """
+    Map an analysis exception to an error response
+    
+    Returns:
+        Tuple of (payload, status_code)
+    """
+    metrics.inc('api_errors_total', error=type(e).__name__)
+    if isinstance(e, InputError):
+        return {'success': False, 'error': str(e)}, 400
+    
+    if isinstance(e, QuotaExceeded):
+        logger.warning(f"⏳ Quota exceeded, retry after {e.retry_after:.0f}s")
+        payload = RequestProcessor.format_error(str(e), 'QUOTA_EXCEEDED')
+        payload['retry_after'] = int(e.retry_after) + 1
+        return payload, 429
+    
+    if isinstance(e, TimeoutError):
+        logger.warning(f"⏳ {e}")
+        return RequestProcessor.format_error(str(e), 'TIMEOUT'), 504
+    
+    if isinstance(e, ValueError):
+        logger.warning(f"⚠️ Validation error: {e}")
+        return RequestProcessor.format_error(str(e), 'VALIDATION_ERROR'), 400
+    
+    logger.error(f"❌ Analysis error: {e}", exc_info=e)
+    return RequestProcessor.format_error(
+        f"Analysis failed: {str(e)[:100]}",
+        'PROCESSING_ERROR'
+    ), 500
+
+
+def analyze_batch_response(app, data: dict) -> tuple:
+    """
+    Analyze a list of items in one request
+    
+    Items are validated and typed one by one; identical items and cache
+    hits are answered without extra Gemini calls, the rest run on the
+    bounded batch pool (optionally packed several per prompt).
+    
+    Args:
+        data: {"items": [str | {"text", "request_type", "temperature"}], "pack": bool}
+        
+    Returns:
+        Tuple of (payload, status_code), results in input order
+    """
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise InputError("❌ 'items' must be a non-empty list")
+    
+    max_items = app.config_obj.BATCH_MAX_ITEMS
+    if len(items) > max_items:
+        raise InputError(f"❌ Batch exceeds {max_items} items")
+    
+    results = [None] * len(items)
+    jobs = {}
+    pending = {}  # content key -> indexes waiting for it
+    cached_count = 0
+    
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'text': item}
+        try:
+            if not isinstance(item, dict):
+                raise InputError("❌ Item must be a string or an object")
+            job = parse_analyze_request(item, app)
+        except Exception as e:
+            payload, status = analyze_error_response(e)
+            results[index] = dict(payload, index=index, status=status)
+            continue
+        
+        ai_response = lookup_cached_response(app, job)
+        if ai_response is not None:
+            cached_count += 1
+            results[index] = dict(build_analyze_response(app, job, ai_response, True), index=index)
+            continue
+        
+        jobs.setdefault(job['key'], job)
+        pending.setdefault(job['key'], []).append(index)
+    
+    answers, run_stats = app.batch_runner.run(
+        jobs,
+        lambda job: generate_analysis(app, job),
+        pack=bool(data.get('pack', False))
+    )
+    
+    for key, indexes in pending.items():
+        answer = answers[key]
+        if isinstance(answer, Exception):
+            payload, status = analyze_error_response(answer)
+            entry = dict(payload, status=status)
+        else:
+            entry = build_analyze_response(app, jobs[key], answer, False)
+        for index in indexes:
+            results[index] = dict(entry, index=index)
+    
+    stats = {
+        'items': len(items),
+        'unique': len(jobs),
+        'cached': cached_count,
+        'gemini_calls': run_stats['gemini_calls'],
+        'packed': run_stats['packed'],
+        'failed': sum(1 for r in results if not r.get('success')),
+    }
+    logger.info(f"📦 Batch complete: {stats}")
+    return {'success': True, 'results': results, 'stats': stats}, 200
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+}
+
+
+def stream_analysis_events(app, job: dict):
+    """
+    Generate the SSE events of a streamed analysis
+    
+    Events: meta (type/model/cached), chunk ({"delta": text}) as Gemini
+    produces text, then done (the regular /api/analyze response) or error.
+    
+    Yields:
+        Formatted SSE events
+    """
+    ai_response = lookup_cached_response(app, job)
+    cached = ai_response is not None
+    yield sse_event('meta', {
+        'type': job['request_type'],
+        'model': app.config_obj.AI_MODEL,
+        'cached': cached,
+    })
+    
+    if cached:
+        yield sse_event('chunk', {'delta': ai_response})
+    else:
+        logger.info(f"Streaming Gemini AI ({job['request_type']})...")
+        parts = []
+        try:
+            for delta in app.gemini_service.generate_response_stream(
+                prompt=job['text'],
+                system_prompt=job['system_prompt'],
+                temperature=job['temperature']
+            ):
+                parts.append(delta)
+                yield sse_event('chunk', {'delta': delta})
+        except Exception as e:
+            payload, _ = analyze_error_response(e)
+            yield sse_event('error', payload)
+            return
+        
+        ai_response = ''.join(parts) or "No response generated"
+        store_cached_response(app, job, ai_response)
+    
+    yield sse_event('done', build_analyze_response(app, job, ai_response, cached))
+
+
+def detect_type_response(data: dict) -> tuple:
+    """
+    Detect the request type of a payload
+    
+    Returns:
+        Tuple of (payload, status_code)
+    """
+    text = data.get('text', '').strip()
+    
+    if not text:
+        return {
+            'success': False,
+            'error': 'Text required'
+        }, 400
+    
+    detected_type, scores = AIAgent.score_request_types(text)
+    
+    return {
+        'success': True,
+        'detected_type': detected_type,
+        'scores': scores,
+        'text_length': len(text)
+    }, 200
+
+
+def detect_type_batch_response(data: dict, max_items: int) -> tuple:
+    """
+    Detect the request type of several texts
+    
+    Args:
+        data: {"texts": ["...", ...]}
+        max_items: Maximum number of texts
+        
+    Returns:
+        Tuple of (payload, status_code), results in input order
+    """
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return {'success': False, 'error': "'texts' must be a non-empty list"}, 400
+    if len(texts) > max_items:
+        return {'success': False, 'error': f"Batch exceeds {max_items} texts"}, 400
+    
+    results = []
+    for index, text in enumerate(texts):
+        text = text.strip() if isinstance(text, str) else ''
+        if not text:
+            results.append({'index': index, 'success': False, 'error': 'Text required'})
+            continue
+        detected_type, scores = AIAgent.score_request_types(text)
+        results.append({
+            'index': index,
+            'success': True,
+            'detected_type': detected_type,
+            'scores': scores,
+            'text_length': len(text),
+        })
+    
+    return {'success': True, 'results': results}, 200
 
 
 # ==================== PUBLIC ROUTES ====================
@@ -32,14 +461,8 @@ def health_check():
     """Health check endpoint"""
     try:
         is_healthy = current_app.gemini_service.health_check()
-        
-        return jsonify({
-            'status': 'healthy' if is_healthy else 'unhealthy',
-            'service': 'IsItTrue AI Agent',
-            'version': '4.0',
-            'timestamp': datetime.now().isoformat(),
-            'ai_model': current_app.config_obj.AI_MODEL,
-        }), 200 if is_healthy else 503
+        payload, status = health_payload(current_app, is_healthy)
+        return jsonify(payload), status
     
     except Exception as e:
         logger.error(f"Health check failed: {e}")
@@ -49,6 +472,33 @@ def health_check():
         }), 500
 
 
+@api_bp.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics (text exposition format)"""
+    return Response(metrics.render(), mimetype=METRICS_CONTENT_TYPE)
+
+
+@api_bp.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """
+    On-demand profiling of live requests (requires X-Admin-Token)
+    
+    POST   {"mode": "stacks|cprofile", "seconds": 30, "sample_rate": 0.1, "interval_ms": 5}
+    GET    hottest functions (?format=raw: collapsed stacks / pstats listing)
+    DELETE stop the session and report
+    """
+    if not getattr(current_app.config_obj, 'ADMIN_TOKEN', ''):
+        return not_found(None)
+    if not admin_authorized(current_app, request.headers):
+        return jsonify({'success': False, 'error': 'Forbidden', 'error_code': 'FORBIDDEN'}), 403
+    
+    if request.method == 'GET' and request.args.get('format') == 'raw':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    payload, status = profile_command(request.method, request.get_json(silent=True) or {},
+                                      request.args.get('limit', 30, type=int))
+    return jsonify(payload), status
+
+
 @api_bp.route('/analyze', methods=['POST'])
 def analyze():
     """
@@ -62,71 +512,71 @@ def analyze():
         "temperature": "float 0-1 (optional, default: 0.7)"
     }
     """
-    try:
-        # Get JSON data
-        data = request.get_json() or {}
-        
-        # Extract and validate text
-        is_valid, result = AIAgent.validate_input(data.get('text', ''))
-        if not is_valid:
-            logger.warning(f"Invalid input: {result}")
-            return jsonify({
-                'success': False,
-                'error': result
-            }), 400
-        
-        text = result
-        
-        # Get optional parameters
-        request_type = data.get('request_type')
-        temperature = float(data.get('temperature', 0.7))
-        image_data = data.get('image')  # Optional image data
-        
-        logger.info(f"📊 Analyze request: text_len={len(text)}, type={request_type}")
-        
-        # Auto-detect request type if not specified
-        if not request_type:
-            request_type = AIAgent.detect_request_type(text)
-            logger.info(f"🔍 Auto-detected type: {request_type}")
-        
-        # Validate request type
-        if request_type not in SYSTEM_PROMPTS:
-            request_type = 'general_chat'
+    with tracer.trace('api.analyze', force=trace_forced(current_app, request.headers), mode='wsgi') as span, \
+            profiler.profile():
+        try:
+            job = parse_analyze_request(request.get_json() or {}, current_app)
+            
+            ai_response = lookup_cached_response(current_app, job)
+            cached = ai_response is not None
+            if span is not None:
+                span.set(request_type=job['request_type'], cached=cached)
+            if not cached:
+                # Generate response from Gemini
+                ai_response = generate_analysis(current_app, job)
+            
+            response, status = jsonify(build_analyze_response(current_app, job, ai_response, cached)), 200
         
-        # Get system prompt
-        system_prompt = SYSTEM_PROMPTS.get(request_type)
-        
-        # Generate response from Gemini
-        logger.info(f"Calling Gemini AI ({request_type})...")
-        ai_response = current_app.gemini_service.generate_response(
-            prompt=text,
-            system_prompt=system_prompt,
-            temperature=temperature
-        )
-        
-        # Format and return response
-        response_data = RequestProcessor.format_response(
-            result=ai_response,
-            request_type=request_type,
-            metadata={
-                'timestamp': datetime.now().isoformat(),
-                'model': current_app.config_obj.AI_MODEL,
-            }
-        )
-        
-        logger.info(f"✅ Analysis complete: {request_type}")
-        return jsonify(response_data), 200
+        except Exception as e:
+            payload, status = analyze_error_response(e)
+            response = jsonify(payload)
     
-    except ValueError as e:
-        logger.warning(f"⚠️ Validation error: {e}")
-        return jsonify(RequestProcessor.format_error(str(e), 'VALIDATION_ERROR')), 400
+    if span is not None and span.kept:
+        response.headers['X-Trace-Id'] = span.trace_id
+    return response, status
+
+
+@api_bp.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Batch analysis endpoint
     
+    POST /api/analyze/batch
+    {
+        "items": ["claim", {"text": "claim", "request_type": "fact_check"}],
+        "pack": false  (optional, pack short same-type claims per prompt)
+    }
+    """
+    try:
+        payload, status = analyze_batch_response(current_app._get_current_object(), request.get_json() or {})
+        return jsonify(payload), status
+    
+    except Exception as e:
+        payload, status = analyze_error_response(e)
+        return jsonify(payload), status
+
+
+@api_bp.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    """
+    Streaming analysis endpoint (Server-Sent Events)
+    
+    POST /api/analyze/stream
+    Same body as /api/analyze. Emits `meta`, then `chunk` events with
+    {"delta": "..."} as text is generated, then `done` or `error`.
+    """
+    try:
+        job = parse_analyze_request(request.get_json() or {}, current_app)
     except Exception as e:
-        logger.error(f"❌ Analysis error: {e}", exc_info=True)
-        return jsonify(RequestProcessor.format_error(
-            f"Analysis failed: {str(e)[:100]}",
-            'PROCESSING_ERROR'
-        )), 500
+        payload, status = analyze_error_response(e)
+        return jsonify(payload), status
+    
+    events = stream_analysis_events(current_app._get_current_object(), job)
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
 
 
 @api_bp.route('/analyze', methods=['OPTIONS'])
@@ -146,22 +596,30 @@ def detect_type():
     }
     """
     try:
-        data = request.get_json() or {}
-        text = data.get('text', '').strip()
-        
-        if not text:
-            return jsonify({
-                'success': False,
-                'error': 'Text required'
-            }), 400
-        
-        detected_type = AIAgent.detect_request_type(text)
-        
-        return jsonify({
-            'success': True,
-            'detected_type': detected_type,
-            'text_length': len(text)
-        }), 200
+        payload, status = detect_type_response(request.get_json() or {})
+        return jsonify(payload), status
+    
+    except Exception as e:
+        logger.error(f"Type detection error: {e}")
+        return jsonify(RequestProcessor.format_error(str(e))), 500
+
+
+@api_bp.route('/detect-type/batch', methods=['POST'])
+def detect_type_batch():
+    """
+    Detect request types of many texts in one call
+    
+    POST /api/detect-type/batch
+    {
+        "texts": ["string", ...]
+    }
+    """
+    try:
+        payload, status = detect_type_batch_response(
+            request.get_json() or {},
+            current_app.config_obj.DETECT_BATCH_MAX_ITEMS
+        )
+        return jsonify(payload), status
     
     except Exception as e:
         logger.error(f"Type detection error: {e}")
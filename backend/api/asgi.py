@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI Serving Module - Native coroutine routes for the API
+Senior Python Developer - Async Serving
+
+/api/analyze, /api/analyze/stream, /api/detect-type(/batch) and
+/api/health run as coroutines on the event loop, so an analysis waiting
+on Gemini holds no worker thread.
+Every other route (web UI, static files, preflight) is delegated to the
+Flask application through a WSGI adapter.
+"""
+
+import json
+import logging
+from asgiref.wsgi import WsgiToAsgi
+
+from core import RequestProcessor
+from core.tracing import tracer
+from api import (
+    health_payload,
+    parse_analyze_request,
+    lookup_cached_response_async,
+    store_cached_response_async,
+    generate_analysis_async,
+    build_analyze_response,
+    analyze_error_response,
+    detect_type_response,
+    detect_type_batch_response,
+    sse_event,
+    trace_forced,
+    SSE_HEADERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsgiApp:
+    """ASGI application serving the API routes natively"""
+
+    def __init__(self, flask_app):
+        """
+        Wrap a Flask application created by create_app()
+
+        Args:
+            flask_app: Configured Flask application
+        """
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.max_body = flask_app.config.get('MAX_CONTENT_LENGTH')
+        self.routes = {
+            ('GET', '/api/health'): self.health_check,
+            ('POST', '/api/analyze'): self.analyze,
+            ('POST', '/api/detect-type'): self.detect_type,
+            ('POST', '/api/detect-type/batch'): self.detect_type_batch,
+        }
+        self.stream_routes = {
+            ('POST', '/api/analyze/stream'): self.analyze_stream,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        handler = stream_handler = None
+        if scope['type'] == 'http':
+            route = (scope['method'], scope['path'].rstrip('/') or '/')
+            handler = self.routes.get(route)
+            stream_handler = self.stream_routes.get(route)
+
+        if handler is None and stream_handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        try:
+            body = await self._read_body(receive)
+        except OverflowError:
+            await self._send_json(send, {'error': 'Request payload too large'}, 413)
+            return
+
+        if stream_handler is not None:
+            await stream_handler(body, send)
+            return
+
+        headers = {k.decode('latin-1'): v.decode('latin-1') for k, v in scope['headers']}
+        name = scope['path'].strip('/').replace('/', '.')
+        with tracer.trace(name, force=trace_forced(self.flask_app, headers), mode='asgi') as span:
+            payload, status = await handler(body)
+        extra = [(b'x-trace-id', span.trace_id.encode())] if span is not None and span.kept else []
+        await self._send_json(send, payload, status, extra)
+
+    # ==================== ROUTES ====================
+
+    async def health_check(self, body: bytes) -> tuple:
+        """Health check endpoint"""
+        try:
+            is_healthy = await self.flask_app.gemini_service.health_check_async()
+            return health_payload(self.flask_app, is_healthy)
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            return {'status': 'error', 'error': str(e)}, 500
+
+    async def analyze(self, body: bytes) -> tuple:
+        """Main analysis endpoint (same contract as the Flask view)"""
+        app = self.flask_app
+        try:
+            job = parse_analyze_request(self._decode_json(body), app)
+
+            ai_response = await lookup_cached_response_async(app, job)
+            cached = ai_response is not None
+            if not cached:
+                ai_response = await generate_analysis_async(app, job)
+
+            return build_analyze_response(app, job, ai_response, cached), 200
+
+        except Exception as e:
+            return analyze_error_response(e)
+
+    async def analyze_stream(self, body: bytes, send) -> None:
+        """Streaming analysis endpoint (Server-Sent Events)"""
+        app = self.flask_app
+        try:
+            job = parse_analyze_request(self._decode_json(body), app)
+        except Exception as e:
+            payload, status = analyze_error_response(e)
+            await self._send_json(send, payload, status)
+            return
+
+        headers = [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'access-control-allow-origin', b'*'),
+        ]
+        headers += [(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+        async for event in self._analysis_events(job):
+            await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _analysis_events(self, job: dict):
+        """Async counterpart of api.stream_analysis_events"""
+        app = self.flask_app
+        ai_response = await lookup_cached_response_async(app, job)
+        cached = ai_response is not None
+        yield sse_event('meta', {
+            'type': job['request_type'],
+            'model': app.config_obj.AI_MODEL,
+            'cached': cached,
+        })
+
+        if cached:
+            yield sse_event('chunk', {'delta': ai_response})
+        else:
+            logger.info(f"Streaming Gemini AI async ({job['request_type']})...")
+            parts = []
+            try:
+                async for delta in app.gemini_service.generate_response_stream_async(
+                    prompt=job['text'],
+                    system_prompt=job['system_prompt'],
+                    temperature=job['temperature']
+                ):
+                    parts.append(delta)
+                    yield sse_event('chunk', {'delta': delta})
+            except Exception as e:
+                payload, _ = analyze_error_response(e)
+                yield sse_event('error', payload)
+                return
+
+            ai_response = ''.join(parts) or "No response generated"
+            await store_cached_response_async(app, job, ai_response)
+
+        yield sse_event('done', build_analyze_response(app, job, ai_response, cached))
+
+    async def detect_type(self, body: bytes) -> tuple:
+        """Detect request type without analyzing"""
+        try:
+            return detect_type_response(self._decode_json(body))
+        except Exception as e:
+            logger.error(f"Type detection error: {e}")
+            return RequestProcessor.format_error(str(e)), 500
+
+    async def detect_type_batch(self, body: bytes) -> tuple:
+        """Detect request types of many texts"""
+        try:
+            return detect_type_batch_response(
+                self._decode_json(body),
+                self.flask_app.config_obj.DETECT_BATCH_MAX_ITEMS
+            )
+        except Exception as e:
+            logger.error(f"Type detection error: {e}")
+            return RequestProcessor.format_error(str(e)), 500
+
+    # ==================== PROTOCOL HELPERS ====================
+
+    async def _read_body(self, receive) -> bytes:
+        """Read the request body, enforcing MAX_CONTENT_LENGTH"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if self.max_body and size > self.max_body:
+                raise OverflowError(size)
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    def _decode_json(body: bytes) -> dict:
+        """Decode a JSON object body (empty or invalid -> {})"""
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    async def _send_json(send, payload: dict, status: int, extra_headers: list = ()) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json; charset=utf-8'),
+                (b'content-length', str(len(body)).encode()),
+                (b'access-control-allow-origin', b'*'),
+                *extra_headers,
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _lifespan(receive, send) -> None:
+        """Acknowledge server startup/shutdown events"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
@@ -3,6 +3,10 @@
 IsItTrue - Friendly AI Agent Backend
 Senior Python Developer - Professional Architecture v4.0
 
+Serving:
+- WSGI (default) → `python app.py` or any WSGI server with `app:app`
+- ASGI           → `SERVER_MODE=asgi python app.py` or `uvicorn app:asgi_app`
+
 Structure:
 - core/        → AI Agent logic, request processing
 - api/         → REST API endpoints
@@ -18,9 +22,14 @@ from flask_cors import CORS
 from pathlib import Path
 
 # Import configuration and services
-from config import active_config, LOGGING_CONFIG, SYSTEM_PROMPTS
+from config import active_config, LOGGING_CONFIG, SYSTEM_PROMPTS, CACHE_CONFIG, QUOTA_CONFIG, TRACING_CONFIG, CASSETTE_CONFIG
 from services import GeminiService
+from core.cache import ResponseCache
+from core.cassette import cassette
+from core.quota import QuotaGovernor
+from core.tracing import tracer
 from api import init_api
+from api.asgi import AsgiApp
 
 # ==================== LOGGING SETUP ====================
 
@@ -64,20 +73,57 @@ def create_app(config=None):
     
     # ==================== SERVICE INITIALIZATION ====================
     
+    # Cross-process Gemini quota (token buckets in SQLite)
+    quota = None
+    if QUOTA_CONFIG['enabled']:
+        quota = QuotaGovernor(
+            db_path=QUOTA_CONFIG['db_path'],
+            requests_per_minute=QUOTA_CONFIG['requests_per_minute'],
+            tokens_per_minute=QUOTA_CONFIG['tokens_per_minute'],
+            max_wait=QUOTA_CONFIG['max_wait']
+        )
+    
     # Initialize Gemini Service
     try:
         app.gemini_service = GeminiService(
             api_key=config.__dict__.get('GOOGLE_API_KEY') or __import__('config').GOOGLE_API_KEY,
-            model=config.AI_MODEL
+            model=config.AI_MODEL,
+            max_concurrency=config.GEMINI_MAX_CONCURRENCY,
+            quota=quota
         )
     except ValueError as e:
         logger.error(f"[ERROR] Failed to initialize Gemini: {e}")
         raise
     
+    # Initialize response cache (memory LRU + optional SQLite tier)
+    response_cache = None
+    if CACHE_CONFIG['enabled']:
+        response_cache = ResponseCache(
+            max_entries=CACHE_CONFIG['max_entries'],
+            ttl=CACHE_CONFIG['ttl'],
+            db_path=CACHE_CONFIG['db_path']
+        )
+    
+    # Request-scoped spans (JSONL), off unless TRACE_FILE is set
+    if TRACING_CONFIG['trace_file']:
+        tracer.configure(
+            TRACING_CONFIG['trace_file'],
+            sample_rate=TRACING_CONFIG['sample_rate'],
+            slow_ms=TRACING_CONFIG['slow_ms']
+        )
+    
+    # Recorded upstream responses, off unless CASSETTE_MODE is set
+    if CASSETTE_CONFIG['mode'] != 'off':
+        cassette.configure(
+            CASSETTE_CONFIG['mode'],
+            CASSETTE_CONFIG['path'],
+            latency_scale=CASSETTE_CONFIG['latency_scale']
+        )
+    
     # ==================== BLUEPRINT REGISTRATION ====================
     
     # Register API blueprints
-    init_api(app, app.gemini_service, config)
+    init_api(app, app.gemini_service, config, response_cache)
     
     # ==================== ROUTE: WEB UI ====================
     
@@ -118,6 +164,8 @@ def create_app(config=None):
         logger.info(f"Environment: {__import__('config').ENVIRONMENT}")
         logger.info(f"Debug Mode: {app.debug}")
         logger.info(f"AI Model: {config.AI_MODEL}")
+        logger.info(f"Response Cache: {'ON' if response_cache is not None else 'OFF'}")
+        logger.info(f"Quota Governor: {'ON' if quota is not None else 'OFF'}")
         logger.info("=" * 70)
         logger.info("🎯 Capabilities:")
         logger.info("  ✓ Fact-Checking")
@@ -131,17 +179,45 @@ def create_app(config=None):
     return app
 
 
+def create_asgi_app(flask_app=None, config=None):
+    """
+    Async serving mode: wrap the Flask app in an ASGI application
+    
+    /api/analyze, /api/detect-type and /api/health run as coroutines;
+    all other routes are served by Flask.
+    
+    Args:
+        flask_app: Application from create_app() (created if None)
+        config: Configuration object used when creating the app
+        
+    Returns:
+        ASGI application
+    """
+    if flask_app is None:
+        flask_app = create_app(config)
+    return AsgiApp(flask_app)
+
+
 # ==================== APPLICATION ENTRY POINT ====================
 
 # Create the application instance
 app = create_app(active_config)
 
+# ASGI entry point (uvicorn app:asgi_app)
+asgi_app = create_asgi_app(app)
+
 if __name__ == '__main__':
-    # Run Flask development server
-    app.run(
-        host='0.0.0.0',
-        port=5000,
-        debug=active_config.DEBUG,
-        use_reloader=active_config.DEBUG
-    )
+    if active_config.SERVER_MODE == 'asgi':
+        import uvicorn
+        
+        # Run ASGI server (async API routes)
+        uvicorn.run(asgi_app, host='0.0.0.0', port=5000)
+    else:
+        # Run Flask development server
+        app.run(
+            host='0.0.0.0',
+            port=5000,
+            debug=active_config.DEBUG,
+            use_reloader=active_config.DEBUG
+        )
 
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark - perceptual image index
+
+Fills a PerceptualIndex with random 64-bit hashes and times lookups of
+near-duplicates (a few bits flipped) and of unknown images, compared with
+a linear Hamming scan over the same entries.
+
+Usage (from backend/):
+    python benchmarks/bench_image_index.py [--entries 300000] [--lookups 5000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.perceptual import PerceptualIndex
+
+
+def flip(value, bits, rng):
+    for bit in rng.sample(range(64), bits):
+        value ^= 1 << bit
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=300000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--distance', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    index = PerceptualIndex(':memory:', max_distance=args.distance)
+    hashes = [rng.getrandbits(64) for _ in range(args.entries)]
+
+    start = time.perf_counter()
+    for phash in hashes:
+        index.add(phash, 'verdict')
+    print(f"Indexed {len(index):,} entries in {time.perf_counter() - start:.1f}s")
+
+    near = [flip(rng.choice(hashes), rng.randint(0, args.distance), rng) for _ in range(args.lookups)]
+    unknown = [rng.getrandbits(64) for _ in range(args.lookups)]
+
+    for label, queries in (('near-duplicate', near), ('unknown', unknown)):
+        start = time.perf_counter()
+        found = sum(index.lookup(phash) is not None for phash in queries)
+        elapsed = (time.perf_counter() - start) / len(queries) * 1e6
+        print(f"{label:<15} {elapsed:>8.1f} µs/lookup  ({found}/{len(queries)} found)")
+
+    sample = unknown[:20]
+    start = time.perf_counter()
+    for phash in sample:
+        min((phash ^ other).bit_count() for other in hashes)
+    print(f"{'linear scan':<15} {(time.perf_counter() - start) / len(sample) * 1e6:>8.1f} µs/lookup")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark - request type detection
+
+Compares the compiled single-pass intent classifier with the previous
+implementation (one re.search per raw pattern string per call).
+
+Usage (from backend/):
+    python benchmarks/bench_intent.py [--calls 200000]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.intent import intent_classifier
+
+# Previous implementation, kept here as the baseline
+LEGACY_PATTERNS = {
+    'fact_check': [
+        r'\b(is it|are|true|false|verify|fact.?check|correct|accurate|real|fake)\b',
+        r'\b(claim|myth|rumor|hoax|misinformation|false claim)\b',
+        r'^(is|are|do|does|can|will|should)\s',
+        r'\b(true or false|yes or no|correct or incorrect)\b',
+    ],
+    'ai_detection': [
+        r'\b(ai|artificial intelligence|chatgpt|gpt|generated|wrote by)\b',
+        r'\b(detect|identify|find|check if).*\b(ai|artificial|machine|generated)\b',
+        r'\b(ai.?generated|ai.?written|written by ai|generated by ai)\b',
+    ],
+}
+
+
+def legacy_detect(text):
+    text_lower = text.lower().strip()
+    scores = {'fact_check': 0, 'ai_detection': 0}
+    for req_type, patterns in LEGACY_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, text_lower):
+                scores[req_type] += 1
+    max_score = max(scores.values())
+    if max_score == 0:
+        return 'general_chat'
+    for req_type, score in scores.items():
+        if score == max_score:
+            return req_type
+    return 'general_chat'
+
+
+SAMPLES = [
+    ("Is it true that the Eiffel Tower is being sold?", 'fact_check'),
+    ("Was this text written by AI or a human? It reads very smoothly.", 'ai_detection'),
+    ("What is the capital of Australia?", 'general_chat'),
+    ("Est-ce vrai que le gouvernement va supprimer les retraites ?", 'fact_check'),
+    ("Ce texte a-t-il été généré par une IA ?", 'ai_detection'),
+    ("Bonjour, peux-tu m'expliquer la photosynthèse ?", 'general_chat'),
+    ("هل هذا الخبر صحيح؟ يقولون إن المدارس ستغلق غدا", 'fact_check'),
+    ("هل هذا النص مكتوب بالذكاء الاصطناعي؟", 'ai_detection'),
+    ("ما هي عاصمة المغرب؟", 'general_chat'),
+    ("Fake news: drinking hot water cures the flu, please fact-check", 'fact_check'),
+]
+
+
+def bench(fn, texts, calls):
+    start = time.perf_counter()
+    n = len(texts)
+    for i in range(calls):
+        fn(texts[i % n])
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    texts = [text for text, _ in SAMPLES]
+    # Longer inputs (pasted articles) dominate real traffic cost
+    long_texts = [(text + ' ') * 40 for text in texts]
+
+    print(f"Compiled classifier: {intent_classifier.pattern_count} patterns, compiled lexicon")
+    print(f"{'input':<8} {'legacy µs/call':>15} {'compiled µs/call':>17} {'speedup':>8}")
+    for label, batch in (('short', texts), ('long', long_texts)):
+        legacy = bench(legacy_detect, batch, args.calls)
+        compiled = bench(lambda t: intent_classifier.classify(t)[0], batch, args.calls)
+        print(f"{label:<8} {legacy:>15.2f} {compiled:>17.2f} {legacy / compiled:>7.1f}x")
+
+    print("\nAccuracy on the multilingual samples:")
+    for name, fn in (('legacy', legacy_detect), ('compiled', lambda t: intent_classifier.classify(t)[0])):
+        correct = sum(fn(text) == expected for text, expected in SAMPLES)
+        print(f"  {name:<9} {correct}/{len(SAMPLES)}")
+
+
+if __name__ == '__main__':
+    main()
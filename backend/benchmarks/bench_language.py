@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark - language detection
+
+Compares the previous detection (plain langdetect.detect, unseeded) with
+LanguageDetector: uncached (script fast path, stopwords, seeded
+langdetect) and memoized (the same text seen again, e.g. handler + pipeline).
+Also counts samples whose detected language changes between runs.
+
+Usage (from backend/):
+    python benchmarks/bench_language.py [--calls 2000] [--runs 10]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from langdetect import detect, DetectorFactory
+
+from modules.language_detector import LanguageDetector
+
+SAMPLES = [
+    ("Est-ce vrai ?", 'fr'),
+    ("ok merci", 'fr'),
+    ("info ou intox", 'fr'),
+    ("is this true?", 'en'),
+    ("hola, ¿es verdad?", 'es'),
+    ("Ist das wahr?", 'de'),
+    ("è vero?", 'it'),
+    ("Bonjour, peux-tu vérifier cette information sur les retraites ?", 'fr'),
+    ("Fake news: drinking hot water cures the flu, please fact-check", 'en'),
+    ("Le gouvernement a annoncé hier une hausse des impôts de dix pour cent "
+     "pour l'année prochaine selon plusieurs sources concordantes.", 'fr'),
+    ("The prime minister announced yesterday that taxes will rise by ten "
+     "percent next year according to several matching sources.", 'en'),
+    ("هل هذا الخبر صحيح؟ يقولون إن المدارس ستغلق غدا", 'ar'),
+    ("Это правда, что школы закроются завтра?", 'ru'),
+    ("これは本当ですか", 'ja'),
+    ("这是真的吗", 'zh-cn'),
+    ("이거 사실이야?", 'ko'),
+    ("Είναι αλήθεια;", 'el'),
+]
+
+
+def legacy_detect(text):
+    if not text or len(text.strip()) < 3:
+        return 'fr'
+    try:
+        return detect(text)
+    except Exception:
+        return 'fr'
+
+
+def bench(fn, texts, calls):
+    n = len(texts)
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(texts[i % n])
+    return calls / (time.perf_counter() - start)
+
+
+def unstable(fn, texts, runs):
+    """Number of texts whose result differs between runs"""
+    return sum(len({fn(text) for _ in range(runs)}) > 1 for text in texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    texts = [text for text, _ in SAMPLES]
+    memoized = lambda text: LanguageDetector.detect_language(text)[0]
+
+    # The previous code ran langdetect without a seed
+    DetectorFactory.seed = None
+    legacy_rate = bench(legacy_detect, texts, args.calls)
+    legacy_unstable = unstable(legacy_detect, texts, args.runs)
+    legacy_correct = sum(legacy_detect(text) == expected for text, expected in SAMPLES)
+    DetectorFactory.seed = 0
+
+    uncached_rate = bench(LanguageDetector.identify_language, texts, args.calls)
+    memoized_rate = bench(memoized, texts, args.calls)
+
+    print(f"{'detector':<10} {'detections/s':>14} {'unstable':>9} {'correct':>8}")
+    print(f"{'legacy':<10} {legacy_rate:>14,.0f} {legacy_unstable:>9} {legacy_correct:>5}/{len(SAMPLES)}")
+    print(f"{'uncached':<10} {uncached_rate:>14,.0f} "
+          f"{unstable(LanguageDetector.identify_language, texts, args.runs):>9} "
+          f"{sum(LanguageDetector.identify_language(t) == e for t, e in SAMPLES):>5}/{len(SAMPLES)}")
+    print(f"{'memoized':<10} {memoized_rate:>14,.0f} {unstable(memoized, texts, args.runs):>9} "
+          f"{sum(memoized(t) == e for t, e in SAMPLES):>5}/{len(SAMPLES)}")
+    print(f"\nMemo: {LanguageDetector.cache_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load benchmark - /api/analyze and the Telegram message handler, offline
+
+Runs the real request paths against local stand-ins (fake_upstreams.py)
+for Gemini, DuckDuckGo, article sites and the Telegram Bot API, each with
+configurable latency and failure rate. For every concurrency level, that
+many requests are kept in flight until --requests have completed; the run
+reports throughput, p50/p95/p99 latency and the slowest pipeline stages.
+Thresholds (--max-p95, --min-rps...) make the exit status 1 on regression.
+
+Scenarios:
+    api-asgi   POST /api/analyze on the ASGI app (in-process transport)
+    api-wsgi   POST /api/analyze on the Flask app (one thread per slot)
+    bot        Telegram text messages through the update processor and
+               handle_message (--url-ratio of them carry an article link)
+
+Every request uses a distinct claim, so caches and coalescing only help
+when --repeat-ratio asks for repeats. The quota governor, response cache
+and image index are off unless set otherwise in the environment. All
+fake sites share one host, so the bot's HTTP_MAX_PER_HOST applies to them
+together.
+
+Usage (from backend/):
+    python benchmarks/bench_load.py --scenario api-asgi bot --concurrency 1 8 32
+    python benchmarks/bench_load.py --scenario bot --gemini-ms 1500 --gemini-errors 0.05 --max-p95 4000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Before any application import: no real keys, no shared quota, no caches
+BENCH_ENV = {
+    'GEMINI_API_KEY': 'bench',
+    'GOOGLE_API_KEY': 'bench',
+    'TELEGRAM_TOKEN': '1:bench',
+    'FLASK_ENV': 'production',
+    'QUOTA_ENABLED': 'False',
+    'RESPONSE_CACHE_ENABLED': 'False',
+    'IMAGE_INDEX_ENABLED': 'False',
+    'METRICS_DUMP_INTERVAL': '0',
+    'BOT_DISPATCH_STATS_INTERVAL': '0',
+}
+for name, value in BENCH_ENV.items():
+    os.environ.setdefault(name, value)
+
+from core.metrics import metrics
+from fake_upstreams import FakeGemini, FakeUpstreams, Latency, UpstreamServer
+
+SCENARIOS = ('api-asgi', 'api-wsgi', 'bot')
+
+CLAIMS = [
+    "La Terre est plate selon une nouvelle étude",
+    "Le vaccin contient une puce électronique",
+    "Drinking hot water cures the flu",
+    "El gobierno prohíbe el efectivo desde enero",
+    "Die Regierung verbietet Bargeld ab Januar",
+    "Le prix de l'essence va doubler la semaine prochaine",
+]
+
+# Stages reported after each level (p50/p95), when they ran
+REPORTED_STAGES = (
+    'analysis', 'gemini_api', 'process_input_stream', 'prepare_input', 'web_search',
+    'fetch_url', 'html_extract', 'detect_language', 'quota_wait', 'gemini_stream',
+)
+
+
+def claim(level, i, repeat_ratio, rng):
+    """Distinct claim for request i, or an earlier one of the same level"""
+    if i and rng.random() < repeat_ratio:
+        i = rng.randrange(i)
+    return f"{CLAIMS[i % len(CLAIMS)]} (cas {level}-{i})"
+
+
+def percentile(ordered, q):
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rps': round(count / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 1) if count else 0.0,
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 1) if count else 0.0,
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 1) if count else 0.0,
+        'max_ms': round(ordered[-1] * 1000, 1) if count else 0.0,
+    }
+
+
+async def run_level(call, count, concurrency):
+    """
+    Keep `concurrency` calls in flight until `count` have completed
+
+    Args:
+        call: async callable(i) -> bool (success)
+
+    Returns:
+        tuple: (latencies in seconds, failed calls, elapsed seconds)
+    """
+    latencies = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < count:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"request {i} failed: {e}")
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+# ==================== SCENARIOS ====================
+
+class ApiScenario:
+    """POST /api/analyze, natively on the ASGI app or through Flask threads"""
+
+    def __init__(self, mode, gemini, args):
+        import httpx
+        import app as app_module
+
+        self.mode = mode
+        self.args = args
+        self.flask_app = app_module.app
+        self.flask_app.gemini_service.model = gemini
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.asgi_app),
+                                        base_url='http://bench', timeout=None)
+        self.executor = None
+        self.rng = random.Random(args.seed)
+
+    def prepare(self, level, concurrency):
+        self.level = level
+        if self.mode == 'wsgi':
+            if self.executor is not None:
+                self.executor.shutdown()
+            self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    def _post_wsgi(self, payload):
+        return self.flask_app.test_client().post('/api/analyze', json=payload).status_code
+
+    async def call(self, i):
+        payload = {'text': claim(self.level, i, self.args.repeat_ratio, self.rng)}
+        if self.mode == 'wsgi':
+            status = await asyncio.get_running_loop().run_in_executor(self.executor, self._post_wsgi, payload)
+        else:
+            status = (await self.client.post('/api/analyze', json=payload)).status_code
+        return status == 200
+
+    def errors(self, count, call_errors):
+        return call_errors, {}
+
+    async def close(self):
+        await self.client.aclose()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class BotScenario:
+    """Text messages through the update processor and handle_message"""
+
+    def __init__(self, gemini, upstreams, base_url, args):
+        import modules.analyzer as analyzer
+        import modules.web_tools as web_tools
+        from telegram_bot_simple import build_application
+
+        analyzer.model = gemini
+        analyzer.model_for_instruction = lambda system_instruction: None
+        web_tools.DDG_HTML_URL = f"{base_url}/html/"
+
+        self.args = args
+        self.base_url = base_url
+        self.upstreams = upstreams
+        self.application = build_application(updater=False, base_url=f"{base_url}/bot")
+        self.rng = random.Random(args.seed)
+        self.update_id = 0
+
+    async def start(self):
+        await self.application.initialize()
+
+    def prepare(self, level, concurrency):
+        self.level = level
+        self.upstreams.bot_api.calls.clear()
+        self.dropped_before = self._dropped()
+
+    def _dropped(self):
+        stats = getattr(self.application.update_processor, 'stats', None)
+        return stats()['dropped'] if stats else 0
+
+    def _update(self, i):
+        from telegram import Update
+
+        self.update_id += 1
+        text = claim(self.level, i, self.args.repeat_ratio, self.rng)
+        if self.rng.random() < self.args.url_ratio:
+            text = f"C'est vrai ? {self.base_url}/article/{self.level}-{i}"
+        chat_id = 100000 + (i % self.args.chats if self.args.chats else self.update_id)
+        return Update.de_json({
+            'update_id': self.update_id,
+            'message': {
+                'message_id': self.update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+                'text': text,
+            },
+        }, self.application.bot)
+
+    async def call(self, i):
+        update = self._update(i)
+        await self.application.update_processor.process_update(update, self.application.process_update(update))
+        # handle_message reports failures to the chat: success is judged from the replies
+        return True
+
+    def errors(self, count, call_errors):
+        """Updates without a complete verdict among the Bot API calls"""
+        answered = {
+            params.get('message_id')
+            for method, params in list(self.upstreams.bot_api.calls)
+            if method == 'editMessageText' and FakeGemini.MARKER in params.get('text', '')
+        }
+        return count - len(answered), {'dropped_updates': self._dropped() - self.dropped_before}
+
+    async def close(self):
+        await self.application.shutdown()
+        from modules.http_client import close_http_client
+        await close_http_client()
+
+
+# ==================== RUN ====================
+
+def stage_summary():
+    snapshot = metrics.snapshot().get('stages', {})
+    return {
+        name: {'p50_ms': snapshot[name]['p50_ms'], 'p95_ms': snapshot[name]['p95_ms']}
+        for name in REPORTED_STAGES if name in snapshot and snapshot[name]['count']
+    }
+
+
+def check_thresholds(name, concurrency, result, args):
+    failures = []
+    limits = [
+        ('p95_ms', args.max_p95, '>'),
+        ('p99_ms', args.max_p99, '>'),
+        ('error_rate', args.max_error_rate, '>'),
+        ('rps', args.min_rps, '<'),
+    ]
+    for key, limit, op in limits:
+        if limit is None:
+            continue
+        value = result[key]
+        if (op == '>' and value > limit) or (op == '<' and value < limit):
+            failures.append(f"{name} c={concurrency}: {key} {value} {op} {limit}")
+    return failures
+
+
+async def run(args):
+    gemini = FakeGemini(Latency(args.gemini_ms, args.jitter, args.gemini_errors, args.seed),
+                        quota_error_rate=args.gemini_429, seed=args.seed)
+    upstreams = FakeUpstreams(
+        search=Latency(args.search_ms, args.jitter, args.search_errors, args.seed),
+        article=Latency(args.article_ms, args.jitter, args.article_errors, args.seed),
+        telegram=Latency(args.telegram_ms, args.jitter, 0.0, args.seed),
+        article_kb=args.article_kb,
+    )
+    server = UpstreamServer(upstreams)
+    base_url = server.start()
+
+    results = []
+    failures = []
+    print(f"{'scenario':<10} {'conc':>5} {'reqs':>6} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    try:
+        for name in args.scenario:
+            if name == 'bot':
+                scenario = BotScenario(gemini, upstreams, base_url, args)
+                await scenario.start()
+            else:
+                scenario = ApiScenario(name.split('-')[1], gemini, args)
+
+            try:
+                if args.warmup:
+                    scenario.prepare('warmup', 1)
+                    await run_level(scenario.call, args.warmup, 1)
+
+                for concurrency in args.concurrency:
+                    scenario.prepare(f"c{concurrency}", concurrency)
+                    metrics.reset()
+                    count = max(args.requests, concurrency)
+                    latencies, call_errors, elapsed = await run_level(scenario.call, count, concurrency)
+                    errors, extra = scenario.errors(count, call_errors)
+                    result = dict(scenario=name, concurrency=concurrency,
+                                  **summarize(latencies, errors, elapsed), **extra)
+                    result['stages'] = stage_summary()
+                    results.append(result)
+                    failures += check_thresholds(name, concurrency, result, args)
+
+                    print(f"{name:<10} {concurrency:>5} {result['requests']:>6} {errors:>6} {result['rps']:>8.1f} "
+                          f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                          f"{result['max_ms']:>9.1f}"
+                          + (f"  dropped={extra['dropped_updates']}" if extra.get('dropped_updates') else ''))
+                    if args.stages and result['stages']:
+                        print('    ' + ', '.join(f"{stage} {values['p50_ms']:.0f}/{values['p95_ms']:.0f}"
+                                              for stage, values in result['stages'].items())
+                              + '  (p50/p95 ms)')
+            finally:
+                await scenario.close()
+    finally:
+        server.stop()
+
+    print(f"Fake Gemini calls: {dict(gemini.calls)}, upstream requests: {dict(upstreams.requests)}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.json}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=['api-asgi', 'bot'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=100, help='completed requests per level')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured requests before each scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat-ratio', type=float, default=0.0, help='fraction of requests repeating a claim')
+    parser.add_argument('--url-ratio', type=float, default=0.5, help='bot messages carrying an article link')
+    parser.add_argument('--chats', type=int, default=0, help='spread bot messages over N chats (0 = one per message)')
+
+    upstream = parser.add_argument_group('fake upstreams (latencies in ms, error rates 0-1)')
+    upstream.add_argument('--jitter', type=float, default=0.25, help='delays vary uniformly by ± this fraction')
+    upstream.add_argument('--gemini-ms', type=float, default=400)
+    upstream.add_argument('--gemini-errors', type=float, default=0.0, help='500 responses')
+    upstream.add_argument('--gemini-429', type=float, default=0.0, help='429 quota responses')
+    upstream.add_argument('--search-ms', type=float, default=150)
+    upstream.add_argument('--search-errors', type=float, default=0.0)
+    upstream.add_argument('--article-ms', type=float, default=200)
+    upstream.add_argument('--article-errors', type=float, default=0.0)
+    upstream.add_argument('--article-kb', type=int, default=30)
+    upstream.add_argument('--telegram-ms', type=float, default=30)
+
+    limits = parser.add_argument_group('thresholds (exit status 1 when exceeded at any level)')
+    limits.add_argument('--max-p95', type=float, help='ms')
+    limits.add_argument('--max-p99', type=float, help='ms')
+    limits.add_argument('--max-error-rate', type=float, help='0-1')
+    limits.add_argument('--min-rps', type=float)
+
+    parser.add_argument('--stages', action='store_true', help='print stage latencies after each level')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='keep the application logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.ERROR)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
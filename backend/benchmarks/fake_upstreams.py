@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-ins for the services the bot and the API depend on
+
+- FakeGemini replaces the genai.GenerativeModel instances in-process
+  (blocking, async and streamed calls).
+- FakeUpstreams is an ASGI app serving a DuckDuckGo-like results page
+  (POST /html/), article pages (GET /article/<n>) and a minimal Telegram
+  Bot API (/bot<token>/<method>), run by UpstreamServer on its own thread
+  and event loop.
+
+Every upstream has a Latency: mean delay with uniform jitter, and a
+failure rate. Used by bench_load.py; nothing here reaches the network.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from html import escape
+from urllib.parse import parse_qs
+
+import uvicorn
+
+from telegram_webhook_replay import FakeBotApi
+
+
+class Latency:
+    """Delay and failure model of one fake upstream"""
+
+    def __init__(self, mean_ms, jitter=0.25, error_rate=0.0, seed=None):
+        """
+        Args:
+            mean_ms (float): Mean delay in milliseconds
+            jitter (float): Delays are uniform in mean * (1 ± jitter)
+            error_rate (float): Fraction of calls that fail (0-1)
+            seed (int): Random seed, for repeatable runs
+        """
+        self.mean = mean_ms / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    def delay(self):
+        """Seconds to wait for this call"""
+        return max(0.0, self.mean * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+
+    def fails(self):
+        """True if this call should fail"""
+        return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+
+# ==================== GEMINI ====================
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _AsyncStream:
+    """Async iterator yielding chunks spread over the call latency"""
+
+    def __init__(self, chunks, first_delay, chunk_delay):
+        self._chunks = chunks
+        self._first_delay = first_delay
+        self._chunk_delay = chunk_delay
+        self._sent = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._sent >= len(self._chunks):
+            raise StopAsyncIteration
+        await asyncio.sleep(self._first_delay if self._sent == 0 else self._chunk_delay)
+        self._sent += 1
+        return _Response(self._chunks[self._sent - 1])
+
+
+class FakeGemini:
+    """Stand-in for genai.GenerativeModel"""
+
+    # Ends every complete reply, so the bot benchmark can tell verdicts from error notices
+    MARKER = "[fake-verdict]"
+
+    def __init__(self, latency, quota_error_rate=0.0, chunks=4, reply_chars=600, seed=None):
+        """
+        Args:
+            latency (Latency): Full response time and failure rate (500 errors)
+            quota_error_rate (float): Fraction of calls answered with a 429
+            chunks (int): Chunks per streamed response
+            reply_chars (int): Response length
+            seed (int): Random seed
+        """
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.chunks = max(1, chunks)
+        self.reply_chars = reply_chars
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = Counter()
+
+    def _outcome(self):
+        """Delay of the call, or the exception it should raise"""
+        with self._lock:
+            self.calls['total'] += 1
+            if self.quota_error_rate and self._rng.random() < self.quota_error_rate:
+                self.calls['429'] += 1
+                return None, Exception("429 Resource has been exhausted (fake quota). Please retry in 1s")
+            if self.latency.fails():
+                self.calls['500'] += 1
+                return None, Exception("500 Internal error encountered (fake upstream)")
+            return self.latency.delay(), None
+
+    def _reply_chunks(self):
+        body = ("✅ VRAI. Fausse analyse produite par le banc d'essai. " * 40)[:self.reply_chars]
+        size = -(-len(body) // self.chunks)
+        chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        chunks[-1] += " " + self.MARKER
+        return chunks
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        delay, error = self._outcome()
+        if error is not None:
+            time.sleep(self.latency.mean / 10)
+            raise error
+        chunks = self._reply_chunks()
+        if not stream:
+            time.sleep(delay)
+            return _Response(''.join(chunks))
+
+        def iterate():
+            for i, chunk in enumerate(chunks):
+                time.sleep(delay * 0.4 if i == 0 else delay * 0.6 / max(1, len(chunks) - 1))
+                yield _Response(chunk)
+        return iterate()
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        delay, error = self._outcome()
+        if error is not None:
+            await asyncio.sleep(self.latency.mean / 10)
+            raise error
+        chunks = self._reply_chunks()
+        if not stream:
+            await asyncio.sleep(delay)
+            return _Response(''.join(chunks))
+        # First chunk after 40% of the latency, the rest spread over the remainder
+        return _AsyncStream(chunks, delay * 0.4, delay * 0.6 / max(1, len(chunks) - 1))
+
+
+# ==================== HTTP UPSTREAMS ====================
+
+SEARCH_RESULT = (
+    '<div class="result results_links results_links_deep web-result">'
+    '<h2 class="result__title"><a class="result__a" href="/l/?uddg=https%3A%2F%2Fnews.example%2F{n}">'
+    'Résultat {n} : {query}</a></h2>'
+    '<a class="result__snippet" href="#">Selon plusieurs sources, {query} a été vérifié le {n} courant.</a>'
+    '</div>'
+)
+
+ARTICLE_PARAGRAPH = (
+    "<p>Les chercheurs ont publié cette semaine une étude détaillée sur le sujet {n}. "
+    "Selon leurs mesures, les affirmations qui circulent sur les réseaux sociaux sont "
+    "largement exagérées, et plusieurs chiffres ont été sortis de leur contexte.</p>\n"
+)
+
+
+class FakeUpstreams:
+    """ASGI app standing in for DuckDuckGo, article sites and the Bot API"""
+
+    def __init__(self, search, article, telegram, article_kb=30, search_results=5):
+        """
+        Args:
+            search (Latency): DuckDuckGo results page (failures answer 503)
+            article (Latency): Article pages (failures answer 500)
+            telegram (Latency): Bot API methods (never fail)
+            article_kb (int): Approximate article page size
+            search_results (int): Results per search page
+        """
+        self.search = search
+        self.article = article
+        self.telegram = telegram
+        self.article_kb = article_kb
+        self.search_results = search_results
+        self.bot_api = FakeBotApi()
+        self.requests = Counter()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        path = scope['path']
+        if path.startswith('/bot'):
+            self.requests['telegram'] += 1
+            await asyncio.sleep(self.telegram.delay())
+            await self.bot_api(scope, receive, send)
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        if path.startswith('/html'):
+            self.requests['search'] += 1
+            await self._respond(send, self.search, 503, self._search_page(body))
+        elif path.startswith('/article/'):
+            self.requests['article'] += 1
+            await self._respond(send, self.article, 500, self._article_page(path.rsplit('/', 1)[-1]))
+        else:
+            await self._send(send, 404, b'not found')
+
+    async def _respond(self, send, latency, error_status, page):
+        await asyncio.sleep(latency.delay())
+        if latency.fails():
+            self.requests['failed'] += 1
+            await self._send(send, error_status, b'upstream error')
+        else:
+            await self._send(send, 200, page)
+
+    def _search_page(self, form):
+        query = escape(parse_qs(form.decode('utf-8', 'replace')).get('q', [''])[0][:80])
+        results = ''.join(SEARCH_RESULT.format(n=n, query=query) for n in range(self.search_results))
+        return f'<html><body><div id="links">{results}</div></body></html>'.encode('utf-8')
+
+    def _article_page(self, n):
+        paragraphs = ARTICLE_PARAGRAPH.format(n=n) * max(1, self.article_kb * 1024 // len(ARTICLE_PARAGRAPH))
+        return (
+            f'<html><head><title>Article {n}</title></head><body>'
+            f'<nav><a href="/">Accueil</a> <a href="/monde">Monde</a></nav>'
+            f'<article><h1>Vérification {n}</h1>{paragraphs}</article>'
+            f'<footer>© Exemple</footer></body></html>'
+        ).encode('utf-8')
+
+    @staticmethod
+    async def _send(send, status, body):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'text/html; charset=utf-8'),
+            (b'content-length', str(len(body)).encode()),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+class UpstreamServer:
+    """Serves an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning',
+                                                    lifespan='off'))
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(),), daemon=True)
+
+    def start(self, timeout=10):
+        """
+        Start serving
+
+        Returns:
+            str: Base URL (ephemeral port)
+        """
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("fake upstream server did not start")
+            time.sleep(0.01)
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
@@ -38,11 +38,30 @@ class Config:
     # Security
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     
+    # Admin endpoints (/api/admin/*, forced traces); empty = disabled
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    
     # API timeout
     REQUEST_TIMEOUT = 30
     
+    # Serving mode: 'wsgi' (Flask threads) or 'asgi' (async API routes on uvicorn)
+    SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+    
     # AI Model
     AI_MODEL = 'gemini-2.5-flash'
+    
+    # Maximum in-flight Gemini calls per process (sync + async callers)
+    GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', 8))
+    
+    # Seconds a duplicate request waits for the identical in-flight analysis
+    COALESCE_WAIT_TIMEOUT = float(os.getenv('COALESCE_WAIT_TIMEOUT', 60))
+    
+    # Batch analysis (/api/analyze/batch)
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 100))
+    BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 4))
+    BATCH_PACK_SIZE = int(os.getenv('BATCH_PACK_SIZE', 8))  # short claims per packed prompt
+    BATCH_PACK_MAX_CHARS = int(os.getenv('BATCH_PACK_MAX_CHARS', 400))
+    DETECT_BATCH_MAX_ITEMS = int(os.getenv('DETECT_BATCH_MAX_ITEMS', 1000))
 
 
 class DevelopmentConfig(Config):
@@ -158,12 +177,66 @@ VALIDATION = {
 }
 
 
+# ==================== CACHE SETTINGS ====================
+
+CACHE_CONFIG = {
+    'enabled': os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True',
+    'max_entries': int(os.getenv('RESPONSE_CACHE_SIZE', 2048)),
+    'ttl': int(os.getenv('RESPONSE_CACHE_TTL', 6 * 3600)),  # 6 hours
+    'db_path': os.getenv('RESPONSE_CACHE_DB') or None,  # e.g. data/responses.sqlite3
+}
+
+
+# ==================== QUOTA SETTINGS ====================
+
+# Shared by the Flask workers and the Telegram bots (same env vars, same file)
+QUOTA_CONFIG = {
+    'enabled': os.getenv('QUOTA_ENABLED', 'True') == 'True',
+    'db_path': os.getenv('QUOTA_DB') or str(BASE_DIR / 'data' / 'quota.sqlite3'),
+    'requests_per_minute': int(os.getenv('GEMINI_RPM', 10)),
+    'tokens_per_minute': int(os.getenv('GEMINI_TPM', 250000)),
+    'max_wait': float(os.getenv('QUOTA_MAX_WAIT', 10)),  # seconds before failing fast
+}
+
+
+# ==================== TRACING SETTINGS ====================
+
+# Shared by the Flask workers and the Telegram bots (same env vars)
+TRACING_CONFIG = {
+    'trace_file': os.getenv('TRACE_FILE', ''),  # JSONL span records, e.g. logs/traces.jsonl ('' = off)
+    'sample_rate': float(os.getenv('TRACE_SAMPLE_RATE', 0.01)),  # fraction of requests traced
+    'slow_ms': float(os.getenv('TRACE_SLOW_MS', 0)),  # also keep requests slower than this (0 = off)
+}
+
+
+# ==================== CASSETTE SETTINGS ====================
+
+# Record / replay of Gemini and web tool calls (core/cassette.py)
+CASSETTE_CONFIG = {
+    'mode': os.getenv('CASSETTE_MODE', 'off'),  # off, record or replay
+    'path': os.getenv('CASSETTE_PATH') or str(BASE_DIR / 'data' / 'cassette.jsonl.gz'),
+    'latency_scale': float(os.getenv('CASSETTE_LATENCY_SCALE', 1.0)),  # replayed latencies x this (0 = none)
+}
+
+
 # ==================== TELEGRAM SETTINGS ====================
 
 TELEGRAM_CONFIG = {
     'polling_timeout': 30,
     'max_retries': 3,
     'retry_delay': 5,
+    # Webhook mode (python telegram_webhook.py)
+    'webhook_url': os.getenv('TELEGRAM_WEBHOOK_URL', ''),  # public https URL registered with Telegram ('' = don't register)
+    'webhook_path': os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram'),
+    'webhook_secret': os.getenv('TELEGRAM_WEBHOOK_SECRET', ''),  # checked against X-Telegram-Bot-Api-Secret-Token
+    'webhook_host': os.getenv('TELEGRAM_WEBHOOK_HOST', '0.0.0.0'),
+    'webhook_port': int(os.getenv('TELEGRAM_WEBHOOK_PORT', 8443)),
+    'webhook_max_body': 1024 * 1024,  # updates are small JSON documents
+    'webhook_max_connections': int(os.getenv('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', 40)),
+    'drop_pending_updates': os.getenv('TELEGRAM_DROP_PENDING_UPDATES', 'False') == 'True',
+    'record_updates': os.getenv('TELEGRAM_RECORD_UPDATES', ''),  # JSONL file of received updates, for replay
+    'api_base_url': os.getenv('TELEGRAM_API_BASE_URL', ''),  # e.g. a local stand-in ('' = api.telegram.org)
+    'admin_token': os.getenv('ADMIN_TOKEN', ''),  # enables /admin/profile ('' = disabled)
 }
 
 
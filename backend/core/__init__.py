@@ -4,31 +4,17 @@ Core AI Agent Module - Request detection and processing
 Senior Python Developer - Reusable Core Logic
 """
 
-import re
 import logging
 from typing import Tuple
 
+from core.intent import intent_classifier
+
 logger = logging.getLogger(__name__)
 
 
 class AIAgent:
     """Professional AI Agent for request type detection and processing"""
     
-    # Request type patterns
-    PATTERNS = {
-        'fact_check': [
-            r'\b(is it|are|true|false|verify|fact.?check|correct|accurate|real|fake)\b',
-            r'\b(claim|myth|rumor|hoax|misinformation|false claim)\b',
-            r'^(is|are|do|does|can|will|should)\s',
-            r'\b(true or false|yes or no|correct or incorrect)\b',
-        ],
-        'ai_detection': [
-            r'\b(ai|artificial intelligence|chatgpt|gpt|generated|wrote by)\b',
-            r'\b(detect|identify|find|check if).*\b(ai|artificial|machine|generated)\b',
-            r'\b(ai.?generated|ai.?written|written by ai|generated by ai)\b',
-        ],
-    }
-    
     @staticmethod
     def detect_request_type(text: str) -> str:
         """
@@ -40,31 +26,22 @@ class AIAgent:
         Returns:
             'fact_check', 'ai_detection', or 'general_chat'
         """
-        text_lower = text.lower().strip()
-        
-        # Score each type
-        scores = {
-            'fact_check': 0,
-            'ai_detection': 0,
-        }
-        
-        for req_type, patterns in AIAgent.PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, text_lower):
-                    scores[req_type] += 1
-        
-        # Determine highest scoring type
-        max_score = max(scores.values())
-        
-        if max_score == 0:
-            return 'general_chat'
-        
-        for req_type, score in scores.items():
-            if score == max_score:
-                logger.debug(f"Request type detected: {req_type} (score: {score})")
-                return req_type
+        req_type, scores = intent_classifier.classify(text)
+        logger.debug(f"Request type detected: {req_type} (scores: {scores})")
+        return req_type
+    
+    @staticmethod
+    def score_request_types(text: str) -> Tuple[str, dict]:
+        """
+        Detect request type and return the per-type scores
         
-        return 'general_chat'
+        Args:
+            text: User input text
+            
+        Returns:
+            Tuple of (request_type, scores)
+        """
+        return intent_classifier.classify(text)
     
     @staticmethod
     def validate_input(text: str, constraints: dict = None) -> Tuple[bool, str]:
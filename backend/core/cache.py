@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Cache Module - In-memory LRU/TTL cache and content-addressed response cache
+Senior Python Developer - Quota-Friendly Caching
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: Maximum number of entries kept in memory
+            ttl: Default time-to-live in seconds (None = never expires)
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a value and mark it as most recently used
+
+        Args:
+            key: Cache key
+            default: Value returned on miss or expiry
+
+        Returns:
+            Cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = _MISSING) -> None:
+        """
+        Store a value, evicting the least recently used entries if full
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl: Entry time-to-live in seconds (default: cache TTL)
+        """
+        if ttl is _MISSING:
+            ttl = self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        """Remove an entry if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """
+        Get cache counters
+
+        Returns:
+            Dictionary with entries, hits, misses, evictions and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class ResponseCache:
+    """Content-addressed AI response cache (memory LRU + optional SQLite tier)"""
+
+    # Expired rows are purged from disk every N writes
+    PURGE_EVERY = 500
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, db_path: str = None):
+        """
+        Initialize response cache
+
+        Args:
+            max_entries: Maximum entries in the in-memory tier
+            ttl: Entry time-to-live in seconds
+            db_path: SQLite file for the persistent tier (None = memory only)
+        """
+        self.ttl = ttl
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.db_path = db_path
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._db = None
+        self._db_lock = threading.Lock()
+
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> None:
+        """Open (and create if needed) the SQLite tier"""
+        try:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"[OK] Response cache disk tier: {db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"[ERROR] Response cache disk tier disabled: {e}")
+            self._db = None
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """
+        Normalize text so trivially different inputs share a cache entry
+
+        Args:
+            text: Raw user text
+
+        Returns:
+            Case-folded text with collapsed whitespace
+        """
+        return _WHITESPACE_RE.sub(' ', (text or '').strip()).casefold()
+
+    @staticmethod
+    def make_key(
+        text: str,
+        request_type: str,
+        temperature: float,
+        model: str,
+        system_prompt: str = None
+    ) -> str:
+        """
+        Build a content-addressed cache key
+
+        Args:
+            text: User input text
+            request_type: Detected or requested type
+            temperature: Generation temperature
+            model: Model name
+            system_prompt: System prompt used for generation
+
+        Returns:
+            SHA-256 hex digest identifying the request
+        """
+        payload = json.dumps([
+            ResponseCache.normalize_text(text),
+            request_type,
+            round(float(temperature), 3),
+            model,
+            system_prompt or '',
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a response in memory, then on disk
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            Cached response or None
+        """
+        value = self.memory.get(key)
+        if value is None:
+            value = self._read_disk(key)
+        return value
+
+    async def get_async(self, key: str) -> Optional[str]:
+        """Async variant of get: the SQLite lookup runs off the event loop"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self._db is None:
+            return self._read_disk(key)
+        return await asyncio.to_thread(self._read_disk, key)
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        """Look up a memory miss in the SQLite tier (counts the miss)"""
+        if self._db is not None:
+            now = time.time()
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"[WARNING] Response cache read failed: {e}")
+                row = None
+
+            if row and row[1] > now:
+                self.disk_hits += 1
+                # Promote to memory with the remaining lifetime
+                self.memory.set(key, row[0], ttl=row[1] - now)
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Store a response in both tiers
+
+        Args:
+            key: Key from make_key()
+            value: Generated response text
+        """
+        self.memory.set(key, value)
+        self._write_disk(key, value)
+
+    async def set_async(self, key: str, value: str) -> None:
+        """Async variant of set: the SQLite write (and purge) runs off the event loop"""
+        self.memory.set(key, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_disk, key, value)
+
+    def _write_disk(self, key: str, value: str) -> None:
+        """Persist a response to the SQLite tier (no-op when disabled)"""
+        if self._db is None:
+            return
+
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, time.time() + self.ttl)
+                )
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[WARNING] Response cache write failed: {e}")
+
+    def clear(self) -> None:
+        """Remove all entries from both tiers"""
+        self.memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """
+        Get combined cache counters
+
+        Returns:
+            Dictionary with per-tier hits, misses and hit ratio
+        """
+        memory_stats = self.memory.stats()
+        hits = memory_stats['hits'] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            'entries': memory_stats['entries'],
+            'max_entries': memory_stats['max_entries'],
+            'memory_hits': memory_stats['hits'],
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': memory_stats['evictions'],
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'disk_tier': bool(self._db is not None),
+        }
@@ -0,0 +1,668 @@
+# -*- coding: utf-8 -*-
+"""
+Cassette Module - Record/replay of upstream calls with their timings
+Senior Python Developer - Deterministic Pipeline Profiling
+
+In 'record' mode, Gemini calls (blocking, async, streamed, token counts),
+audio uploads to the Files API and the web tools' HTTP requests go
+upstream as usual. Each response is stored with
+its latency and, for streams, the offset of every chunk. In 'replay'
+mode the same calls are answered from the cassette, with the original
+latencies multiplied by latency_scale (0 = no waiting) and without any
+network. The rest of the pipeline still runs for real: search result
+parsing, article extraction, caches, limiters, quota and Telegram
+delivery. Optimizations of those parts can then be A/B-measured against
+identical upstream behavior.
+
+Calls are matched on a digest of the request: the model's system
+instruction and the contents for Gemini (dates masked, so the daily
+instruction still matches; media hashed, uploaded files by the content
+they were uploaded from), and method, URL and form data for HTTP. Generation settings and request headers are not part of the
+key. A request recorded several times replays its recordings in turn. A
+missing one raises CassetteMiss instead of going to the network.
+
+The cassette is one gzip-compressed JSONL file with one recording per
+line, written out every SAVE_EVERY new recordings and at exit.
+"""
+
+import asyncio
+import atexit
+import base64
+import builtins
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'record', 'replay')
+SAVE_EVERY = 25
+
+# Response headers kept for HTTP recordings (conditional requests, type)
+HTTP_HEADERS = ('content-type', 'etag', 'last-modified')
+
+# Dates in prompts ("Aujourd'hui : 18 octobre 2026", ISO dates)
+_DATE_RE = re.compile(r'\b\d{1,2} \w+ \d{4}\b|\b\d{4}-\d{2}-\d{2}\b')
+
+_USAGE_FIELDS = ('prompt_token_count', 'candidates_token_count', 'total_token_count')
+
+
+class CassetteMiss(LookupError):
+    """Replay mode: no recording for this request"""
+
+
+class ReplayedError(Exception):
+    """Recorded upstream error whose type cannot be rebuilt (same message)"""
+
+
+def _fingerprint(value, digest) -> None:
+    """Feed a request value to the key digest"""
+    if isinstance(value, str):
+        digest.update(_DATE_RE.sub('<date>', value).encode('utf-8'))
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        digest.update(hashlib.sha256(value).digest())
+    elif isinstance(value, dict):
+        for name in sorted(value, key=str):
+            digest.update(str(name).encode('utf-8') + b'=')
+            _fingerprint(value[name], digest)
+            digest.update(b'\x1e')
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _fingerprint(item, digest)
+            digest.update(b'\x1f')
+    elif isinstance(value, (int, float, bool)) or value is None:
+        digest.update(repr(value).encode('utf-8'))
+    elif isinstance(getattr(value, 'uri', None), str):
+        # Uploaded file: its server-side name changes with every upload
+        digest.update(b'file:' + cassette.file_digest(getattr(value, 'name', '')))
+        _fingerprint(getattr(value, 'mime_type', None), digest)
+    else:
+        # Blob-like parts carry their bytes; images (PIL) expose them; other
+        # objects are only identified by type and MIME type
+        digest.update(type(value).__name__.encode('utf-8'))
+        data = getattr(value, 'data', None)
+        if data is None and hasattr(value, 'tobytes'):
+            data = value.tobytes()
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            digest.update(hashlib.sha256(data).digest())
+        _fingerprint(getattr(value, 'mime_type', None), digest)
+
+
+def _error_record(error: BaseException) -> list:
+    return [type(error).__name__, str(error)]
+
+
+def _rebuild_error(record: list) -> Exception:
+    """Recorded error as an exception with the same message (and type, if builtin)"""
+    name, message = record
+    error_type = getattr(builtins, name, None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        try:
+            return error_type(message)
+        except Exception:
+            pass
+    return ReplayedError(message)
+
+
+def _chunk_text(chunk):
+    """(text, error record) of a response or stream chunk"""
+    try:
+        return chunk.text, None
+    except Exception as e:
+        return None, _error_record(e)
+
+
+def _usage_record(response) -> Optional[dict]:
+    try:
+        usage = getattr(response, 'usage_metadata', None)
+    except Exception:
+        return None
+    if usage is None:
+        return None
+    return {name: getattr(usage, name, 0) for name in _USAGE_FIELDS}
+
+
+class _ReplayResponse:
+    """Stand-in for a GenerateContentResponse (whole reply or one chunk)"""
+
+    def __init__(self, text, text_error=None, usage=None):
+        self._text = text
+        self._text_error = text_error
+        self.usage_metadata = SimpleNamespace(**usage) if usage else None
+
+    @property
+    def text(self):
+        if self._text_error is not None:
+            raise _rebuild_error(self._text_error)
+        return self._text
+
+
+class _ReplayFile:
+    """Stand-in for an uploaded genai File (no expiration: cached for the TTL)"""
+
+    def __init__(self, name, uri, mime_type):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.expiration_time = None
+
+
+class _ReplayStream:
+    """Recorded stream: chunks at their original (scaled) offsets"""
+
+    def __init__(self, entry: dict, scale: float):
+        self._chunks = entry['chunks']
+        self._error = entry.get('error')
+        self._usage = entry.get('usage')
+        self._offset = entry['delay']
+        self._scale = scale
+        self._index = 0
+        self.usage_metadata = None
+
+    def _next(self):
+        """(seconds to wait, chunk) or (seconds, None) at the end"""
+        if self._index < len(self._chunks):
+            offset, text, text_error = self._chunks[self._index]
+            self._index += 1
+            wait, self._offset = max(0.0, offset - self._offset) * self._scale, offset
+            return wait, _ReplayResponse(text, text_error)
+        return 0.0, None
+
+    def _end(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise _rebuild_error(error)
+        self.usage_metadata = SimpleNamespace(**self._usage) if self._usage else None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        wait, chunk = self._next()
+        if chunk is None:
+            self._end()
+            raise StopIteration
+        if wait:
+            time.sleep(wait)
+        return chunk
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        wait, chunk = self._next()
+        if chunk is None:
+            self._end()
+            raise StopAsyncIteration
+        if wait:
+            await asyncio.sleep(wait)
+        return chunk
+
+
+class _RecordingStream:
+    """Passes a live stream through, recording chunk offsets until it ends"""
+
+    def __init__(self, response, started: float, finish):
+        self._response = response
+        self._started = started
+        self._finish = finish
+        self._chunks = []
+        self._iterator = None
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _add(self, chunk):
+        text, text_error = _chunk_text(chunk)
+        self._chunks.append([round(time.perf_counter() - self._started, 4), text, text_error])
+        return chunk
+
+    def _done(self, error=None):
+        if self._finish is not None:
+            self._finish(self._chunks, error, _usage_record(self._response))
+            self._finish = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = iter(self._response)
+        try:
+            return self._add(next(self._iterator))
+        except StopIteration:
+            self._done()
+            raise
+        except Exception as e:
+            self._done(_error_record(e))
+            raise
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._iterator is None:
+            self._iterator = self._response.__aiter__()
+        try:
+            return self._add(await self._iterator.__anext__())
+        except StopAsyncIteration:
+            self._done()
+            raise
+        except Exception as e:
+            self._done(_error_record(e))
+            raise
+
+
+class CassetteModel:
+    """
+    GenerativeModel proxy: records or replays generate_content calls while
+    a cassette is active, passes them through otherwise
+    """
+
+    def __init__(self, model, context: str = ''):
+        """
+        Args:
+            model: genai.GenerativeModel
+            context: Part of the request not in the contents (system instruction)
+        """
+        self.model = model
+        self.context = context
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if not cassette.active:
+            return self.model.generate_content(contents, stream=stream, **kwargs)
+        return cassette.gemini(self, contents, stream, kwargs)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        if not cassette.active:
+            return await self.model.generate_content_async(contents, stream=stream, **kwargs)
+        return await cassette.gemini_async(self, contents, stream, kwargs)
+
+    def count_tokens(self, contents, **kwargs):
+        if not cassette.active:
+            return self.model.count_tokens(contents, **kwargs)
+        return cassette.count_tokens(self, contents, kwargs)
+
+    async def count_tokens_async(self, contents, **kwargs):
+        if not cassette.active:
+            return await self.model.count_tokens_async(contents, **kwargs)
+        return await cassette.count_tokens_async(self, contents, kwargs)
+
+
+class Cassette:
+    """Recorded upstream responses, keyed by request digest"""
+
+    def __init__(self):
+        self.mode = 'off'
+        self.path = None
+        self.latency_scale = 1.0
+        # True while recording or replaying
+        self.active = False
+        self._entries = {}
+        self._played = Counter()
+        # Uploaded file name -> digest of the uploaded content
+        self._files = {}
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._atexit = False
+
+        # Statistics
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def configure(self, mode: str, path: Optional[str] = None, latency_scale: float = 1.0) -> None:
+        """
+        Start recording or replaying
+
+        Args:
+            mode: 'off', 'record' (adds to an existing cassette) or 'replay'
+            path: Cassette file (.jsonl.gz)
+            latency_scale: Replayed latencies are multiplied by this
+
+        Raises:
+            ValueError: Unknown mode, or no path
+        """
+        if mode not in MODES:
+            raise ValueError(f"cassette mode must be one of {', '.join(MODES)}")
+        if mode != 'off' and not path:
+            raise ValueError("cassette mode needs a cassette path")
+
+        self.save()
+        with self._lock:
+            self.mode = mode
+            self.path = path or None
+            self.latency_scale = max(0.0, latency_scale)
+            self._entries = self._load(self.path) if mode != 'off' else {}
+            self._played.clear()
+            self._files.clear()
+            self.active = mode != 'off'
+        if mode == 'record' and not self._atexit:
+            atexit.register(self.save)
+            self._atexit = True
+        if self.active:
+            logger.info(f"[OK] Cassette {mode}: {self.path} ({sum(map(len, self._entries.values()))} "
+                        f"recordings, latency x{self.latency_scale})")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    # ==================== STORAGE ====================
+
+    @staticmethod
+    def _load(path: str) -> dict:
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries.setdefault(entry.pop('key'), []).append(entry)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[WARNING] Cassette {path} unreadable, starting empty: {e}")
+            return {}
+        return entries
+
+    def save(self) -> None:
+        """Write the cassette out (record mode, when there are new recordings)"""
+        with self._lock:
+            if self.mode != 'record' or not self._unsaved:
+                return
+            lines = [
+                json.dumps(dict(entry, key=key), ensure_ascii=False) + '\n'
+                for key, entries in self._entries.items() for entry in entries
+            ]
+            self._unsaved = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        try:
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"[WARNING] Cassette write failed: {e}")
+
+    def _add(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self.recorded += 1
+            self._unsaved += 1
+            flush = self._unsaved >= SAVE_EVERY
+        if flush:
+            self.save()
+
+    def _next(self, key: str, description: str) -> dict:
+        """Next recording for a key (cycling through repeats)"""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+            else:
+                index = self._played[key]
+                self._played[key] = index + 1
+                self.replayed += 1
+                return entries[index % len(entries)]
+        raise CassetteMiss(f"No recording for {description} in {self.path}")
+
+    @staticmethod
+    def key(kind: str, *parts) -> str:
+        """Request digest"""
+        digest = hashlib.sha256(kind.encode('utf-8'))
+        for part in parts:
+            _fingerprint(part, digest)
+            digest.update(b'\x1d')
+        return f"{kind}:{digest.hexdigest()[:32]}"
+
+    # ==================== GEMINI ====================
+
+    def _gemini_key(self, model: CassetteModel, contents, stream: bool) -> str:
+        return self.key('gemini', model.context, contents, stream)
+
+    def _record_response(self, key: str, response, elapsed: float) -> None:
+        text, text_error = _chunk_text(response)
+        self._add(key, {'delay': round(elapsed, 4), 'text': text, 'text_error': text_error,
+                        'usage': _usage_record(response)})
+
+    def _record_stream(self, key: str, response, started: float, elapsed: float) -> _RecordingStream:
+        def finish(chunks, error, usage):
+            self._add(key, {'delay': round(elapsed, 4), 'chunks': chunks, 'error': error, 'usage': usage})
+        return _RecordingStream(response, started, finish)
+
+    def _replay_entry(self, key: str, entry: dict, stream: bool):
+        """(seconds to wait, error or response) of a recording"""
+        wait = entry['delay'] * self.latency_scale
+        if 'chunks' not in entry and entry.get('error'):
+            return wait, _rebuild_error(entry['error'])
+        if stream:
+            if 'chunks' not in entry:
+                raise CassetteMiss(f"Recording {key} is not a stream")
+            return wait, _ReplayStream(entry, self.latency_scale)
+        return wait, _ReplayResponse(entry.get('text'), entry.get('text_error'), entry.get('usage'))
+
+    def gemini(self, model: CassetteModel, contents, stream: bool, kwargs: dict):
+        """Blocking generate_content under the cassette"""
+        key = self._gemini_key(model, contents, stream)
+        if self.replaying:
+            wait, result = self._replay_entry(key, self._next(key, 'Gemini request'), stream)
+            time.sleep(wait)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        started = time.perf_counter()
+        try:
+            response = model.model.generate_content(contents, stream=stream, **kwargs)
+        except Exception as e:
+            self._add(key, {'delay': round(time.perf_counter() - started, 4), 'error': _error_record(e)})
+            raise
+        elapsed = time.perf_counter() - started
+        if stream:
+            return self._record_stream(key, response, started, elapsed)
+        self._record_response(key, response, elapsed)
+        return response
+
+    async def gemini_async(self, model: CassetteModel, contents, stream: bool, kwargs: dict):
+        """generate_content_async under the cassette"""
+        key = self._gemini_key(model, contents, stream)
+        if self.replaying:
+            wait, result = self._replay_entry(key, self._next(key, 'Gemini request'), stream)
+            await asyncio.sleep(wait)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        started = time.perf_counter()
+        try:
+            response = await model.model.generate_content_async(contents, stream=stream, **kwargs)
+        except Exception as e:
+            self._add(key, {'delay': round(time.perf_counter() - started, 4), 'error': _error_record(e)})
+            raise
+        elapsed = time.perf_counter() - started
+        if stream:
+            return self._record_stream(key, response, started, elapsed)
+        self._record_response(key, response, elapsed)
+        return response
+
+    # ==================== TOKEN COUNTS ====================
+
+    def _tokens_key(self, model: CassetteModel, contents) -> str:
+        return self.key('count_tokens', model.context, contents)
+
+    def _replay_tokens(self, key: str):
+        """(seconds to wait, error or response) of a recorded token count"""
+        entry = self._next(key, 'count_tokens request')
+        wait = entry['delay'] * self.latency_scale
+        if entry.get('error'):
+            return wait, _rebuild_error(entry['error'])
+        return wait, SimpleNamespace(total_tokens=entry['total_tokens'])
+
+    def _record_tokens(self, key: str, started: float, response=None, error=None) -> None:
+        entry = {'delay': round(time.perf_counter() - started, 4)}
+        if error is not None:
+            entry['error'] = _error_record(error)
+        else:
+            entry['total_tokens'] = response.total_tokens
+        self._add(key, entry)
+
+    def count_tokens(self, model: CassetteModel, contents, kwargs: dict):
+        """Blocking count_tokens under the cassette"""
+        key = self._tokens_key(model, contents)
+        if self.replaying:
+            wait, result = self._replay_tokens(key)
+            time.sleep(wait)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        started = time.perf_counter()
+        try:
+            response = model.model.count_tokens(contents, **kwargs)
+        except Exception as e:
+            self._record_tokens(key, started, error=e)
+            raise
+        self._record_tokens(key, started, response)
+        return response
+
+    async def count_tokens_async(self, model: CassetteModel, contents, kwargs: dict):
+        """count_tokens_async under the cassette"""
+        key = self._tokens_key(model, contents)
+        if self.replaying:
+            wait, result = self._replay_tokens(key)
+            await asyncio.sleep(wait)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        started = time.perf_counter()
+        try:
+            response = await model.model.count_tokens_async(contents, **kwargs)
+        except Exception as e:
+            self._record_tokens(key, started, error=e)
+            raise
+        self._record_tokens(key, started, response)
+        return response
+
+    # ==================== FILE UPLOADS ====================
+
+    def file_digest(self, name: str) -> bytes:
+        """Content digest of a file uploaded under the cassette (name if unknown)"""
+        with self._lock:
+            return self._files.get(name) or str(name).encode('utf-8')
+
+    async def upload(self, data: bytes, mime_type: str, upload):
+        """
+        Files API upload under the cassette
+
+        Args:
+            data: Uploaded bytes (part of the key)
+            mime_type: MIME type (part of the key)
+            upload: Coroutine function doing the real upload, returning the
+                genai File
+
+        Returns:
+            The uploaded File, or a stand-in with the recorded name and URI
+        """
+        content = hashlib.sha256(data).digest()
+        key = self.key('upload', content, mime_type)
+        if self.replaying:
+            entry = self._next(key, f"{mime_type} upload")
+            await asyncio.sleep(entry['delay'] * self.latency_scale)
+            if entry.get('error'):
+                raise _rebuild_error(entry['error'])
+            uploaded_file = _ReplayFile(entry['name'], entry['uri'], entry['mime_type'])
+        else:
+            started = time.perf_counter()
+            try:
+                uploaded_file = await upload()
+            except Exception as e:
+                self._add(key, {'delay': round(time.perf_counter() - started, 4), 'error': _error_record(e)})
+                raise
+            self._add(key, {
+                'delay': round(time.perf_counter() - started, 4),
+                'name': uploaded_file.name,
+                'uri': uploaded_file.uri,
+                'mime_type': uploaded_file.mime_type,
+            })
+        with self._lock:
+            self._files[uploaded_file.name] = content
+        return uploaded_file
+
+    # ==================== HTTP ====================
+
+    async def http(self, method: str, url: str, data, fetch) -> tuple:
+        """
+        Web tools request under the cassette
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            data: Form data (part of the key)
+            fetch: Coroutine function doing the real request, returning
+                (httpx.Response, body bytes)
+
+        Returns:
+            tuple: (httpx.Response, body bytes)
+        """
+        key = self.key('http', method, url, data)
+        if self.replaying:
+            entry = self._next(key, f"{method} {url}")
+            await asyncio.sleep(entry['delay'] * self.latency_scale)
+            if entry.get('error'):
+                raise _rebuild_error(entry['error'])
+            body = base64.b64decode(entry['b64']) if 'b64' in entry else entry['text'].encode('utf-8')
+            request = httpx.Request(method, url)
+            return httpx.Response(entry['status'], headers=entry['headers'], request=request), body
+
+        started = time.perf_counter()
+        try:
+            response, body = await fetch()
+        except Exception as e:
+            self._add(key, {'delay': round(time.perf_counter() - started, 4), 'error': _error_record(e)})
+            raise
+        entry = {
+            'delay': round(time.perf_counter() - started, 4),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in HTTP_HEADERS if name in response.headers},
+        }
+        try:
+            entry['text'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            entry['b64'] = base64.b64encode(body).decode('ascii')
+        self._add(key, entry)
+        return response, body
+
+    def stats(self) -> dict:
+        """
+        Get cassette counters
+
+        Returns:
+            Dictionary with mode and recordings added, replayed and missed
+        """
+        return {
+            'mode': self.mode,
+            'latency_scale': self.latency_scale,
+            'requests': len(self._entries),
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'misses': self.misses,
+        }
+
+
+# Process-wide cassette (configured by the app factory and the bots)
+cassette = Cassette()
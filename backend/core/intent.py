@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Intent Classifier Module - Single-pass multilingual request typing
+Senior Python Developer - Compiled Pattern Engine
+
+Weighted keyword and phrase patterns for every request type are compiled
+once into a lexicon indexed by first word. Classifying a text is one split
+into words, one set intersection against the lexicon and a substring check
+per candidate phrase, whatever the number of patterns. Pattern sets
+cover English, French and Arabic.
+"""
+
+import logging
+import string
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Punctuation turned into word separators (str.translate + split is several
+# times cheaper than a regex tokenizer). Arabic diacritics stay inside words
+# and are stripped at lookup.
+_SEPARATORS = string.punctuation + '؟،؛«»‘’“”…–—¿¡'
+_SEPARATOR_TABLE = str.maketrans(_SEPARATORS, ' ' * len(_SEPARATORS))
+_AR_DIACRITICS = dict.fromkeys(range(0x064B, 0x0660)) | {0x0670: None}
+# Attached Arabic prefixes (conjunctions, prepositions, article), longest first
+_AR_PREFIXES = ('وبال', 'وال', 'بال', 'فال', 'كال', 'لل', 'ال', 'و', 'ف', 'ب', 'ل', 'ك')
+
+# (pattern, weight) per request type. A pattern is a word or a phrase of
+# consecutive words; a leading "^" only matches at the start of the text.
+# Accent-free variants of Latin patterns are added automatically.
+INTENT_PATTERNS = {
+    'fact_check': [
+        # English
+        ('fact check', 3), ('factcheck', 3), ('fact checking', 3),
+        ('true or false', 3), ('yes or no', 2), ('correct or incorrect', 3),
+        ('fake news', 3), ('false claim', 3), ('misinformation', 3),
+        ('disinformation', 3), ('hoax', 3), ('debunk', 3), ('debunked', 3),
+        ('is it true', 3), ('is this true', 3), ('is that true', 3),
+        ('is it real', 2), ('is this real', 2),
+        ('verify', 2), ('verified', 1), ('claim', 1), ('claims', 1), ('myth', 1),
+        ('rumor', 2), ('rumour', 2), ('fake', 1), ('false', 1), ('true', 1),
+        ('accurate', 1), ('correct', 1), ('real', 1),
+        ('^is', 1), ('^are', 1), ('^do', 1), ('^does', 1), ('^did', 1),
+        ('^can', 1), ('^will', 1), ('^should', 1), ('^was', 1), ('^were', 1),
+        # French
+        ('est ce vrai', 3), ('c est vrai', 2), ("est ce que c est vrai", 3),
+        ('vrai ou faux', 3), ('info ou intox', 3), ('intox', 3),
+        ('fausse information', 3), ('fausses informations', 3),
+        ('désinformation', 3), ('canular', 3), ('complot', 2),
+        ('vérifier', 2), ('vérifie', 2), ('vérifiez', 2), ('vérification', 2),
+        ('rumeur', 2), ('rumeurs', 2), ('mythe', 1), ('vrai', 1), ('vraie', 1),
+        ('faux', 1), ('fausse', 1), ('exact', 1), ('réel', 1), ('réelle', 1),
+        ('^est ce que', 1), ('^est il', 1), ('^est elle', 1), ('^y a t il', 1),
+        ('^peut on', 1), ('^faut il', 1),
+        # Arabic
+        ('خبر كاذب', 3), ('أخبار كاذبة', 3), ('خبر مزيف', 3), ('أخبار مزيفة', 3),
+        ('هل هذا صحيح', 3), ('هل هذا حقيقي', 3), ('هل هذه حقيقة', 3), ('هل صحيح', 3),
+        ('تحقق', 2), ('التحقق', 2), ('تأكد', 2), ('إشاعة', 2), ('اشاعة', 2),
+        ('شائعة', 2), ('إشاعات', 2), ('شائعات', 2), ('تضليل', 2),
+        ('مفبرك', 2), ('مفبركة', 2), ('كذب', 2),
+        ('صحيح', 1), ('صحيحة', 1), ('خطأ', 1), ('خاطئ', 1), ('حقيقي', 1),
+        ('حقيقة', 1), ('مزيف', 1), ('مزيفة', 1), ('كاذب', 1), ('كاذبة', 1),
+        ('^هل', 1),
+    ],
+    'ai_detection': [
+        # English
+        ('ai generated', 4), ('ai written', 4), ('written by ai', 4),
+        ('written by an ai', 4), ('generated by ai', 4), ('generated by an ai', 4),
+        ('made by ai', 4), ('chatgpt', 2), ('chat gpt', 2), ('gpt', 2),
+        ('llm', 2), ('deepfake', 2), ('ai', 2), ('artificial intelligence', 2),
+        ('machine generated', 3), ('bot written', 3),
+        ('detect', 1), ('identify', 1), ('check if', 1), ('tell if', 1),
+        ('generated', 1), ('wrote by', 1), ('written by', 1),
+        # French
+        ('généré par ia', 4), ('généré par une ia', 4), ('générée par une ia', 4),
+        ('généré par l ia', 4), ('écrit par une ia', 4), ('écrit par l ia', 4),
+        ('écrite par une ia', 4), ('fait par une ia', 4),
+        ('ia', 2), ('intelligence artificielle', 2),
+        ('détecter', 1), ('repérer', 1), ('généré', 1), ('générée', 1), ('générés', 1),
+        # Arabic
+        ('ذكاء اصطناعي', 3), ('الذكاء الاصطناعي', 3),
+        ('مولد بالذكاء', 4), ('مكتوب بالذكاء', 4), ('كتب بالذكاء', 4),
+        ('مولد بواسطة ذكاء', 4), ('مكتوب بواسطة ذكاء', 4),
+        ('تزييف عميق', 2), ('روبوت', 2), ('شات جي بي تي', 2),
+        ('اكتشف', 1), ('كشف', 1), ('تمييز', 1),
+    ],
+}
+
+
+def _strip_accents(text: str) -> str:
+    """Remove Latin diacritics (é -> e)"""
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase words of a text"""
+    return text.casefold().translate(_SEPARATOR_TABLE).split()
+
+
+class IntentClassifier:
+    """Weighted multi-pattern classifier compiled into a word lexicon"""
+
+    def __init__(self, pattern_sets: Dict[str, List[Tuple[str, float]]], default: str = 'general_chat'):
+        """
+        Compile the pattern sets
+
+        Args:
+            pattern_sets: Request type -> list of (pattern, weight)
+            default: Type returned when nothing matches
+        """
+        self.default = default
+        self.types = list(pattern_sets)
+        self.pattern_count = 0
+        self.vocabulary = set()
+        # word -> [(pattern_id, type, weight)]
+        self._words = {}
+        # first word -> [(" w1 w2 ", pattern_id, type, weight)]
+        self._phrases = {}
+        # first word -> [(words, pattern_id, type, weight)] matched at the text start
+        self._starts = {}
+
+        for req_type, patterns in pattern_sets.items():
+            for pattern, weight in patterns:
+                start_only = pattern.startswith('^')
+                phrase = pattern.lstrip('^')
+                pattern_id = self.pattern_count
+                self.pattern_count += 1
+                # Accent-free spelling shares the pattern id (counted once)
+                for variant in {phrase, _strip_accents(phrase)}:
+                    words = tuple(_words(variant))
+                    self.vocabulary.update(words)
+                    if start_only:
+                        self._starts.setdefault(words[0], []).append((words, pattern_id, req_type, weight))
+                    elif len(words) == 1:
+                        self._words.setdefault(words[0], []).append((pattern_id, req_type, weight))
+                    else:
+                        self._phrases.setdefault(words[0], []).append(
+                            (f" {' '.join(words)} ", pattern_id, req_type, weight)
+                        )
+
+        self._first_words = frozenset(self._words) | frozenset(self._phrases)
+        logger.debug(f"Intent classifier compiled: {self.pattern_count} patterns, {len(self.types)} types")
+
+    def _tokenize(self, text: str) -> List[str]:
+        """
+        Split into lowercase words; Arabic words with attached prefixes or
+        diacritics are mapped onto the vocabulary (وبالذكاء -> ذكاء)
+        """
+        words = _words(text)
+        if text.isascii():
+            return words
+
+        mapping = {}
+        for word in set(words).difference(self.vocabulary):
+            if word[0] < '\u0600':
+                continue
+            bare = word.translate(_AR_DIACRITICS)
+            if bare not in self.vocabulary:
+                for prefix in _AR_PREFIXES:
+                    if bare.startswith(prefix) and bare[len(prefix):] in self.vocabulary:
+                        bare = bare[len(prefix):]
+                        break
+            if bare != word:
+                mapping[word] = bare
+        if mapping:
+            words = [mapping.get(word, word) for word in words]
+        return words
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """
+        Score every request type in one pass (each pattern counts once)
+
+        Args:
+            text: User input text
+
+        Returns:
+            Dictionary type -> summed weight of matched patterns
+        """
+        scores = dict.fromkeys(self.types, 0)
+        words = self._tokenize(text)
+        if not words:
+            return scores
+
+        seen = set()
+        joined = None
+
+        for word in self._first_words.intersection(words):
+            for pattern_id, req_type, weight in self._words.get(word, ()):
+                if pattern_id not in seen:
+                    seen.add(pattern_id)
+                    scores[req_type] += weight
+            phrases = self._phrases.get(word)
+            if phrases:
+                if joined is None:
+                    joined = f" {' '.join(words)} "
+                for phrase, pattern_id, req_type, weight in phrases:
+                    if pattern_id not in seen and phrase in joined:
+                        seen.add(pattern_id)
+                        scores[req_type] += weight
+
+        for start, pattern_id, req_type, weight in self._starts.get(words[0], ()):
+            if pattern_id not in seen and tuple(words[:len(start)]) == start:
+                seen.add(pattern_id)
+                scores[req_type] += weight
+        return scores
+
+    def classify(self, text: str) -> Tuple[str, Dict[str, float]]:
+        """
+        Pick the highest scoring type (ties go to the first declared type)
+
+        Args:
+            text: User input text
+
+        Returns:
+            Tuple of (request_type, scores)
+        """
+        scores = self.scores(text)
+        best = max(self.types, key=scores.__getitem__)
+        if scores[best] == 0:
+            return self.default, scores
+        return best, scores
+
+    def classify_many(self, texts: Iterable[str]) -> List[Tuple[str, Dict[str, float]]]:
+        """Classify several texts"""
+        return [self.classify(text) for text in texts]
+
+
+# Shared instance (compiled once at import)
+intent_classifier = IntentClassifier(INTENT_PATTERNS)
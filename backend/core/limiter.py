@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrency Limiter Module - Cap in-flight calls across threads and event loops
+Senior Python Developer - Shared Upstream Throttling
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimiter:
+    """
+    FIFO semaphore usable from both threads and coroutines
+
+    Flask worker threads block in acquire() while bot coroutines await
+    acquire_async(); both draw from the same pool of slots. Time spent
+    waiting for a slot is recorded for queue-wait metrics and traces.
+    """
+
+    def __init__(self, max_inflight: int):
+        """
+        Initialize limiter
+
+        Args:
+            max_inflight: Maximum number of concurrently held slots
+        """
+        if max_inflight < 1:
+            raise ValueError("max_inflight must be a positive integer")
+
+        self.max_inflight = max_inflight
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = deque()
+
+        # Queue-wait metrics
+        self.acquired = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += waited
+            if waited > self.max_wait:
+                self.max_wait = waited
+        # Shows queueing for a slot in the caller's request trace
+        tracer.record('limiter_wait', waited, max_inflight=self.max_inflight)
+
+    def _try_acquire_locked(self) -> bool:
+        """Take a free slot if nobody is queued (caller holds the lock)"""
+        if self._active < self.max_inflight and not self._waiters:
+            self._active += 1
+            return True
+        return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Block the calling thread until a slot is free
+
+        Args:
+            timeout: Maximum seconds to wait (None = forever)
+
+        Returns:
+            True if a slot was acquired, False on timeout
+        """
+        start = time.monotonic()
+        with self._lock:
+            if self._try_acquire_locked():
+                acquired_now = True
+            else:
+                acquired_now = False
+                event = threading.Event()
+                self._waiters.append(event)
+                self.queued += 1
+
+        if acquired_now:
+            self._record_wait(0.0)
+            return True
+
+        if not event.wait(timeout):
+            with self._lock:
+                if event in self._waiters:
+                    self._waiters.remove(event)
+                    return False
+            # Slot was handed over just as we timed out: keep it
+
+        self._record_wait(time.monotonic() - start)
+        return True
+
+    async def acquire_async(self) -> None:
+        """Wait (without blocking the event loop) until a slot is free"""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        with self._lock:
+            if self._try_acquire_locked():
+                future = None
+            else:
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+                self.queued += 1
+
+        if future is not None:
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    if (loop, future) in self._waiters:
+                        self._waiters.remove((loop, future))
+                        raise
+                # Slot already granted: give it back before propagating
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+
+        self._record_wait(time.monotonic() - start)
+
+    def _grant(self, future) -> None:
+        """Hand a slot to an async waiter (runs on the waiter's loop)"""
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        """Release a slot, handing it to the oldest waiter if any"""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+                except RuntimeError:
+                    # Waiter's event loop is closed; try the next one
+                    continue
+            self._active -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def stats(self) -> dict:
+        """
+        Get limiter counters
+
+        Returns:
+            Dictionary with slot usage and queue-wait statistics
+        """
+        with self._lock:
+            return {
+                'max_inflight': self.max_inflight,
+                'in_flight': self._active,
+                'waiting': len(self._waiters),
+                'acquired': self.acquired,
+                'queued': self.queued,
+                'avg_wait_seconds': round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+                'max_wait_seconds': round(self.max_wait, 4),
+            }
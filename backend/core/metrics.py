@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics Module - In-process counters, gauges and latency histograms
+Senior Python Developer - Prometheus Exposition
+
+Recording a value is a dictionary lookup and a few additions under one
+lock (about a microsecond), cheap enough to stay on in production.
+Components that already keep their own statistics (caches, limiters,
+dispatchers) register a collector instead, read only at scrape time.
+Everything is rendered in the Prometheus text format for /api/metrics
+and summarized by the periodic dump of the bot processes. Inside a
+recorded request trace, each stage is also a span (core/tracing.py).
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import aclosing
+from typing import Callable, Optional
+
+from core.cassette import cassette
+from core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds: sub-ms lookups up to minute-long Gemini retries
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Ending a stage this way is not an error (stream closed early, client gone)
+_NOT_ERRORS = (GeneratorExit, asyncio.CancelledError)
+
+
+def _label_key(labels: dict) -> tuple:
+    if len(labels) < 2:
+        return tuple(labels.items())
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Stage:
+    """Context manager timing one stage (sync or async), also a trace span"""
+
+    __slots__ = ('registry', 'labels', 'started', 'span')
+
+    def __init__(self, registry: 'MetricsRegistry', labels: tuple):
+        self.registry = registry
+        self.labels = labels
+        self.started = 0.0
+        self.span = None
+
+    def __enter__(self):
+        self.registry._add('gauge', 'stage_in_flight', self.labels, 1)
+        self.span = tracer.start_span(self.labels[0][1]) if tracer.enabled else None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self.started
+        error = exc_type.__name__ if exc_type is not None and not issubclass(exc_type, _NOT_ERRORS) else None
+        if self.span is not None:
+            tracer.end_span(*self.span, error)
+        self.registry._finish_stage(self.labels, elapsed, error)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and histograms"""
+
+    HELP = {
+        'stage_seconds': ('histogram', 'Duration of a pipeline stage'),
+        'stage_in_flight': ('gauge', 'Stage executions currently running'),
+        'stage_errors_total': ('counter', 'Stage executions that raised, by exception type'),
+        'gemini_first_chunk_seconds': ('histogram', 'Time from a streamed Gemini request to its first text chunk'),
+        'gemini_retries_total': ('counter', 'Gemini attempts retried after an error'),
+        'gemini_quota_errors_total': ('counter', 'Gemini 429 (quota exhausted) responses'),
+        'quota_rejections_total': ('counter', 'Calls refused locally by the quota governor'),
+        'api_errors_total': ('counter', 'API analysis requests answered with an error, by exception type'),
+    }
+
+    def __init__(self, namespace: str = 'isittrue', buckets: tuple = LATENCY_BUCKETS):
+        """
+        Initialize registry
+
+        Args:
+            namespace: Prefix of every exported metric name
+            buckets: Histogram upper bounds in seconds
+        """
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (kind, name) -> {label key: value}; histograms hold [bucket counts..., sum, count]
+        self._series = {}
+        self._help = dict(self.HELP)
+        self._collectors = {}
+        self._dump_thread = None
+
+    # ==================== RECORDING ====================
+
+    def _add(self, kind: str, name: str, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.setdefault((kind, name), {})
+            series[labels] = series.get(labels, 0) + value
+
+    def _observe_locked(self, name: str, labels: tuple, value: float) -> None:
+        series = self._series.setdefault(('histogram', name), {})
+        values = series.get(labels)
+        if values is None:
+            values = series[labels] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def _observe(self, name: str, labels: tuple, value: float) -> None:
+        with self._lock:
+            self._observe_locked(name, labels, value)
+
+    def _finish_stage(self, labels: tuple, elapsed: float, error: Optional[str]) -> None:
+        """Record the end of a stage under a single lock acquisition"""
+        with self._lock:
+            in_flight = self._series.setdefault(('gauge', 'stage_in_flight'), {})
+            in_flight[labels] = in_flight.get(labels, 0) - 1
+            self._observe_locked('stage_seconds', labels, elapsed)
+            if error is not None:
+                errors = self._series.setdefault(('counter', 'stage_errors_total'), {})
+                key = labels + (('error', error),)
+                errors[key] = errors.get(key, 0) + 1
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        """Register the HELP line of a metric"""
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Increment a counter"""
+        self._add('counter', name, _label_key(labels), value)
+
+    def add_gauge(self, name: str, value: float, **labels) -> None:
+        """Add to (or subtract from) a gauge"""
+        self._add('gauge', name, _label_key(labels), value)
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Set a gauge"""
+        with self._lock:
+            self._series.setdefault(('gauge', name), {})[_label_key(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record a duration in a histogram"""
+        self._observe(name, _label_key(labels), seconds)
+
+    def stage(self, stage: str) -> _Stage:
+        """
+        Time a block as one execution of a stage
+
+        Records its duration, in-flight count and exceptions:
+            with metrics.stage('web_search'): ...
+            async with metrics.stage('gemini'): ...
+        """
+        return _Stage(self, (('stage', stage),))
+
+    def timed(self, stage: str) -> Callable:
+        """
+        Decorator timing every call of a function, coroutine function or
+        async generator as a stage
+        """
+        def decorator(fn):
+            if inspect.isasyncgenfunction(fn):
+                @functools.wraps(fn)
+                async def gen_wrapper(*args, **kwargs):
+                    # aclosing: an abandoned stream ends its stage now, not at GC
+                    with self.stage(stage):
+                        async with aclosing(fn(*args, **kwargs)) as items:
+                            async for item in items:
+                                yield item
+                return gen_wrapper
+
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(stage):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def register_collector(self, prefix: str, stats_fn: Callable[[], Optional[dict]]) -> None:
+        """
+        Export the numeric values of a stats() dictionary as gauges
+
+        Read only at scrape/dump time. Nested dictionaries are flattened
+        ('memory': {'hits': 3} -> <prefix>_memory_hits).
+
+        Args:
+            prefix: Metric name prefix (e.g. 'language_cache')
+            stats_fn: Callable returning the component's statistics
+        """
+        self._collectors[prefix] = stats_fn
+
+    # ==================== READING ====================
+
+    def _collected(self) -> dict:
+        """Collector values: metric name -> value"""
+        values = {}
+
+        def flatten(prefix, stats):
+            for key, value in stats.items():
+                name = f"{prefix}_{key}"
+                if isinstance(value, dict):
+                    flatten(name, value)
+                elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[name] = value
+
+        for prefix, stats_fn in list(self._collectors.items()):
+            try:
+                stats = stats_fn()
+            except Exception as e:
+                logger.warning(f"[WARNING] Metrics collector '{prefix}' failed: {e}")
+                continue
+            if stats:
+                flatten(prefix, stats)
+        return values
+
+    def _copy_series(self) -> dict:
+        """Consistent copy of every series (caller holds the lock)"""
+        return {
+            key: {labels: list(value) if key[0] == 'histogram' else value for labels, value in values.items()}
+            for key, values in self._series.items()
+        }
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        Returns:
+            Exposition text (version 0.0.4)
+        """
+        with self._lock:
+            series = self._copy_series()
+
+        ns = self.namespace
+        lines = []
+        for (kind, name), values in sorted(series.items(), key=lambda item: item[0][1]):
+            full_name = f"{ns}_{name}"
+            help_text = self._help.get(name, (kind, name.replace('_', ' ')))[1]
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for labels, value in sorted(values.items()):
+                if kind != 'histogram':
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), value[:-2]):
+                    cumulative += count
+                    le = (('le', _format_value(bound) if bound == float('inf') else repr(bound)),)
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, le)} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {value[-2]:.6f}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {value[-1]}")
+
+        for name, value in sorted(self._collected().items()):
+            full_name = f"{ns}_{name}"
+            lines.append(f"# TYPE {full_name} gauge")
+            lines.append(f"{full_name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _quantile(self, values: list, q: float) -> float:
+        """Quantile estimated by linear interpolation inside its bucket"""
+        total = values[-1]
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, values[:-2]):
+            if cumulative + count >= rank:
+                return lower + (bound - lower) * ((rank - cumulative) / count if count else 0)
+            cumulative += count
+            lower = bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        """
+        Compact summary: per-stage latency, errors and in-flight, counters
+        and collector values
+
+        Returns:
+            Dictionary suitable for logging or JSON
+        """
+        with self._lock:
+            series = self._copy_series()
+        histograms = series.get(('histogram', 'stage_seconds'), {})
+        in_flight = series.get(('gauge', 'stage_in_flight'), {})
+        errors = series.get(('counter', 'stage_errors_total'), {})
+        counters = {
+            name + _format_labels(labels): value
+            for (kind, name), values in series.items() if kind == 'counter' and name != 'stage_errors_total'
+            for labels, value in values.items()
+        }
+
+        stages = {}
+        for labels, values in sorted(histograms.items()):
+            stage = dict(labels)['stage']
+            stages[stage] = {
+                'count': values[-1],
+                'avg_ms': round(values[-2] / values[-1] * 1000, 1) if values[-1] else 0.0,
+                'p50_ms': round(self._quantile(values, 0.5) * 1000, 1),
+                'p95_ms': round(self._quantile(values, 0.95) * 1000, 1),
+                'in_flight': in_flight.get(labels, 0),
+                'errors': sum(count for key, count in errors.items() if key[:-1] == labels),
+            }
+        return {'stages': stages, 'counters': counters, 'collected': self._collected()}
+
+    def dump(self, log: logging.Logger = None) -> None:
+        """Log the snapshot, one line per stage"""
+        log = log or logger
+        snapshot = self.snapshot()
+        for stage, values in snapshot['stages'].items():
+            log.info(f"📊 {stage}: n={values['count']} avg={values['avg_ms']}ms p50={values['p50_ms']}ms "
+                     f"p95={values['p95_ms']}ms errors={values['errors']} in_flight={values['in_flight']}")
+        if snapshot['counters']:
+            log.info(f"📊 counters: {snapshot['counters']}")
+        if snapshot['collected']:
+            log.info(f"📊 components: {snapshot['collected']}")
+
+    def start_periodic_dump(self, interval: float, log: logging.Logger = None) -> None:
+        """
+        Dump the snapshot every `interval` seconds from a daemon thread
+        (independent of any event loop; started at most once)
+        """
+        if interval <= 0 or self._dump_thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(log)
+                except Exception as e:
+                    logger.warning(f"[WARNING] Metrics dump failed: {e}")
+
+        self._dump_thread = threading.Thread(target=run, name='metrics-dump', daemon=True)
+        self._dump_thread.start()
+
+    def reset(self) -> None:
+        """Forget all recorded values (collectors are kept)"""
+        with self._lock:
+            self._series.clear()
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
+metrics.register_collector('tracing', tracer.stats)
+metrics.register_collector('cassette', cassette.stats)
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Perceptual Index Module - Near-duplicate image lookup
+Senior Python Developer - Multi-Index Hashing
+
+64-bit perceptual hashes are split into four 16-bit chunks, each indexed
+in its own dictionary. Two hashes within Hamming distance r share at least
+one chunk within distance r // 4 (pigeonhole), so a lookup probes each
+chunk exactly and with every single-bit flip, then checks the few
+candidates found. Entries persist in SQLite; the in-memory index is
+rebuilt at startup and picks up rows written by other processes.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNKS = 4
+CHUNK_BITS = 16
+_CHUNK_MASK = (1 << CHUNK_BITS) - 1
+# Largest distance whose chunks need at most one flipped bit per probe
+MAX_SUPPORTED_DISTANCE = 2 * CHUNKS - 1
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class PerceptualIndex:
+    """Persistent near-duplicate index of 64-bit perceptual hashes"""
+
+    def __init__(self, db_path: str, max_distance: int = 3, ttl: Optional[float] = 7 * 86400):
+        """
+        Initialize index
+
+        Args:
+            db_path: SQLite file holding the entries (':memory:' for tests)
+            max_distance: Largest Hamming distance treated as the same image
+            ttl: Entry freshness in seconds (None = never expires)
+        """
+        if not 0 <= max_distance <= MAX_SUPPORTED_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_SUPPORTED_DISTANCE}")
+
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        # entry id -> (hash, text_key, created_at)
+        self._entries = {}
+        # one dict per chunk: chunk value -> [(hash, entry id)]
+        self._buckets = [{} for _ in range(CHUNKS)]
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+        if db_path != ':memory:':
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS image_index ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, hash INTEGER NOT NULL, text_key TEXT NOT NULL, "
+            "source_id TEXT, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS image_index_source ON image_index (source_id)")
+
+        with self._lock:
+            self._prune()
+            self._sync()
+        logger.info(f"[OK] Perceptual index: {len(self._entries)} entries, distance <= {max_distance} ({db_path})")
+
+    # ==================== IN-MEMORY INDEX ====================
+
+    def _cutoff(self, now: float) -> float:
+        return now - self.ttl if self.ttl is not None else float('-inf')
+
+    def _insert(self, entry_id: int, phash: int, text_key: str, created_at: float) -> None:
+        self._entries[entry_id] = (phash, text_key, created_at)
+        for i, bucket in enumerate(self._buckets):
+            bucket.setdefault((phash >> (i * CHUNK_BITS)) & _CHUNK_MASK, []).append((phash, entry_id))
+
+    def _remove(self, entry_id: int) -> None:
+        phash = self._entries.pop(entry_id)[0]
+        for i, bucket in enumerate(self._buckets):
+            chunk = (phash >> (i * CHUNK_BITS)) & _CHUNK_MASK
+            entries = bucket.get(chunk)
+            if entries is not None:
+                entries.remove((phash, entry_id))
+                if not entries:
+                    del bucket[chunk]
+
+    def _sync(self) -> None:
+        """Load rows added since the last sync (possibly by another process)"""
+        rows = self._db.execute(
+            "SELECT id, hash, text_key, created_at FROM image_index WHERE id > ? AND created_at > ?",
+            (self._last_id, self._cutoff(time.time()))
+        ).fetchall()
+        for entry_id, phash, text_key, created_at in rows:
+            self._insert(entry_id, _to_unsigned(phash), text_key, created_at)
+        if rows:
+            self._last_id = rows[-1][0]
+
+    def _prune(self) -> None:
+        """Drop expired entries from disk and memory"""
+        if self.ttl is None:
+            return
+        cutoff = self._cutoff(time.time())
+        self._db.execute("DELETE FROM image_index WHERE created_at <= ?", (cutoff,))
+        for entry_id in [k for k, (_, _, created_at) in self._entries.items() if created_at <= cutoff]:
+            self._remove(entry_id)
+
+    def _matches(self, phash: int) -> dict:
+        """Entry ids within max_distance of phash -> distance"""
+        flips = self.max_distance // CHUNKS
+        matches = {}
+        for i, bucket in enumerate(self._buckets):
+            chunk = (phash >> (i * CHUNK_BITS)) & _CHUNK_MASK
+            probes = [chunk]
+            if flips:
+                probes += [chunk ^ (1 << bit) for bit in range(CHUNK_BITS)]
+            for probe in probes:
+                for entry_hash, entry_id in bucket.get(probe, ()):
+                    distance = (entry_hash ^ phash).bit_count()
+                    if distance <= self.max_distance:
+                        matches[entry_id] = distance
+        return matches
+
+    # ==================== PUBLIC API ====================
+
+    def lookup(self, phash: int, text_key: str = '') -> Optional[dict]:
+        """
+        Find the closest fresh entry for a near-duplicate image
+
+        Args:
+            phash: 64-bit perceptual hash of the image
+            text_key: Key of the accompanying text (must match exactly)
+
+        Returns:
+            Dictionary with response, distance and age, or None
+        """
+        with self._lock:
+            self._sync()
+            cutoff = self._cutoff(time.time())
+            best = None
+            for entry_id, distance in self._matches(phash).items():
+                _, entry_text, created_at = self._entries[entry_id]
+                if entry_text != text_key or created_at <= cutoff:
+                    continue
+                if best is None or (distance, -created_at) < (best[1], -best[2]):
+                    best = (entry_id, distance, created_at)
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            row = self._db.execute("SELECT response FROM image_index WHERE id = ?", (best[0],)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {'response': row[0], 'distance': best[1], 'age': time.time() - best[2]}
+
+    def lookup_source(self, source_id: str, text_key: str = '') -> Optional[dict]:
+        """
+        Find a fresh entry for the exact same file (e.g. Telegram file_unique_id)
+
+        Args:
+            source_id: Stable identifier of the uploaded file
+            text_key: Key of the accompanying text (must match exactly)
+
+        Returns:
+            Dictionary with response, distance (0) and age, or None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM image_index "
+                "WHERE source_id = ? AND text_key = ? AND created_at > ? ORDER BY id DESC LIMIT 1",
+                (source_id, text_key, self._cutoff(time.time()))
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {'response': row[0], 'distance': 0, 'age': time.time() - row[1]}
+
+    def add(self, phash: int, response: str, text_key: str = '', source_id: str = None) -> None:
+        """
+        Record the verdict given for an image
+
+        Args:
+            phash: 64-bit perceptual hash of the image
+            response: Analysis returned to the user
+            text_key: Key of the accompanying text
+            source_id: Stable identifier of the uploaded file, if any
+        """
+        with self._lock:
+            self._sync()
+            now = time.time()
+            cursor = self._db.execute(
+                "INSERT INTO image_index (hash, text_key, source_id, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                (_to_signed(phash), text_key, source_id, response, now)
+            )
+            self._insert(cursor.lastrowid, phash, text_key, now)
+            self._last_id = max(self._last_id, cursor.lastrowid)
+            # Occasional cleanup keeps the table bounded by the TTL
+            if cursor.lastrowid % 1000 == 0:
+                self._prune()
+
+    # Async callers (Telegram bot): SQLite and the index lock stay off the event loop
+
+    async def lookup_async(self, phash: int, text_key: str = '') -> Optional[dict]:
+        """Async variant of lookup"""
+        return await asyncio.to_thread(self.lookup, phash, text_key)
+
+    async def lookup_source_async(self, source_id: str, text_key: str = '') -> Optional[dict]:
+        """Async variant of lookup_source"""
+        return await asyncio.to_thread(self.lookup_source, source_id, text_key)
+
+    async def add_async(self, phash: int, response: str, text_key: str = '', source_id: str = None) -> None:
+        """Async variant of add"""
+        await asyncio.to_thread(self.add, phash, response, text_key, source_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """
+        Get index counters
+
+        Returns:
+            Dictionary with entries, hits, misses and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_distance': self.max_distance,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler Module - On-demand CPU profiling of live requests
+Senior Python Developer - Hot Spot Analysis
+
+Switched on for a bounded time from the admin endpoints, off otherwise
+(an inactive profiler costs one attribute check per request):
+
+- 'stacks': a daemon thread samples the Python stack of every thread
+  each `interval` seconds and counts them. Works for event-loop code and
+  worker threads (HTML extraction, image preprocessing) alike; output is
+  the hottest functions plus collapsed stacks for flame graph tools.
+- 'cprofile': a sampled fraction of requests runs under cProfile and the
+  statistics are merged. Deterministic but intrusive, and per thread:
+  use it for threaded Flask requests.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ('stacks', 'cprofile')
+MAX_SECONDS = 600
+MAX_DEPTH = 64
+
+# Leaf frames of threads parked waiting for work: not CPU time
+_IDLE_LEAVES = {
+    ('selectors.py', 'select'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('socket.py', 'accept'),
+    ('socketserver.py', 'serve_forever'),
+}
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Profiler:
+    """Time-boxed stack sampler / per-request cProfile aggregator"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.mode = None
+        self.deadline = 0.0
+        self.sample_rate = 0.0
+        self.interval = 0.005
+        self._reset()
+
+    def _reset(self) -> None:
+        self.started_at = None
+        self.samples = 0
+        self.idle_samples = 0
+        self.requests = 0
+        self.profiled = 0
+        self._stacks = Counter()
+        self._leaves = Counter()
+        self._stats = None
+        self._thread = None
+
+    @property
+    def active(self) -> bool:
+        return self.mode is not None and time.monotonic() < self.deadline
+
+    # ==================== CONTROL ====================
+
+    def start(self, mode: str = 'stacks', seconds: float = 30, sample_rate: float = 0.1,
+              interval: float = 0.005) -> dict:
+        """
+        Start a profiling session (replaces the previous one's data)
+
+        Args:
+            mode: 'stacks' or 'cprofile'
+            seconds: Session length, capped at MAX_SECONDS
+            sample_rate: Fraction of requests profiled ('cprofile')
+            interval: Seconds between stack samples ('stacks')
+
+        Returns:
+            Session status
+
+        Raises:
+            ValueError: Unknown mode or invalid numbers
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if seconds <= 0 or not 0 < sample_rate <= 1 or interval <= 0:
+            raise ValueError("seconds and interval must be positive, sample_rate in (0, 1]")
+
+        self.stop()
+        with self._lock:
+            self._reset()
+            self.started_at = time.time()
+            self.sample_rate = sample_rate
+            self.interval = max(interval, 0.001)
+            self.deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+            self.mode = mode
+            if mode == 'stacks':
+                self._thread = threading.Thread(target=self._sample_stacks, name='profiler', daemon=True)
+                self._thread.start()
+        logger.info(f"[OK] Profiling started: {mode} for {min(seconds, MAX_SECONDS):.0f}s")
+        return self.status()
+
+    def stop(self) -> dict:
+        """Stop the running session (data is kept for report())"""
+        thread = self._thread
+        self.mode = None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1)
+        return self.status()
+
+    def status(self) -> dict:
+        """
+        Get session state
+
+        Returns:
+            Dictionary with mode, remaining time and sample counts
+        """
+        return {
+            'active': self.active,
+            'mode': self.mode,
+            'remaining_seconds': round(max(0.0, self.deadline - time.monotonic()), 1) if self.active else 0,
+            'started_at': self.started_at,
+            'samples': self.samples,
+            'idle_samples': self.idle_samples,
+            'requests_seen': self.requests,
+            'requests_profiled': self.profiled,
+        }
+
+    # ==================== STACK SAMPLING ====================
+
+    def _sample_stacks(self) -> None:
+        me = threading.get_ident()
+        while self.mode == 'stacks' and time.monotonic() < self.deadline:
+            stacks = []
+            idle = 0
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                leaf = frame.f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_LEAVES:
+                    idle += 1
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stacks.append(stack)
+            frame = None
+
+            with self._lock:
+                self.idle_samples += idle
+                self.samples += len(stacks)
+                for stack in stacks:
+                    self._stacks[';'.join(reversed(stack))] += 1
+                    self._leaves[stack[0]] += 1
+            time.sleep(self.interval)
+        if self.mode == 'stacks':
+            self.mode = None
+
+    # ==================== PER-REQUEST CPROFILE ====================
+
+    def profile(self) -> '_ProfileContext':
+        """
+        Context manager around a request: profiled when a 'cprofile'
+        session is running and the request is sampled
+        """
+        return _ProfileContext(self)
+
+    def _begin(self) -> Optional[cProfile.Profile]:
+        if self.mode != 'cprofile':
+            return None
+        if not self.active:
+            self.mode = None
+            return None
+        self.requests += 1
+        # One profiler per thread at a time
+        if getattr(self._local, 'busy', False) or random.random() >= self.sample_rate:
+            return None
+        self._local.busy = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _end(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        self._local.busy = False
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.profiled += 1
+
+    # ==================== REPORT ====================
+
+    def report(self, limit: int = 30) -> dict:
+        """
+        Hottest functions of the current or last session
+
+        Returns:
+            Session status plus 'top' entries: self samples per function
+            ('stacks') or call counts and times ('cprofile')
+        """
+        report = self.status()
+        total = self.samples or 1
+        with self._lock:
+            leaves = self._leaves.most_common(limit)
+        if leaves:
+            report['top'] = [
+                {'function': name, 'samples': count, 'percent': round(count * 100 / total, 1)}
+                for name, count in leaves
+            ]
+        elif self._stats is not None:
+            with self._lock:
+                entries = sorted(self._stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+            report['top'] = [
+                {
+                    'function': f"{os.path.basename(filename)}:{line}:{name}",
+                    'calls': calls,
+                    'self_ms': round(self_time * 1000, 3),
+                    'cumulative_ms': round(cumulative * 1000, 3),
+                }
+                for (filename, line, name), (_, calls, self_time, cumulative, _) in entries
+            ]
+        else:
+            report['top'] = []
+        return report
+
+    def collapsed(self) -> str:
+        """
+        Raw output: collapsed stacks ('stacks', for flamegraph.pl /
+        speedscope) or the pstats listing ('cprofile')
+        """
+        with self._lock:
+            stacks = self._stacks.most_common()
+        if stacks:
+            return ''.join(f"{stack} {count}\n" for stack, count in stacks)
+        if self._stats is not None:
+            out = io.StringIO()
+            with self._lock:
+                self._stats.stream = out
+                self._stats.sort_stats('tottime').print_stats(100)
+            return out.getvalue()
+        return ''
+
+
+class _ProfileContext:
+    """Context manager profiling one request if it is sampled"""
+
+    __slots__ = ('profiler', 'profile')
+
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+        self.profile = None
+
+    def __enter__(self):
+        self.profile = self.profiler._begin()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.profile is not None:
+            self.profiler._end(self.profile)
+        return False
+
+
+# Process-wide profiler (driven by the admin endpoints)
+profiler = Profiler()
+
+
+def profile_command(method: str, data: dict, limit: int = 30) -> tuple:
+    """
+    Drive the profiler: POST starts a session, GET reports, DELETE stops
+
+    Returns:
+        Tuple of (payload, status_code)
+    """
+    if method == 'POST':
+        try:
+            status = profiler.start(
+                mode=data.get('mode', 'stacks'),
+                seconds=float(data.get('seconds', 30)),
+                sample_rate=float(data.get('sample_rate', 0.1)),
+                interval=float(data.get('interval_ms', 5)) / 1000,
+            )
+        except (TypeError, ValueError) as e:
+            return {'success': False, 'error': str(e)}, 400
+        return {'success': True, 'profile': status}, 202
+    if method == 'DELETE':
+        profiler.stop()
+    return {'success': True, 'profile': profiler.report(limit)}, 200
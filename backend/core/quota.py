@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Quota Governor Module - Proactive Gemini rate limiting
+Senior Python Developer - Cross-Process Token Buckets
+
+Requests-per-minute and tokens-per-minute buckets live in a small SQLite
+file, so every Flask worker and both Telegram bot processes draw from the
+same budget. Callers wait for capacity (up to max_wait) or fail fast with
+QuotaExceeded before the API ever answers 429.
+"""
+
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# "Please retry in 37.5s" / "retry_delay { seconds: 37 }"
+_RETRY_AFTER_RE = re.compile(r'retry(?:_delay)?\D{0,20}?(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+class QuotaExceeded(Exception):
+    """Raised when the quota budget cannot be obtained in time"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Gemini quota exhausted, retry after {retry_after:.0f}s")
+
+
+def is_quota_error(error) -> bool:
+    """
+    Check whether an upstream error is a rate-limit / quota error
+
+    Args:
+        error: Exception or error message
+
+    Returns:
+        True for 429 / quota / resource-exhausted errors
+    """
+    if isinstance(error, QuotaExceeded):
+        return True
+    error_str = str(error).lower()
+    return "429" in error_str or "quota" in error_str or "resource exhausted" in error_str
+
+
+def retry_after_from_error(error):
+    """
+    Extract the server-suggested retry delay from a 429 error
+
+    Args:
+        error: Exception or error message
+
+    Returns:
+        Delay in seconds, or None if the error does not carry one
+    """
+    match = _RETRY_AFTER_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class QuotaGovernor:
+    """
+    Token-bucket rate limiter shared across processes through SQLite
+
+    Each acquire() costs one request plus an estimated number of tokens.
+    Both buckets refill continuously at their per-minute rate. A real 429
+    from the API sets a shared cooldown that every process honours.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_wait: float = 10.0,
+        name: str = 'gemini'
+    ):
+        """
+        Initialize governor
+
+        Args:
+            db_path: SQLite file holding the bucket state
+            requests_per_minute: Request budget per minute
+            tokens_per_minute: Token budget per minute
+            max_wait: Default maximum seconds a caller waits for capacity
+            name: Bucket name (one row per governed API)
+        """
+        if requests_per_minute < 1 or tokens_per_minute < 1:
+            raise ValueError("Quota limits must be positive integers")
+
+        self.db_path = db_path
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.max_wait = max_wait
+        self.name = name
+
+        # Local counters (per process)
+        self.granted = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS quota_buckets ("
+            "name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+        )
+        logger.info(f"[OK] Quota governor: {requests_per_minute} req/min, {tokens_per_minute} tokens/min ({db_path})")
+
+    # ==================== BUCKET STATE ====================
+
+    def _refilled(self, row, now: float) -> tuple:
+        """Bucket levels after refilling since the last update"""
+        if row is None:
+            return float(self.rpm), float(self.tpm), 0.0
+        requests, tokens, updated_at, blocked_until = row
+        elapsed = max(0.0, now - updated_at)
+        requests = min(float(self.rpm), requests + elapsed * self.rpm / 60.0)
+        tokens = min(float(self.tpm), tokens + elapsed * self.tpm / 60.0)
+        return requests, tokens, blocked_until
+
+    def _transaction(self, fn):
+        """Run fn(now, row) inside an exclusive write transaction"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT requests, tokens, updated_at, blocked_until FROM quota_buckets WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+                result = fn(time.time(), row)
+                self._db.execute("COMMIT")
+                return result
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _save(self, now: float, requests: float, tokens: float, blocked_until: float) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO quota_buckets (name, requests, tokens, updated_at, blocked_until) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (self.name, requests, tokens, now, blocked_until)
+        )
+
+    def _try_take(self, tokens: int) -> float:
+        """
+        Take one request and `tokens` tokens if available
+
+        Returns:
+            0 if taken, otherwise seconds until enough capacity refills
+        """
+        # A request larger than the whole bucket would never fit
+        cost = min(float(tokens), float(self.tpm))
+
+        def take(now, row):
+            requests, available, blocked_until = self._refilled(row, now)
+            wait = 0.0
+            if blocked_until > now:
+                wait = blocked_until - now
+            if requests < 1:
+                wait = max(wait, (1 - requests) * 60.0 / self.rpm)
+            if available < cost:
+                wait = max(wait, (cost - available) * 60.0 / self.tpm)
+            if wait == 0.0:
+                requests -= 1
+                available -= cost
+            self._save(now, requests, available, blocked_until)
+            return wait
+
+        return self._transaction(take)
+
+    # ==================== PUBLIC API ====================
+
+    def _check_wait(self, wait: float, deadline: float) -> None:
+        if time.monotonic() + wait > deadline:
+            with self._lock:
+                self.rejected += 1
+            raise QuotaExceeded(wait)
+
+    def _record_grant(self, waited: float, throttled: bool) -> None:
+        with self._lock:
+            self.granted += 1
+            if throttled:
+                self.throttled += 1
+                self.total_wait += waited
+
+    def acquire(self, tokens: int = 0, max_wait: float = None) -> None:
+        """
+        Block until one request and `tokens` tokens are available
+
+        Args:
+            tokens: Estimated tokens for the call (prompt + expected output)
+            max_wait: Maximum seconds to wait (None = governor default)
+
+        Raises:
+            QuotaExceeded: If capacity will not be available in time
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait if max_wait is None else max_wait)
+        throttled = False
+        while True:
+            wait = self._try_take(tokens)
+            if wait == 0.0:
+                self._record_grant(time.monotonic() - start, throttled)
+                return
+            self._check_wait(wait, deadline)
+            throttled = True
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0, max_wait: float = None) -> None:
+        """
+        Async variant of acquire (sleeps without blocking the event loop)
+
+        Raises:
+            QuotaExceeded: If capacity will not be available in time
+        """
+        start = time.monotonic()
+        deadline = start + (self.max_wait if max_wait is None else max_wait)
+        throttled = False
+        while True:
+            # The SQLite transaction waits for other processes' write locks
+            # (up to the busy timeout): keep it off the event loop
+            wait = await asyncio.to_thread(self._try_take, tokens)
+            if wait == 0.0:
+                self._record_grant(time.monotonic() - start, throttled)
+                return
+            self._check_wait(wait, deadline)
+            throttled = True
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """
+        Correct the token bucket once the real usage is known
+
+        Args:
+            estimated: Tokens charged at acquire time
+            actual: Tokens reported by the API
+        """
+        delta = float(estimated) - float(actual)
+        if not delta:
+            return
+
+        def adjust(now, row):
+            requests, tokens, blocked_until = self._refilled(row, now)
+            # Under-estimates may push the bucket into debt
+            self._save(now, requests, min(float(self.tpm), tokens + delta), blocked_until)
+
+        self._transaction(adjust)
+
+    async def settle_async(self, estimated: int, actual: int) -> None:
+        """Async variant of settle (the transaction runs in a worker thread)"""
+        if float(estimated) != float(actual):
+            await asyncio.to_thread(self.settle, estimated, actual)
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Record an upstream 429: drain the request bucket and block all
+        processes until the cooldown has passed
+
+        Args:
+            retry_after: Cooldown in seconds
+        """
+        def block(now, row):
+            _, tokens, blocked_until = self._refilled(row, now)
+            self._save(now, 0.0, tokens, max(blocked_until, now + retry_after))
+
+        self._transaction(block)
+        logger.warning(f"[WARNING] Gemini quota cooldown for {retry_after:.0f}s")
+
+    async def penalize_async(self, retry_after: float) -> None:
+        """Async variant of penalize (the transaction runs in a worker thread)"""
+        await asyncio.to_thread(self.penalize, retry_after)
+
+    def state(self) -> dict:
+        """
+        Get current bucket levels and local counters
+
+        Returns:
+            Dictionary with shared bucket state and per-process statistics
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT requests, tokens, updated_at, blocked_until FROM quota_buckets WHERE name = ?",
+                (self.name,)
+            ).fetchone()
+            now = time.time()
+            requests, tokens, blocked_until = self._refilled(row, now)
+            return {
+                'requests_per_minute': self.rpm,
+                'tokens_per_minute': self.tpm,
+                'requests_available': round(requests, 2),
+                'tokens_available': int(tokens),
+                'cooldown_seconds': round(max(0.0, blocked_until - now), 1),
+                'granted': self.granted,
+                'throttled': self.throttled,
+                'rejected': self.rejected,
+                'avg_wait_seconds': round(self.total_wait / self.throttled, 3) if self.throttled else 0.0,
+            }
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Single-Flight Module - Coalesce concurrent identical calls
+Senior Python Developer - Upstream Call Deduplication
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+def _running_loop():
+    """Event loop running in this thread, if any"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Call:
+    """In-flight call shared by a leader and its waiters (threads or coroutines)"""
+
+    __slots__ = ('event', 'result', 'error', 'abandoned', 'loop', 'futures')
+
+    def __init__(self, loop=None):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        # Set when an async leader is cancelled: its waiters run the call themselves
+        self.abandoned = False
+        # Event loop of an async leader (None for a thread)
+        self.loop = loop
+        # (loop, future) of each coroutine waiting for the call
+        self.futures = []
+
+    def outcome(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def finish(self) -> None:
+        """Wake every waiter (once the call has left the table)"""
+        self.event.set()
+        for loop, future in self.futures:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The waiter's loop is closed: nobody is left to wake
+                pass
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; duplicates share its result
+
+    Threads (do) and coroutines (do_async) share one table, so a threaded
+    caller can wait for an in-flight coroutine and vice versa.
+    """
+
+    def __init__(self, wait_timeout: float = None):
+        """
+        Initialize single-flight group
+
+        Args:
+            wait_timeout: Maximum seconds a duplicate waits for the leader
+                (None = until it finishes). A timed-out waiter raises
+                TimeoutError; the leader keeps running for the others.
+        """
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def _timed_out(self, key: Hashable) -> TimeoutError:
+        with self._lock:
+            self.timeouts += 1
+        logger.warning(f"Timed out waiting for in-flight call: {key}")
+        return TimeoutError(f"Timed out after {self.wait_timeout}s waiting for an identical request")
+
+    def _join(self, key: Hashable, loop=None) -> tuple:
+        """
+        Become the leader for key or wait for the call in flight
+
+        Args:
+            key: Deduplication key
+            loop: Running loop of a coroutine caller (None for a thread)
+
+        Returns:
+            Tuple of (call, leader, future). call is None when a thread must
+            run on its own; future is set for coroutine waiters.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call(loop)
+                self._calls[key] = call
+                self.leaders += 1
+                return call, True, None
+
+            if loop is None and call.loop is not None and call.loop is _running_loop():
+                # Blocking this thread would stall the leader's own event loop
+                return None, True, None
+
+            self.coalesced += 1
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                call.futures.append((loop, future))
+            return call, False, future
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.finish()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Execute fn once for all concurrent callers using the same key
+
+        Args:
+            key: Deduplication key
+            fn: Function to execute
+            *args, **kwargs: Arguments forwarded to fn
+
+        Returns:
+            Result of fn (shared with concurrent duplicates)
+
+        Raises:
+            TimeoutError: If a duplicate waited longer than wait_timeout
+            Exception: Whatever fn raised, re-raised in every caller
+        """
+        call, leader, _ = self._join(key)
+        if call is None:
+            return fn(*args, **kwargs)
+
+        if not leader:
+            logger.debug(f"Coalesced duplicate call: {key}")
+            if not call.event.wait(self.wait_timeout):
+                raise self._timed_out(key)
+            if call.abandoned:
+                return self.do(key, fn, *args, **kwargs)
+            return call.outcome()
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def do_async(self, key: Hashable, coro_fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Await coro_fn once for all concurrent callers using the same key
+
+        Args:
+            key: Deduplication key
+            coro_fn: Coroutine function to execute
+            *args, **kwargs: Arguments forwarded to coro_fn
+
+        Returns:
+            Result of coro_fn (shared with concurrent duplicates)
+
+        Raises:
+            TimeoutError: If a duplicate waited longer than wait_timeout
+            Exception: Whatever coro_fn raised, re-raised in every caller
+        """
+        call, leader, future = self._join(key, asyncio.get_running_loop())
+
+        if not leader:
+            logger.debug(f"Coalesced duplicate call: {key}")
+            # Each waiter has its own future: a cancelled (or timed-out)
+            # waiter never cancels the shared call
+            try:
+                await asyncio.wait_for(future, self.wait_timeout)
+            except TimeoutError:
+                raise self._timed_out(key) from None
+            if call.abandoned:
+                # The leader was cancelled, not us: take over the call
+                return await self.do_async(key, coro_fn, *args, **kwargs)
+            return call.outcome()
+
+        try:
+            call.result = await coro_fn(*args, **kwargs)
+            return call.result
+        except asyncio.CancelledError:
+            call.abandoned = True
+            raise
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    def in_flight(self) -> int:
+        """Number of keys currently executing"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        """
+        Get coalescing counters
+
+        Returns:
+            Dictionary with leader, coalesced, timeout and in-flight counts
+        """
+        return {
+            'in_flight': self.in_flight(),
+            'leaders': self.leaders,
+            'coalesced': self.coalesced,
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+Tracing Module - Request-scoped spans written as JSONL
+Senior Python Developer - Per-Request Latency Attribution
+
+A trace starts at the edge of a request (API view, Telegram update) and
+follows it through awaits, asyncio tasks and asyncio.to_thread workers
+via a context variable. Every metrics stage opens a child span, so the
+aggregated histograms of /api/metrics can be broken down request by
+request: connect (DNS included), TLS, time to first byte, HTML
+extraction, search, quota and concurrency queueing, Gemini.
+
+One JSON object per span and line:
+    {"trace_id", "span_id", "parent_id", "name", "start", "duration_ms",
+     "attrs", "error"}
+
+A trace is kept when head-sampled (sample_rate), forced by the caller
+(admin header) or slower than slow_ms. Its spans are buffered and
+written in one go when the root span ends. While tracing is not
+configured, opening a span costs an attribute check.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import aclosing
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('isittrue_span', default=None)
+
+# Ending a span this way is not an error (stream closed early, client gone)
+_NOT_ERRORS = (GeneratorExit, asyncio.CancelledError)
+
+# httpcore trace events -> span names (body chunks are not traced)
+_HTTP_STEPS = {
+    'connection.connect_tcp': 'http_connect',  # name resolution included
+    'connection.connect_unix_socket': 'http_connect',
+    'connection.start_tls': 'http_tls',
+    'http11.send_request_headers': 'http_send',
+    'http2.send_request_headers': 'http_send',
+    'http11.receive_response_headers': 'http_first_byte',
+    'http2.receive_response_headers': 'http_first_byte',
+}
+
+
+class _Trace:
+    """Spans of one request, buffered until the root span ends"""
+
+    __slots__ = ('trace_id', 'sampled', 'wall0', 'perf0', 'spans', 'done', 'kept')
+
+    def __init__(self, sampled: bool):
+        self.trace_id = os.urandom(8).hex()
+        self.sampled = sampled
+        self.wall0 = time.time()
+        self.perf0 = time.perf_counter()
+        self.spans = []
+        self.done = False
+        self.kept = False
+
+
+class Span:
+    """One timed operation inside a trace"""
+
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'attrs', 'started', 'duration', 'error')
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attrs: dict, started: float):
+        self.trace = trace
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+        self.started = started
+        self.duration = 0.0
+        self.error = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def kept(self) -> bool:
+        """True once the trace has been written (known when the root ends)"""
+        return self.trace.kept
+
+    def set(self, **attrs) -> None:
+        """Attach attributes (status code, sizes, cache hit...)"""
+        self.attrs.update(attrs)
+
+    def to_record(self) -> dict:
+        trace = self.trace
+        return {
+            'trace_id': trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': round(trace.wall0 + (self.started - trace.perf0), 6),
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.attrs,
+            'error': self.error,
+        }
+
+
+class _SpanContext:
+    """Context manager opening a span (sync or async); yields the Span or None"""
+
+    __slots__ = ('tracer', 'name', 'attrs', 'root', 'force', 'span', 'token')
+
+    def __init__(self, tracer: 'Tracer', name: str, attrs: dict, root: bool, force: bool):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.root = root
+        self.force = force
+        self.span = None
+        self.token = None
+
+    def __enter__(self) -> Optional[Span]:
+        started = self.tracer.start_span(self.name, self.attrs, self.root, self.force)
+        if started is not None:
+            self.span, self.token = started
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.span is not None:
+            error = exc_type.__name__ if exc_type is not None and not issubclass(exc_type, _NOT_ERRORS) else None
+            self.tracer.end_span(self.span, self.token, error)
+        return False
+
+    async def __aenter__(self) -> Optional[Span]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return self.__exit__(exc_type, exc_val, exc_tb)
+
+
+class Tracer:
+    """Span recorder writing kept traces to a JSONL file"""
+
+    def __init__(self):
+        self.path = None
+        self.sample_rate = 0.0
+        self.slow_ms = 0.0
+        # True when a request can be traced (forced traces included)
+        self.enabled = False
+        self._file = None
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.started = 0
+        self.kept = 0
+        self.written = 0
+        self.write_errors = 0
+
+    def configure(self, path: Optional[str], sample_rate: float = 0.0, slow_ms: float = 0.0) -> None:
+        """
+        Enable tracing
+
+        Args:
+            path: JSONL output file (None/'' disables tracing)
+            sample_rate: Fraction of requests traced from the start (0-1)
+            slow_ms: Also keep any request slower than this (0 = off).
+                Spans of every request are then recorded, and dropped
+                at the end if it was fast.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = path or None
+            self.sample_rate = max(0.0, min(1.0, sample_rate))
+            self.slow_ms = max(0.0, slow_ms)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self.enabled = self._file is not None
+        if self.path:
+            logger.info(f"[OK] Tracing to {self.path} (sample rate {self.sample_rate}, "
+                        f"slow threshold {self.slow_ms or 'off'} ms)")
+
+    # ==================== SPANS ====================
+
+    def trace(self, name: str, force: bool = False, **attrs) -> _SpanContext:
+        """
+        Start a trace for a request, or a child span if one is running
+
+            with tracer.trace('api.analyze', force=admin) as span: ...
+
+        Args:
+            name: Root span name
+            force: Keep this trace regardless of sampling
+            **attrs: Span attributes
+        """
+        return _SpanContext(self, name, attrs, True, force)
+
+    def span(self, name: str, **attrs) -> _SpanContext:
+        """Child span of the current one (no-op outside a recorded trace)"""
+        return _SpanContext(self, name, attrs, False, False)
+
+    def traced(self, name: str) -> Callable:
+        """
+        Decorator opening a child span around every call of a function,
+        coroutine function or async generator
+        """
+        def decorator(fn):
+            if inspect.isasyncgenfunction(fn):
+                @functools.wraps(fn)
+                async def gen_wrapper(*args, **kwargs):
+                    # aclosing: an abandoned stream ends its stage now, not at GC
+                    with self.span(name):
+                        async with aclosing(fn(*args, **kwargs)) as items:
+                            async for item in items:
+                                yield item
+                return gen_wrapper
+
+            if asyncio.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def start_span(self, name: str, attrs: dict = None, root: bool = False,
+                   force: bool = False) -> Optional[tuple]:
+        """
+        Open a span and make it current
+
+        Returns:
+            (Span, context token) or None if nothing is recorded
+        """
+        if not self.enabled:
+            return None
+        parent = _current_span.get()
+        if parent is not None:
+            trace = parent.trace
+            parent_id = parent.span_id
+        elif not root:
+            return None
+        else:
+            sampled = force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+            if not sampled and not self.slow_ms:
+                return None
+            trace = _Trace(sampled)
+            parent_id = None
+            self.started += 1
+
+        span = Span(trace, name, parent_id, attrs if attrs is not None else {}, time.perf_counter())
+        return span, _current_span.set(span)
+
+    def end_span(self, span: Span, token, error: Optional[str] = None) -> None:
+        """Close a span opened by start_span"""
+        span.duration = time.perf_counter() - span.started
+        span.error = error
+        try:
+            _current_span.reset(token)
+        except (ValueError, RuntimeError):
+            # Closed from another context (e.g. async generator finalized
+            # by the event loop): that context never saw the span
+            pass
+
+        trace = span.trace
+        if span.parent_id is not None:
+            if not trace.done:
+                trace.spans.append(span)
+            elif trace.kept:
+                self._write([span])
+            return
+
+        # Root span: keep or drop the whole trace
+        trace.done = True
+        trace.kept = trace.sampled or (self.slow_ms and span.duration * 1000 >= self.slow_ms)
+        if trace.kept:
+            trace.spans.append(span)
+            self._write(trace.spans)
+            trace.spans = []
+
+    def record(self, name: str, seconds: float, **attrs) -> None:
+        """
+        Add an already finished child span (ending now) to the current one,
+        for waits measured elsewhere (queue slots, connection setup...)
+        """
+        parent = _current_span.get() if self.enabled else None
+        if parent is None:
+            return
+        span = Span(parent.trace, name, parent.span_id, attrs, time.perf_counter() - seconds)
+        span.duration = seconds
+        if not parent.trace.done:
+            parent.trace.spans.append(span)
+        elif parent.trace.kept:
+            self._write([span])
+
+    def annotate(self, **attrs) -> None:
+        """Set attributes on the current span, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span.attrs.update(attrs)
+
+    def current_trace_id(self) -> Optional[str]:
+        """Trace id of the running request, if it is recorded"""
+        span = _current_span.get()
+        return span.trace.trace_id if span is not None else None
+
+    def http_trace(self) -> Optional[Callable]:
+        """
+        httpx 'trace' extension reporting connection setup and time to
+        first byte as spans (None outside a recorded trace)
+
+            client.stream(..., extensions={'trace': tracer.http_trace()})
+        """
+        if not self.enabled or _current_span.get() is None:
+            return None
+        pending = {}
+
+        async def trace(event: str, info: dict) -> None:
+            step, _, phase = event.rpartition('.')
+            name = _HTTP_STEPS.get(step)
+            if name is None:
+                return
+            if phase == 'started':
+                pending[step] = time.perf_counter()
+            elif step in pending:
+                seconds = time.perf_counter() - pending.pop(step)
+                if phase == 'failed':
+                    self.record(name, seconds, error=type(info.get('exception')).__name__)
+                else:
+                    self.record(name, seconds)
+
+        return trace
+
+    # ==================== OUTPUT ====================
+
+    def _write(self, spans: list) -> None:
+        lines = ''.join(json.dumps(span.to_record(), ensure_ascii=False, default=str) + '\n' for span in spans)
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                # One write per trace: lines of concurrent traces never interleave
+                self._file.write(lines)
+                self._file.flush()
+                self.kept += spans[-1].parent_id is None
+                self.written += len(spans)
+            except OSError as e:
+                self.write_errors += 1
+                logger.warning(f"[WARNING] Trace write failed: {e}")
+
+    def stats(self) -> dict:
+        """
+        Get tracing counters
+
+        Returns:
+            Dictionary with traces started/kept and spans written
+        """
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'traces_started': self.started,
+            'traces_kept': self.kept,
+            'spans_written': self.written,
+            'write_errors': self.write_errors,
+        }
+
+
+# Process-wide tracer (configured by the app factory and the bots)
+tracer = Tracer()
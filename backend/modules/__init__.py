@@ -11,6 +11,7 @@ from .web_tools import *
 __all__ = [
     'IsItTrueAnalyzer',
     'extract_url_content',
+    'find_url',
     'search_web',
     'setup_logger',
 ]
@@ -3,81 +3,261 @@
 Core analysis module for IsItTrue Bot using Gemini AI
 """
 
-import io
 import asyncio
+import hashlib
 import datetime
+import functools
+import inspect
 import logging
+import time
+from contextlib import aclosing
 import google.generativeai as genai
-from PIL import Image
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from modules.config import GEMINI_API_KEY, MODEL_NAME, TEMPERATURE
-from modules.web_tools import extract_url_content, search_web
+from core.cache import ResponseCache
+from core.metrics import metrics
+from core.tracing import tracer
+from core.quota import QuotaGovernor, QuotaExceeded, is_quota_error, retry_after_from_error
+from core.singleflight import SingleFlight
+from core.perceptual import PerceptualIndex
+from core.cassette import CassetteModel, cassette
+from modules.config import (
+    GEMINI_API_KEY, MODEL_NAME, TEMPERATURE,
+    QUOTA_ENABLED, QUOTA_DB, GEMINI_RPM, GEMINI_TPM, QUOTA_MAX_WAIT,
+    ANALYSIS_WAIT_TIMEOUT,
+    PROMPT_TOKEN_BUDGET, PROMPT_PART_BUDGETS, TOKEN_COUNTER, TOKEN_COUNT_CACHE_SIZE,
+    IMAGE_INDEX_ENABLED, IMAGE_INDEX_DB, IMAGE_INDEX_MAX_DISTANCE, IMAGE_INDEX_TTL,
+)
+from modules.web_tools import extract_url_content, find_url, search_web
 from modules.language_detector import LanguageDetector
+from modules.token_budget import TokenBudget, TokenCounter
+from modules.image_tools import ImageRejected, preprocess_image_async
+from modules.audio_tools import AudioTooLarge, prepare_audio
 
 logger = logging.getLogger(__name__)
 
 # Configure Gemini
 genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel(MODEL_NAME)
+# Enregistrement / rejeu des appels quand une cassette est active (CASSETTE_MODE)
+model = CassetteModel(genai.GenerativeModel(MODEL_NAME))
 
+# Instruction système native (SDK >= 0.5, requirements.txt épingle 0.8.3) ;
+# une installation plus ancienne l'envoie comme première partie du prompt
+SUPPORTS_SYSTEM_INSTRUCTION = 'system_instruction' in inspect.signature(genai.GenerativeModel).parameters
 
-class IsItTrueAnalyzer:
-    """Main analyzer class for fact-checking"""
-    
-    @staticmethod
-    async def analyze_multimodal_content(user_text=None, image_data=None, 
-                                        audio_data=None, url_found=None, 
-                                        web_context=""):
-        """
-        Analyze content using Gemini AI with multimodal support.
-        Enhanced with language detection and multilingual responses.
-        """
-        # Detect language from user input
-        detected_lang_code, detected_lang_name, lang_instruction = 'fr', 'Français', ''
-        if user_text:
-            detected_lang_code, detected_lang_name, lang_instruction = LanguageDetector.detect_language(user_text)
-        
-        today = datetime.date.today().strftime("%d %B %Y")
-        prompt_parts = []
-        
-        # Enhanced system instruction with language support
-        system_instruction = f"""Tu es "IsItTrue" 🔍, un assistant IA intelligent et multilingue. Aujourd'hui : {today}
+# Quota partagé avec l'API web et l'autre bot (même fichier SQLite)
+quota_governor = QuotaGovernor(QUOTA_DB, GEMINI_RPM, GEMINI_TPM, QUOTA_MAX_WAIT) if QUOTA_ENABLED else None
+
+# Les analyses identiques simultanées (message viral) partagent un seul appel
+_analysis_flight = SingleFlight(wait_timeout=ANALYSIS_WAIT_TIMEOUT)
+
+# Images virales déjà vérifiées (empreinte perceptuelle -> verdict)
+image_index = PerceptualIndex(
+    IMAGE_INDEX_DB, IMAGE_INDEX_MAX_DISTANCE, IMAGE_INDEX_TTL
+) if IMAGE_INDEX_ENABLED else None
+
+# Budget de tokens du prompt (count_tokens du SDK si TOKEN_COUNTER=api)
+prompt_budget = TokenBudget(
+    TokenCounter(model if TOKEN_COUNTER == 'api' else None, TOKEN_COUNT_CACHE_SIZE),
+    PROMPT_TOKEN_BUDGET,
+    PROMPT_PART_BUDGETS,
+)
+
+metrics.register_collector('analysis_flight', _analysis_flight.stats)
+metrics.register_collector('token_budget', prompt_budget.stats)
+if image_index is not None:
+    metrics.register_collector('image_index', image_index.stats)
+
+# Minimum de texte (hors URL) pour détecter la langue sans attendre l'article
+MIN_LANGUAGE_TEXT = 12
+
+MAX_RETRIES = 3
+
+# Estimation du coût en tokens d'un appel (avant de connaître l'usage réel)
+MEDIA_PART_TOKENS = 300      # image (~258) ou fichier audio court
+OUTPUT_TOKEN_RESERVE = 1024  # réponse attendue
+QUOTA_COOLDOWN = 30.0        # si l'erreur 429 n'indique pas de délai
+
+SAFETY_SETTINGS = {
+    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+}
+
+QUOTA_ERROR_MESSAGES = {
+    'fr': "Quota API atteint. Veuillez réessayer dans quelques minutes.",
+    'en': "API quota reached. Please try again in a few minutes.",
+    'es': "Cuota de API alcanzada. Intente de nuevo en unos minutos.",
+    'de': "API-Kontingent erreicht. Bitte versuchen Sie es in einigen Minuten erneut.",
+    'it': "Quota API raggiunta. Riprovare tra qualche minuto.",
+    'pt': "Cota da API atingida. Tente novamente em alguns minutos.",
+}
+
+ERROR_MESSAGES = {
+    'fr': "Erreur: {error}. Réessayez!",
+    'en': "Error: {error}. Try again!",
+    'es': "Error: {error}. ¡Intenta de nuevo!",
+    'de': "Fehler: {error}. Versuchen Sie erneut!",
+    'it': "Errore: {error}. Riprova!",
+    'pt': "Erro: {error}. Tente novamente!",
+}
+
+
+# Instruction système, formatée une seule fois par (langue, jour)
+SYSTEM_INSTRUCTION_TEMPLATE = """Tu es "IsItTrue" 🔍, un assistant IA intelligent et multilingue. Aujourd'hui : {today}
 
 ┌─ 🌐 DIRECTIVE LINGUISTIQUE ─────────────────────┐
-│ Langue détectée: {detected_lang_name}               │
+│ Langue détectée: {lang_name}               │
 │ {lang_instruction}     │
-│ Emojis = oui, Texte = {detected_lang_name}       │
+│ Emojis = oui, Texte = {lang_name}       │
 └─────────────────────────────────────────────────┘
 
 ┌─ MISSION CRITIQUE ─────────────────────────────────────┐
 │ 1️⃣  DÉTECTE L'INTENTION (conversation vs fact-check)  │
 │ 2️⃣  ADAPTE TA RÉPONSE EN FONCTION                      │
 │ 3️⃣  SOIS PRÉCIS, COURTOIS ET ENGAGEANT                │
-│ 4️⃣  RÉPONDS EN {detected_lang_name.upper()}                       │
+│ 4️⃣  RÉPONDS EN {lang_upper}                       │
 └────────────────────────────────────────────────────────┘
 
 🟢 TYPE 1 : SALUTATIONS & CONVERSATIONS
 → RÉACTION : Sois amical, chaleureux, avec humour parfois 😊
-→ PARLE NATURELLEMENT EN {detected_lang_name.upper()}
+→ PARLE NATURELLEMENT EN {lang_upper}
 
 🔴 TYPE 2 : VÉRIFICATION D'INFORMATIONS
-→ STRUCTURE FIXE (EN {detected_lang_name.upper()}):
+→ STRUCTURE FIXE (EN {lang_upper}):
    🏳️  VERDICT : [Vrai ✓ / Faux ✗ / Trompeur ⚠️ / Non Prouvé ? / IA détectée 🤖]
    🧐 ANALYSE : Explication claire (2-3 phrases max)
    📚 SOURCES : Cite les liens pertinents du web
    💡 CONSEIL : Conseil pratique si utile
 
 🟡 TYPE 3 : QUESTIONS SUR MOI
-→ RÉACTION : Courte présentation personnelle en {detected_lang_name.upper()}
+→ RÉACTION : Courte présentation personnelle en {lang_upper}
 
 RÈGLES ABSOLUES :
-✅ RÉPONDS TOUJOURS EN {detected_lang_name.upper()}
+✅ RÉPONDS TOUJOURS EN {lang_upper}
 ✅ Sois concis mais complet  
 ✅ Utilise des emojis pour clarifier
 ✅ Si tu ne sais pas = Dis-le honnêtement
 ❌ JAMAIS de réponses vagues"""
+
+
+@functools.lru_cache(maxsize=64)
+def system_instruction_for(lang_name, lang_instruction, today):
+    """
+    Instruction système pour une langue et une date (mémorisée).
+    
+    Returns:
+        str: Formatted system instruction
+    """
+    return SYSTEM_INSTRUCTION_TEMPLATE.format(
+        today=today,
+        lang_name=lang_name,
+        lang_upper=lang_name.upper(),
+        lang_instruction=lang_instruction,
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def model_for_instruction(system_instruction):
+    """
+    Modèle Gemini portant l'instruction système (un par langue et par jour).
+    
+    Returns:
+        GenerativeModel or None: None si le SDK ne gère pas system_instruction
+        (l'instruction est alors envoyée comme première partie du prompt)
+    """
+    if not SUPPORTS_SYSTEM_INSTRUCTION:
+        return None
+    return CassetteModel(genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction), system_instruction)
+
+
+async def run_stages(stages):
+    """
+    Exécute des étapes indépendantes en parallèle.
+    Si une étape échoue, les autres sont annulées et l'erreur est propagée.
+    
+    Args:
+        stages (dict): Stage name -> coroutine
         
-        prompt_parts.append(system_instruction)
+    Returns:
+        dict: Stage name -> result
+    """
+    tasks = {
+        name: asyncio.create_task(coro, name=f"stage:{name}")
+        for name, coro in stages.items()
+    }
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}
+
+
+class IsItTrueAnalyzer:
+    """Main analyzer class for fact-checking"""
+    
+    @staticmethod
+    @metrics.timed('image_preprocess')
+    async def decode_image(image_data):
+        """
+        Prépare l'image pour Gemini (réduite, à l'endroit, sans métadonnées),
+        dans le pool de threads dédié aux images.
+        
+        Args:
+            image_data (bytes): Raw image bytes
+            
+        Returns:
+            tuple: (image prompt part or placeholder text, dHash or None)
+        """
+        try:
+            return await preprocess_image_async(image_data)
+        except ImageRejected as e:
+            logger.warning(f"⚠️ Image refusée: {e}")
+            return f"[Image refusée: {str(e)}]", None
+        except Exception as e:
+            logger.error(f"❌ Erreur ouverture image: {e}")
+            return f"[Image non lisible: {str(e)}]", None
+    
+    @staticmethod
+    async def build_prompt_parts(user_text=None, image_data=None, 
+                                 audio_data=None, url_found=None, 
+                                 web_context="", language=None,
+                                 image_part=None):
+        """
+        Build the multimodal prompt sent to Gemini.
+        
+        `language` (code, name, instruction) and `image_part` may be passed
+        when already computed by process_input, to avoid doing it twice.
+        
+        Returns:
+            tuple: (system_instruction, prompt_parts, detected_lang_code)
+        """
+        # Detect language from user input
+        detected_lang_code, detected_lang_name, lang_instruction = 'fr', 'Français', ''
+        if language:
+            detected_lang_code, detected_lang_name, lang_instruction = language
+        elif user_text:
+            detected_lang_code, detected_lang_name, lang_instruction = await asyncio.to_thread(
+                LanguageDetector.detect_language, user_text
+            )
+        
+        today = datetime.date.today().strftime("%d %B %Y")
+        system_instruction = system_instruction_for(detected_lang_name, lang_instruction, today)
+        prompt_parts = []
+
+        # Budget de tokens : les parties les moins prioritaires sont rognées d'abord
+        text_part = 'article' if url_found and not (image_data or audio_data) else 'user_text'
+        budgeted, report = await prompt_budget.fit(
+            {'system': system_instruction, text_part: user_text or "", 'web_context': web_context or ""},
+            reserved=MEDIA_PART_TOKENS if (image_data or audio_data) else 0
+        )
+        user_text, web_context = budgeted[text_part], budgeted['web_context']
+        logger.info(f"📏 Tokens prompt: {report['total']} "
+                    f"({', '.join(f'{name}={count}' for name, count in report['tokens'].items())})"
+                    + (f" - rogné: {', '.join(report['trimmed'])}" if report['trimmed'] else ""))
 
         # Handle image
         if image_data:
@@ -85,13 +265,9 @@ RÈGLES ABSOLUES :
             task = f"[📸 IMAGE REÇUE] Réponds en {detected_lang_name}"
             prompt_parts.append(task)
             
-            try:
-                img = Image.open(io.BytesIO(image_data))
-                logger.info(f"✅ Image ouverte: {img.format} {img.size}")
-                prompt_parts.append(img)
-            except Exception as e:
-                logger.error(f"❌ Erreur ouverture image: {e}")
-                prompt_parts.append(f"[Image non lisible: {str(e)}]")
+            if image_part is None:
+                image_part, _ = await IsItTrueAnalyzer.decode_image(image_data)
+            prompt_parts.append(image_part)
             
             if user_text:
                 prompt_parts.append(f"Contexte : {user_text}")
@@ -101,12 +277,11 @@ RÈGLES ABSOLUES :
             logger.info(f"🎤 Audio détecté: {len(audio_data)} bytes")
             task = f"[🎤 AUDIO REÇU] Transcris et réponds en {detected_lang_name}"
             prompt_parts.append(task)
-            temp_filename = "temp_audio_msg.ogg"
-            with open(temp_filename, "wb") as f:
-                f.write(audio_data)
-            logger.info(f"💾 Fichier audio temporaire créé")
-            uploaded_file = await asyncio.to_thread(genai.upload_file, path=temp_filename)
-            prompt_parts.append(uploaded_file)
+            try:
+                prompt_parts.append(await prepare_audio(audio_data))
+            except AudioTooLarge as e:
+                logger.warning(f"⚠️ Audio refusé: {e}")
+                prompt_parts.append(f"[Audio refusé: {str(e)}]")
 
         # Handle text / URL
         elif user_text:
@@ -120,135 +295,476 @@ RÈGLES ABSOLUES :
         if web_context:
             prompt_parts.append(f"[📰 CONTEXTE WEB]\n{web_context}\nRéponds en {detected_lang_name}")
 
+        return system_instruction, prompt_parts, detected_lang_code
+
+    @staticmethod
+    def gemini_request(system_instruction, prompt_parts):
+        """
+        Choisit le modèle et le contenu à envoyer : l'instruction système est
+        portée par le modèle quand le SDK le permet, sinon envoyée en tête.
+        
+        Returns:
+            tuple: (model, contents)
+        """
+        instructed_model = model_for_instruction(system_instruction)
+        if instructed_model is None:
+            return model, [system_instruction] + prompt_parts
+        return instructed_model, prompt_parts
+
+    @staticmethod
+    def is_quota_error(error_str):
+        """Détecte une erreur de quota (429)"""
+        return is_quota_error(error_str)
+
+    @staticmethod
+    def estimate_tokens(prompt_parts):
+        """
+        Estimation grossière du coût d'un appel (~4 caractères par token).
+        
+        Args:
+            prompt_parts (list): Text and media parts sent to Gemini
+            
+        Returns:
+            int: Estimated prompt + output tokens
+        """
+        tokens = OUTPUT_TOKEN_RESERVE
+        for part in prompt_parts:
+            tokens += len(part) // 4 if isinstance(part, str) else MEDIA_PART_TOKENS
+        return tokens
+
+    @staticmethod
+    async def acquire_quota(estimate):
+        """Réserve le quota (attente courte ou QuotaExceeded)"""
+        if quota_governor is not None:
+            with metrics.stage('quota_wait'):
+                await quota_governor.acquire_async(estimate)
+
+    @staticmethod
+    async def settle_quota(response, estimate):
+        """Corrige le seau de tokens si le SDK fournit l'usage réel"""
+        usage = getattr(response, 'usage_metadata', None)
+        if quota_governor is not None and usage is not None:
+            await quota_governor.settle_async(estimate, usage.total_token_count)
+
+    @staticmethod
+    async def on_gemini_error(error):
+        """
+        Classe une erreur Gemini et décide s'il faut réessayer.
+        Une erreur 429 déclenche un délai partagé par tous les processus :
+        la prochaine tentative attend via le gouverneur, sans sleep aveugle.
+        
+        Returns:
+            tuple: (quota, retryable)
+        """
+        if isinstance(error, QuotaExceeded):
+            metrics.inc('quota_rejections_total', source='bot')
+            return True, False
+        if is_quota_error(error):
+            metrics.inc('gemini_quota_errors_total', source='bot')
+            if quota_governor is not None:
+                await quota_governor.penalize_async(retry_after_from_error(error) or QUOTA_COOLDOWN)
+            return True, True
+        # Contenu bloqué / réponse vide : un nouvel essai échouerait aussi
+        if isinstance(error, ValueError):
+            return False, False
+        return False, True
+
+    @staticmethod
+    def error_message(lang_code, error_str, quota=False):
+        """
+        Message d'erreur dans la langue de l'utilisateur.
+        
+        Args:
+            lang_code (str): Detected language code
+            error_str (str): Raw error
+            quota (bool): True for quota (429) errors
+            
+        Returns:
+            str: Localized error message
+        """
+        if quota:
+            return QUOTA_ERROR_MESSAGES.get(lang_code, "API quota limit reached. Please try again later.")
+        template = ERROR_MESSAGES.get(lang_code)
+        if template:
+            return template.format(error=error_str[:60])
+        return f"Error: {error_str[:50]}"
+
+    @staticmethod
+    @tracer.traced('analyze_multimodal_content')
+    async def analyze_multimodal_content(user_text=None, image_data=None, 
+                                        audio_data=None, url_found=None, 
+                                        web_context="", language=None,
+                                        image_part=None, remember=None):
+        """
+        Analyze content using Gemini AI with multimodal support.
+        Enhanced with language detection and multilingual responses.
+        
+        `remember` (phash, text_key, source_id) records a successful image
+        verdict in the perceptual index.
+        """
+        system_instruction, prompt_parts, detected_lang_code = await IsItTrueAnalyzer.build_prompt_parts(
+            user_text, image_data, audio_data, url_found, web_context, language, image_part
+        )
+        gemini_model, contents = IsItTrueAnalyzer.gemini_request(system_instruction, prompt_parts)
+
         # Generate response with retry mechanism
-        max_retries = 3
+        estimate = IsItTrueAnalyzer.estimate_tokens([system_instruction] + prompt_parts)
         retry_delay = 1  # Start with 1 second
         
-        for attempt in range(max_retries):
+        for attempt in range(MAX_RETRIES):
             try:
-                safety_settings = {
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-                }
-
-                response = await model.generate_content_async(
-                    prompt_parts,
-                    generation_config=genai.types.GenerationConfig(temperature=TEMPERATURE),
-                    safety_settings=safety_settings
-                )
+                await IsItTrueAnalyzer.acquire_quota(estimate)
+                with metrics.stage('gemini'):
+                    response = await gemini_model.generate_content_async(
+                        contents,
+                        generation_config=genai.types.GenerationConfig(temperature=TEMPERATURE),
+                        safety_settings=SAFETY_SETTINGS
+                    )
+                await IsItTrueAnalyzer.settle_quota(response, estimate)
+                await IsItTrueAnalyzer.remember_image(remember, response.text)
                 return response.text
                 
             except Exception as e:
                 error_str = str(e)
-                logger.error(f"ERREUR GEMINI (Attempt {attempt+1}/{max_retries}): {error_str}")
+                logger.error(f"ERREUR GEMINI (Attempt {attempt+1}/{MAX_RETRIES}): {error_str}")
+                quota, retryable = await IsItTrueAnalyzer.on_gemini_error(e)
                 
-                # Check if it's a quota error (429)
-                if "429" in error_str or "quota" in error_str.lower():
-                    if attempt < max_retries - 1:
-                        logger.info(f"Quota limit reached. Retrying in {retry_delay}s...")
-                        await asyncio.sleep(retry_delay)
-                        retry_delay *= 2  # Exponential backoff
-                        continue
-                    else:
-                        # All retries exhausted
-                        error_msgs = {
-                            'fr': "Quota API atteint. Veuillez réessayer dans quelques minutes.",
-                            'en': "API quota reached. Please try again in a few minutes.",
-                            'es': "Cuota de API alcanzada. Intente de nuevo en unos minutos.",
-                            'de': "API-Kontingent erreicht. Bitte versuchen Sie es in einigen Minuten erneut.",
-                            'it': "Quota API raggiunta. Riprovare tra qualche minuto.",
-                            'pt': "Cota da API atingida. Tente novamente em alguns minutos.",
-                        }
-                        return error_msgs.get(detected_lang_code, "API quota limit reached. Please try again later.")
+                # All retries exhausted (or pointless)
+                if not retryable or attempt == MAX_RETRIES - 1:
+                    return IsItTrueAnalyzer.error_message(detected_lang_code, error_str, quota)
+                metrics.inc('gemini_retries_total', source='bot')
                 
-                # For non-quota errors on last attempt
-                if attempt == max_retries - 1:
-                    error_msgs = {
-                        'fr': f"Erreur: {error_str[:60]}. Réessayez!",
-                        'en': f"Error: {error_str[:60]}. Try again!",
-                        'es': f"Error: {error_str[:60]}. ¡Intenta de nuevo!",
-                        'de': f"Fehler: {error_str[:60]}. Versuchen Sie erneut!",
-                        'it': f"Errore: {error_str[:60]}. Riprova!",
-                        'pt': f"Erro: {error_str[:60]}. Tente novamente!",
-                    }
-                    return error_msgs.get(detected_lang_code, f"Error: {error_str[:50]}")
+                # Le gouverneur gère l'attente après un 429
+                if quota and quota_governor is not None:
+                    logger.info("Quota limit reached. Waiting for the shared quota to refill...")
+                    continue
                 
-                # Retry with exponential backoff for other errors
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2
+                # Retry with exponential backoff
+                if quota:
+                    logger.info(f"Quota limit reached. Retrying in {retry_delay}s...")
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2
 
     @staticmethod
-    async def process_input(user_text=None, image_data=None, audio_data=None):
+    @tracer.traced('stream_multimodal_content')
+    async def stream_multimodal_content(user_text=None, image_data=None, 
+                                       audio_data=None, url_found=None, 
+                                       web_context="", language=None,
+                                       image_part=None, remember=None):
         """
-        Main processing pipeline with improved content extraction.
+        Same as analyze_multimodal_content, but yields text chunks as
+        Gemini produces them. Only failures before the first chunk are
+        retried; a later failure ends the stream with an error notice.
+        
+        Yields:
+            str: Response text chunks
+        """
+        system_instruction, prompt_parts, detected_lang_code = await IsItTrueAnalyzer.build_prompt_parts(
+            user_text, image_data, audio_data, url_found, web_context, language, image_part
+        )
+        gemini_model, contents = IsItTrueAnalyzer.gemini_request(system_instruction, prompt_parts)
+
+        estimate = IsItTrueAnalyzer.estimate_tokens([system_instruction] + prompt_parts)
+        retry_delay = 1
+        
+        for attempt in range(MAX_RETRIES):
+            started = False
+            try:
+                await IsItTrueAnalyzer.acquire_quota(estimate)
+                # Durée jusqu'au premier fragment, puis flux complet
+                requested = time.perf_counter()
+                with metrics.stage('gemini_stream'):
+                    response = await gemini_model.generate_content_async(
+                        contents,
+                        generation_config=genai.types.GenerationConfig(temperature=TEMPERATURE),
+                        safety_settings=SAFETY_SETTINGS,
+                        stream=True
+                    )
+                    parts = []
+                    async for chunk in response:
+                        text = chunk.text
+                        if text:
+                            if not started:
+                                started = True
+                                metrics.observe('gemini_first_chunk_seconds', time.perf_counter() - requested)
+                            parts.append(text)
+                            yield text
+                await IsItTrueAnalyzer.settle_quota(response, estimate)
+                await IsItTrueAnalyzer.remember_image(remember, ''.join(parts))
+                return
+                
+            except Exception as e:
+                error_str = str(e)
+                logger.error(f"ERREUR GEMINI stream (Attempt {attempt+1}/{MAX_RETRIES}): {error_str}")
+                quota, retryable = await IsItTrueAnalyzer.on_gemini_error(e)
+                
+                if started:
+                    yield "\n\n⚠️ " + IsItTrueAnalyzer.error_message(detected_lang_code, error_str, quota)
+                    return
+                
+                if not retryable or attempt == MAX_RETRIES - 1:
+                    yield IsItTrueAnalyzer.error_message(detected_lang_code, error_str, quota)
+                    return
+                metrics.inc('gemini_retries_total', source='bot')
+                
+                if quota and quota_governor is not None:
+                    continue
+                
+                await asyncio.sleep(retry_delay)
+                retry_delay *= 2
+
+    @staticmethod
+    @metrics.timed('prepare_input')
+    async def prepare_input(user_text=None, image_data=None, audio_data=None, language=None,
+                            image_part=None):
+        """
+        Pre-LLM pipeline with improved content extraction.
+        
+        Independent stages (language detection, URL extraction, web search,
+        image decoding) run concurrently; their results are assembled in a
+        fixed order before the Gemini call.
         
         Args:
             user_text (str): User's text input
             image_data (bytes): Image data if provided
             audio_data (bytes): Audio data if provided
+            language (tuple): (code, name, instruction) already detected for
+                user_text by the caller; skips detecting it again
+            image_part: Image already preprocessed by the caller
             
         Returns:
-            str: Analysis result
+            dict: Keyword arguments for analyze_multimodal_content
         """
         image_bytes = image_data
         audio_bytes = audio_data
         web_context = ""
         url_found = None
         article_content = None
+        language_text = None
+        stages = {}
 
         # PRIORITÉ 1: Images + optional text
         if image_bytes:
             # Si y'a du texte avec l'image, on le passe comme contexte
             article_content = user_text if user_text else "Image à analyser"
+            language_text = article_content
+            if image_part is None:
+                stages['image'] = IsItTrueAnalyzer.decode_image(image_bytes)
             
             # Si le texte contient une URL, on essaie d'extraire le contexte
-            if user_text:
-                detected_url, url_content = extract_url_content(user_text)
-                if detected_url:
-                    url_found = detected_url
-                    web_context = url_content if url_content else ""
+            if find_url(user_text):
+                stages['url'] = extract_url_content(user_text)
 
         # PRIORITÉ 2: Audio (pas d'image)
         elif audio_bytes:
             article_content = user_text if user_text else "Audio à analyser"
+            language_text = article_content
 
         # PRIORITÉ 3: Text / URL (pas d'image ni audio)
         elif user_text:
-            # Essaie de détecter une URL dans le texte
-            url_found, url_content = extract_url_content(user_text)
-            
-            if url_found and url_content:
+            url_found = find_url(user_text)
+            if url_found:
+                stages['url'] = extract_url_content(user_text)
+                # Langue du message lui-même s'il y a assez de texte autour du lien,
+                # sinon celle de l'article (détectée après extraction)
+                remaining_text = user_text.replace(url_found, ' ').strip()
+                if len(remaining_text) >= MIN_LANGUAGE_TEXT:
+                    language_text = remaining_text
+            else:
+                # Web search pour contextualiser (si pas d'URL)
+                article_content = user_text
+                language_text = user_text
+                query = article_content[:200]
+                stages['search'] = search_web(query)
+                logger.info(f"🔍 Web search lancée pour: {query[:50]}...")
+
+        if language_text and not language:
+            stages['language'] = asyncio.to_thread(LanguageDetector.detect_language, language_text)
+
+        results = await run_stages(stages)
+        if language_text and language:
+            results['language'] = language
+
+        # Assemblage déterministe des résultats
+        if 'url' in results:
+            detected_url, url_content = results['url']
+            if image_bytes:
+                if detected_url:
+                    url_found = detected_url
+                    web_context = url_content if url_content else ""
+            elif url_content:
                 # URL détectée et contenu extrait avec succès
                 article_content = url_content
                 logger.info(f"✅ Contenu URL extrait: {len(url_content)} caractères")
             else:
-                # Pas d'URL ou pas pu extraire le contenu
+                # URL détectée mais contenu pas dispo, le dire à Gemini
                 article_content = user_text
-                if url_found:
-                    # URL détectée mais contenu pas dispo, le dire à Gemini
-                    web_context = f"[URL fournie mais contenu non accessible: {url_found}]"
-            
-            # Web search pour contextualiser (si pas déjà URL)
-            if not url_found and article_content:
-                query = article_content[:200]
-                web_context = await asyncio.to_thread(search_web, query)
-                logger.info(f"🔍 Web search lancée pour: {query[:50]}...")
+                web_context = f"[URL fournie mais contenu non accessible: {url_found}]"
+
+        if 'search' in results:
+            web_context = results['search']
 
         final_text_input = article_content if article_content else user_text
         
+        language = results.get('language')
+        if language is None and final_text_input:
+            language = await asyncio.to_thread(LanguageDetector.detect_language, final_text_input)
+        
         logger.info(f"📤 Envoi à Gemini - Texte: {len(final_text_input) if final_text_input else 0}c, "
                    f"Image: {'OUI' if image_bytes else 'NON'}, "
                    f"Audio: {'OUI' if audio_bytes else 'NON'}")
         
-        response = await IsItTrueAnalyzer.analyze_multimodal_content(
-            user_text=final_text_input,
-            image_data=image_bytes,
-            audio_data=audio_bytes,
-            url_found=url_found,
-            web_context=web_context
+        return {
+            'user_text': final_text_input,
+            'image_data': image_bytes,
+            'audio_data': audio_bytes,
+            'url_found': url_found,
+            'web_context': web_context,
+            'language': language,
+            'image_part': results['image'][0] if 'image' in results else image_part,
+        }
+
+    @staticmethod
+    def input_key(user_text=None, image_data=None, audio_data=None, fresh=False):
+        """
+        Clé d'une analyse : texte normalisé + empreintes des médias.
+        Une analyse `fresh` ne rejoint jamais une analyse ordinaire en cours
+        (qui pourrait répondre depuis l'index perceptuel).
+        
+        Returns:
+            str: SHA-256 hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(ResponseCache.normalize_text(user_text).encode('utf-8'))
+        for media in (image_data, audio_data):
+            digest.update(b'\x00')
+            if media:
+                digest.update(hashlib.sha256(media).digest())
+        if fresh:
+            digest.update(b'\x00fresh')
+        return digest.hexdigest()
+
+    @staticmethod
+    def image_text_key(user_text):
+        """Clé de la légende accompagnant une image (texte normalisé)"""
+        return hashlib.sha256(ResponseCache.normalize_text(user_text).encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    async def indexed_verdict(source_id, user_text=None):
+        """
+        Verdict déjà rendu pour exactement ce fichier (Telegram
+        file_unique_id), pour répondre sans même le télécharger.
+        
+        Returns:
+            str or None: Previous analysis
+        """
+        if image_index is None or not source_id:
+            return None
+        hit = await image_index.lookup_source_async(source_id, IsItTrueAnalyzer.image_text_key(user_text))
+        if hit is None:
+            return None
+        logger.info(f"♻️ Image déjà vérifiée (même fichier, il y a {hit['age'] / 3600:.1f} h)")
+        return hit['response']
+
+    @staticmethod
+    async def remember_image(remember, response):
+        """Enregistre le verdict d'une image dans l'index perceptuel"""
+        if remember is None or image_index is None or not response:
+            return
+        phash, text_key, source_id = remember
+        try:
+            await image_index.add_async(phash, response, text_key, source_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Index d'images indisponible: {e}")
+
+    @staticmethod
+    async def _check_image_index(user_text, image_data, image_source_id, fresh):
+        """
+        Prépare l'image et cherche un verdict pour une image quasi identique.
+        
+        Returns:
+            tuple: (previous response or None, image_part, remember)
+        """
+        if not image_data or image_index is None:
+            return None, None, None
+
+        image_part, phash = await IsItTrueAnalyzer.decode_image(image_data)
+        if phash is None:
+            return None, image_part, None
+
+        text_key = IsItTrueAnalyzer.image_text_key(user_text)
+        if not fresh:
+            hit = await image_index.lookup_async(phash, text_key)
+            if hit is not None:
+                logger.info(f"♻️ Image déjà vérifiée (distance {hit['distance']}, il y a {hit['age'] / 3600:.1f} h)")
+                return hit['response'], image_part, None
+        return None, image_part, (phash, text_key, image_source_id)
+
+    @staticmethod
+    async def _run_pipeline(user_text, image_data, audio_data, language=None,
+                            image_source_id=None, fresh=False):
+        previous, image_part, remember = await IsItTrueAnalyzer._check_image_index(
+            user_text, image_data, image_source_id, fresh
+        )
+        if previous is not None:
+            return previous
+        analysis_kwargs = await IsItTrueAnalyzer.prepare_input(
+            user_text, image_data, audio_data, language, image_part
         )
+        return await IsItTrueAnalyzer.analyze_multimodal_content(**analysis_kwargs, remember=remember)
+
+    @staticmethod
+    @metrics.timed('process_input')
+    async def process_input(user_text=None, image_data=None, audio_data=None, language=None,
+                            image_source_id=None, fresh=False):
+        """
+        Main processing pipeline with improved content extraction.
+        Concurrent identical inputs are coalesced into a single run, and
+        near-duplicate images reuse the verdict already given.
+        
+        Args:
+            user_text (str): User's text input
+            image_data (bytes): Image data if provided
+            audio_data (bytes): Audio data if provided
+            language (tuple): (code, name, instruction) of user_text if the
+                caller already detected it
+            image_source_id (str): Stable file id of the image (Telegram
+                file_unique_id), stored for download-free lookups
+            fresh (bool): Ignore the perceptual index and analyze again
+            
+        Returns:
+            str: Analysis result
+        """
+        key = IsItTrueAnalyzer.input_key(user_text, image_data, audio_data, fresh)
+        try:
+            return await _analysis_flight.do_async(
+                key, IsItTrueAnalyzer._run_pipeline, user_text, image_data, audio_data, language,
+                image_source_id, fresh
+            )
+        except TimeoutError as e:
+            lang_code, _, _ = language or LanguageDetector.detect_language(user_text or "")
+            return IsItTrueAnalyzer.error_message(lang_code, str(e))
+
+    @staticmethod
+    @metrics.timed('process_input_stream')
+    async def process_input_stream(user_text=None, image_data=None, audio_data=None, language=None,
+                                   image_source_id=None, fresh=False):
+        """
+        Streaming variant of process_input.
         
-        return response
+        Yields:
+            str: Response text chunks as they are generated
+        """
+        previous, image_part, remember = await IsItTrueAnalyzer._check_image_index(
+            user_text, image_data, image_source_id, fresh
+        )
+        if previous is not None:
+            yield previous
+            return
+        analysis_kwargs = await IsItTrueAnalyzer.prepare_input(
+            user_text, image_data, audio_data, language, image_part
+        )
+        # Closed with us: an abandoned reply releases the Gemini stream right away
+        async with aclosing(IsItTrueAnalyzer.stream_multimodal_content(**analysis_kwargs, remember=remember)) as chunks:
+            async for chunk in chunks:
+                yield chunk
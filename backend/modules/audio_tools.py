@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Audio handling module for IsItTrue Bot
+
+Les notes vocales courtes sont envoyées en ligne dans la requête. Les
+fichiers plus lourds passent par l'API Files : fichier temporaire propre à
+chaque requête (supprimé ensuite), un seul envoi par contenu identique, et
+poignée réutilisée jusqu'à son expiration côté serveur.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import tempfile
+
+import google.generativeai as genai
+
+from core.cache import LRUCache
+from core.cassette import cassette
+from core.metrics import metrics
+from core.singleflight import SingleFlight
+from modules.config import INLINE_AUDIO_MAX_BYTES, AUDIO_UPLOAD_CACHE_SIZE, AUDIO_UPLOAD_TTL
+
+logger = logging.getLogger(__name__)
+
+# API Files (SDK >= 0.4)
+_upload_file = getattr(genai, 'upload_file', None)
+
+# Marge avant l'expiration annoncée par le serveur (48 h par défaut)
+EXPIRY_MARGIN = 3600
+
+# Empreinte du contenu -> fichier déjà envoyé
+_uploaded_files = LRUCache(max_entries=AUDIO_UPLOAD_CACHE_SIZE, ttl=AUDIO_UPLOAD_TTL)
+_upload_flight = SingleFlight()
+metrics.register_collector('audio_upload_cache', _uploaded_files.stats)
+
+# (signature, offset, type MIME) reconnus par Gemini
+_SIGNATURES = (
+    (b'OggS', 0, 'audio/ogg'),
+    (b'fLaC', 0, 'audio/flac'),
+    (b'ID3', 0, 'audio/mp3'),
+    (b'\xff\xfb', 0, 'audio/mp3'),
+    (b'\xff\xf3', 0, 'audio/mp3'),
+    (b'WAVE', 8, 'audio/wav'),
+    (b'FORM', 0, 'audio/aiff'),
+    (b'\xff\xf1', 0, 'audio/aac'),
+    (b'\xff\xf9', 0, 'audio/aac'),
+)
+
+
+class AudioTooLarge(ValueError):
+    """Audio trop lourd pour être envoyé sans l'API Files"""
+
+
+def audio_mime_type(audio_data):
+    """
+    Type MIME d'après les premiers octets (notes vocales Telegram = OGG/Opus).
+
+    Returns:
+        str: MIME type
+    """
+    for signature, offset, mime_type in _SIGNATURES:
+        if audio_data[offset:offset + len(signature)] == signature:
+            return mime_type
+    return 'audio/ogg'
+
+
+def _upload_sync(audio_data, mime_type):
+    """Écrit un fichier temporaire propre à la requête, l'envoie puis le supprime"""
+    suffix = '.' + mime_type.split('/')[-1]
+    fd, path = tempfile.mkstemp(prefix='isittrue_audio_', suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(audio_data)
+        return _upload_file(path=path, mime_type=mime_type)
+    finally:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"⚠️ Fichier audio temporaire non supprimé ({path}): {e}")
+
+
+def _remaining_lifetime(uploaded_file):
+    """Secondes avant l'expiration annoncée du fichier (None si inconnue)"""
+    expiration = getattr(uploaded_file, 'expiration_time', None)
+    if expiration is None:
+        return None
+    if expiration.tzinfo is None:
+        expiration = expiration.replace(tzinfo=datetime.timezone.utc)
+    return (expiration - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+
+
+@metrics.timed('audio_upload')
+async def _upload(key, audio_data, mime_type):
+    if cassette.active:
+        # Enregistrement / rejeu de l'envoi (la poignée rejouée garde le même nom)
+        uploaded_file = await cassette.upload(
+            audio_data, mime_type, lambda: asyncio.to_thread(_upload_sync, audio_data, mime_type)
+        )
+    else:
+        uploaded_file = await asyncio.to_thread(_upload_sync, audio_data, mime_type)
+    lifetime = _remaining_lifetime(uploaded_file)
+    ttl = AUDIO_UPLOAD_TTL if lifetime is None else min(AUDIO_UPLOAD_TTL, lifetime - EXPIRY_MARGIN)
+    if ttl > 0:
+        _uploaded_files.set(key, uploaded_file, ttl=ttl)
+    logger.info(f"☁️ Audio envoyé: {len(audio_data) // 1024} Ko ({mime_type})")
+    return uploaded_file
+
+
+async def prepare_audio(audio_data):
+    """
+    Partie de prompt pour un audio : en ligne si court, sinon fichier envoyé
+    une seule fois par contenu (les envois simultanés du même audio sont
+    fusionnés).
+
+    Args:
+        audio_data (bytes): Octets bruts de l'audio
+
+    Returns:
+        dict or File: Inline part {'mime_type', 'data'} or uploaded file handle
+
+    Raises:
+        AudioTooLarge: Audio trop lourd et API Files indisponible
+    """
+    mime_type = audio_mime_type(audio_data)
+    if len(audio_data) <= INLINE_AUDIO_MAX_BYTES:
+        return {'mime_type': mime_type, 'data': bytes(audio_data)}
+
+    if _upload_file is None and not cassette.replaying:
+        raise AudioTooLarge(f"audio trop lourd ({len(audio_data) // 1024} Ko)")
+
+    key = hashlib.sha256(audio_data).hexdigest()
+    uploaded_file = _uploaded_files.get(key)
+    if uploaded_file is not None:
+        logger.info(f"⚡ Audio déjà envoyé, fichier réutilisé: {uploaded_file.name}")
+        return uploaded_file
+    return await _upload_flight.do_async(key, _upload, key, audio_data, mime_type)
+
+
+def upload_stats():
+    """
+    Statistiques du cache des fichiers audio envoyés.
+
+    Returns:
+        dict: Entries, hits, misses...
+    """
+    return _uploaded_files.stats()
@@ -23,5 +23,88 @@ FLASK_DEBUG = os.getenv("FLASK_DEBUG", "True") == "True"
 # AI Settings
 MODEL_NAME = "models/gemini-2.5-flash"
 TEMPERATURE = 0.4
+
 MAX_URL_CONTENT = 10000
 MAX_QUERY_LENGTH = 200
+
+# Prompt token budget, applied before each Gemini call
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 8000))  # prompt tokens, excluding the answer
+PROMPT_PART_BUDGETS = {  # per part, highest priority first (None = never trimmed)
+    'system': None,
+    'user_text': int(os.getenv("USER_TEXT_TOKEN_BUDGET", 2000)),
+    'article': int(os.getenv("ARTICLE_TOKEN_BUDGET", 4000)),
+    'web_context': int(os.getenv("WEB_CONTEXT_TOKEN_BUDGET", 1500)),
+}
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "local")  # 'local' estimator or 'api' (SDK count_tokens)
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", 2048))
+
+# Image preprocessing before multimodal calls
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))  # decompression bomb guard
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", 1536))  # Gemini tiles images by 768px anyway
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+# Audio: short clips go inline, larger ones through the Files API (uploaded once per content)
+INLINE_AUDIO_MAX_BYTES = int(os.getenv("INLINE_AUDIO_MAX_BYTES", 4 * 1024 * 1024))  # requests are capped at 20MB
+AUDIO_UPLOAD_CACHE_SIZE = int(os.getenv("AUDIO_UPLOAD_CACHE_SIZE", 256))
+AUDIO_UPLOAD_TTL = int(os.getenv("AUDIO_UPLOAD_TTL", 46 * 3600))  # uploaded files expire after 48h
+
+# Telegram media downloads
+PHOTO_TARGET_SIDE = int(os.getenv("PHOTO_TARGET_SIDE", 1280))  # smallest rendition at least this large is downloaded
+MAX_AUDIO_BYTES = int(os.getenv("MAX_AUDIO_BYTES", 20 * 1024 * 1024))  # Bot API getFile limit
+MEDIA_BUFFER_POOL_BYTES = int(os.getenv("MEDIA_BUFFER_POOL_BYTES", 32 * 1024 * 1024))  # idle download buffers kept
+
+# Perceptual index of already checked images (near-duplicates reuse the verdict)
+IMAGE_INDEX_ENABLED = os.getenv("IMAGE_INDEX_ENABLED", "True") == "True"
+IMAGE_INDEX_DB = os.getenv("IMAGE_INDEX_DB") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "image_index.sqlite3"
+)
+IMAGE_INDEX_MAX_DISTANCE = int(os.getenv("IMAGE_INDEX_MAX_DISTANCE", 3))  # differing bits out of 64 (<= 3: exact chunk probes only)
+IMAGE_INDEX_TTL = int(os.getenv("IMAGE_INDEX_TTL", 7 * 86400))  # verdicts older than this are redone
+
+# Gemini quota governor (shared with the web API through the same SQLite file)
+QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "True") == "True"
+QUOTA_DB = os.getenv("QUOTA_DB") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "quota.sqlite3"
+)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 10))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", 250000))
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", 10))
+
+# Identical concurrent analyses share one pipeline run
+ANALYSIS_WAIT_TIMEOUT = float(os.getenv("ANALYSIS_WAIT_TIMEOUT", 60))  # max seconds a duplicate waits
+
+# Telegram update dispatch (<= 1 = one update at a time)
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", 16))
+BOT_MAX_CHAT_BACKLOG = int(os.getenv("BOT_MAX_CHAT_BACKLOG", 5))  # queued + running messages per chat
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", 1000))  # all chats; beyond this updates wait their turn unaccounted
+BOT_DISPATCH_STATS_INTERVAL = float(os.getenv("BOT_DISPATCH_STATS_INTERVAL", 300))  # seconds between queue stats logs
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", 300))  # seconds between stage latency logs (0 = off)
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # JSONL span records per update ('' = off)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 0))  # also keep updates slower than this (0 = off)
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off")  # record / replay Gemini and web calls ('off' = live)
+CASSETTE_PATH = os.getenv("CASSETTE_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "cassette.jsonl.gz"
+)
+CASSETTE_LATENCY_SCALE = float(os.getenv("CASSETTE_LATENCY_SCALE", 1.0))  # replayed latencies x this (0 = none)
+
+# Telegram streaming replies
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))  # min seconds between message edits
+TELEGRAM_MAX_MESSAGE = 4096
+
+# Caching
+URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", 512))
+URL_CACHE_TTL = int(os.getenv("URL_CACHE_TTL", 900))  # seconds before revalidation
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 1024))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 1800))  # results are limited to the past week anyway
+LANGUAGE_CACHE_SIZE = int(os.getenv("LANGUAGE_CACHE_SIZE", 4096))  # memoized language detections
+
+# HTTP client (shared by web tools)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 50))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 6))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+HTTP_KEEPALIVE_EXPIRY = 60
+MAX_FETCH_BYTES = 5 * 1024 * 1024  # 5MB
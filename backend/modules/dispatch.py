@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Update dispatch module for IsItTrue Bot
+
+Traite les mises à jour Telegram en parallèle (plafond global), tout en
+gardant l'ordre des messages d'une même conversation. Une conversation qui
+accumule trop de messages en attente voit les suivants ignorés. La
+profondeur de file et le temps d'attente sont journalisés périodiquement.
+"""
+
+import asyncio
+import logging
+import time
+
+from telegram.ext import BaseUpdateProcessor
+
+from core.metrics import metrics
+from core.tracing import tracer
+
+from modules.config import (
+    BOT_CONCURRENT_UPDATES, BOT_MAX_CHAT_BACKLOG, BOT_MAX_PENDING_UPDATES, BOT_DISPATCH_STATS_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Traitement concurrent, ordonné par conversation, avec file bornée"""
+
+    def __init__(self, max_concurrent, max_chat_backlog=5, max_pending=1000, stats_interval=300):
+        """
+        Args:
+            max_concurrent (int): Mises à jour traitées simultanément
+            max_chat_backlog (int): Messages en cours ou en attente par conversation
+            max_pending (int): Mises à jour acceptées au total (en cours + en attente)
+            stats_interval (float): Secondes entre deux journaux de statistiques (0 = jamais)
+        """
+        # Le sémaphore de la classe de base est pris avant l'ordre par
+        # conversation : il ne borne que la file totale, le plafond réel est
+        # appliqué une fois le tour de la conversation arrivé.
+        super().__init__(max_concurrent_updates=max(max_pending, max_concurrent))
+        self.max_concurrent = max_concurrent
+        self.max_chat_backlog = max_chat_backlog
+        self.stats_interval = stats_interval
+        self._slots = asyncio.BoundedSemaphore(max_concurrent)
+        # chat id -> [verrou, messages en cours ou en attente]
+        self._chats = {}
+        self._stats_task = None
+
+        self.waiting = 0
+        self.running = 0
+        self.processed = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _chat_key(update):
+        """Conversation de la mise à jour (None = pas d'ordre à respecter)"""
+        if not hasattr(update, 'effective_chat'):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return f"user:{update.effective_user.id}"
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self._chat_key(update)
+        chat = None
+        if key is not None:
+            chat = self._chats.get(key)
+            if chat is None:
+                chat = self._chats[key] = [asyncio.Lock(), 0]
+            if chat[1] >= self.max_chat_backlog:
+                coroutine.close()
+                self.dropped += 1
+                logger.warning(f"⚠️ Conversation {key}: {chat[1]} messages en attente, mise à jour ignorée")
+                return
+            chat[1] += 1
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_depth = max(self.max_depth, self.waiting)
+        started = False
+        # Une trace par mise à jour : les étapes du traitement en sont les spans
+        with tracer.trace('telegram.update', update_id=getattr(update, 'update_id', None), chat=key):
+            try:
+                if chat is not None:
+                    await chat[0].acquire()
+                try:
+                    async with self._slots:
+                        wait = time.perf_counter() - queued_at
+                        self.waiting -= 1
+                        started = True
+                        self.running += 1
+                        self.total_wait += wait
+                        self.max_wait = max(self.max_wait, wait)
+                        tracer.record('dispatch_wait', wait)
+                        try:
+                            await coroutine
+                        finally:
+                            self.running -= 1
+                            self.processed += 1
+                finally:
+                    if chat is not None:
+                        chat[0].release()
+            finally:
+                if not started:
+                    self.waiting -= 1
+                    coroutine.close()
+                if chat is not None:
+                    chat[1] -= 1
+                    if not chat[1]:
+                        self._chats.pop(key, None)
+
+    async def _log_stats(self):
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            stats = self.stats()
+            logger.info(f"📊 Dispatch: {stats['running']}/{self.max_concurrent} en cours, "
+                        f"{stats['waiting']} en attente (max {stats['max_depth']}), "
+                        f"attente moy. {stats['avg_wait_ms']} ms / max {stats['max_wait_ms']} ms, "
+                        f"{stats['dropped']} ignorées")
+
+    async def initialize(self):
+        if self.stats_interval and self._stats_task is None:
+            self._stats_task = asyncio.create_task(self._log_stats())
+
+    async def shutdown(self):
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            self._stats_task = None
+        logger.info(f"📊 Dispatch final: {self.stats()}")
+
+    def stats(self):
+        """
+        Statistiques de la file de traitement.
+
+        Returns:
+            dict: En cours, en attente, conversations actives, temps d'attente...
+        """
+        return {
+            'max_concurrent': self.max_concurrent,
+            'running': self.running,
+            'waiting': self.waiting,
+            'max_depth': self.max_depth,
+            'active_chats': len(self._chats),
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'avg_wait_ms': round(self.total_wait / self.processed * 1000, 1) if self.processed else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+        }
+
+
+def update_processor():
+    """
+    Processeur de mises à jour selon la configuration
+    (BOT_CONCURRENT_UPDATES <= 1 : une mise à jour à la fois, comme avant).
+
+    Returns:
+        ChatOrderedUpdateProcessor or bool: Valeur pour ApplicationBuilder.concurrent_updates
+    """
+    if BOT_CONCURRENT_UPDATES <= 1:
+        return False
+    logger.info(f"⚙️ Traitement concurrent: {BOT_CONCURRENT_UPDATES} mises à jour, "
+                f"{BOT_MAX_CHAT_BACKLOG} max par conversation")
+    processor = ChatOrderedUpdateProcessor(
+        BOT_CONCURRENT_UPDATES, BOT_MAX_CHAT_BACKLOG, BOT_MAX_PENDING_UPDATES, BOT_DISPATCH_STATS_INTERVAL,
+    )
+    metrics.register_collector('dispatch', processor.stats)
+    return processor
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Shared async HTTP client for IsItTrue Bot web tools
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import httpx
+from core.cassette import cassette
+from core.tracing import tracer
+from modules.config import (
+    HTTP_MAX_CONNECTIONS, HTTP_MAX_PER_HOST,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY, MAX_FETCH_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; IsItTrueBot/1.0; +https://t.me/IsItTrueBot)',
+    'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8',
+}
+
+
+class HttpClient:
+    """
+    Client HTTP asynchrone partagé par les outils web.
+
+    Garde un pool de connexions keep-alive (DNS et TLS ne sont négociés
+    qu'une fois par connexion) et limite la concurrence globale et par
+    hôte, pour qu'un site lent ne bloque pas les autres conversations.
+    """
+
+    def __init__(self, max_connections=HTTP_MAX_CONNECTIONS, max_per_host=HTTP_MAX_PER_HOST,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT):
+        self.max_per_host = max_per_host
+        self._client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self._global = asyncio.Semaphore(max_connections)
+        # hôte -> [sémaphore, requêtes qui le tiennent ou l'attendent]
+        self._hosts = {}
+        self.loop = asyncio.get_running_loop()
+
+    @asynccontextmanager
+    async def _host_slot(self, url):
+        """
+        Place sur l'hôte. Le sémaphore est créé à la demande et oublié dès
+        que plus personne ne le tient ni ne l'attend, pour que la table ne
+        grossisse pas avec chaque site partagé par les utilisateurs.
+        """
+        host = urlsplit(url).hostname or ''
+        entry = self._hosts.get(host)
+        if entry is None:
+            entry = self._hosts[host] = [asyncio.Semaphore(self.max_per_host), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hosts[host]
+
+    async def request(self, method, url, headers=None, max_bytes=MAX_FETCH_BYTES, **kwargs):
+        """
+        Envoie une requête en respectant les limites de concurrence.
+        Le corps est lu en streaming et tronqué à max_bytes.
+
+        Args:
+            method (str): HTTP method
+            url (str): Target URL
+            headers (dict): Extra request headers
+            max_bytes (int): Maximum body size kept in memory
+
+        Returns:
+            tuple: (httpx.Response, body bytes)
+        """
+        with tracer.span('http', method=method, host=urlsplit(url).hostname) as span:
+            # Hôte d'abord : les requêtes en attente d'un hôte lent ne
+            # monopolisent pas les places globales
+            queued_at = asyncio.get_running_loop().time()
+            async with self._host_slot(url), self._global:
+                if span is not None:
+                    tracer.record('http_queue', asyncio.get_running_loop().time() - queued_at)
+                    kwargs['extensions'] = {'trace': tracer.http_trace()}
+                if cassette.active:
+                    # Enregistrement / rejeu (les limites de concurrence restent appliquées)
+                    response, body = await cassette.http(
+                        method, url, kwargs.get('data'),
+                        lambda: self._fetch(method, url, headers, max_bytes, kwargs),
+                    )
+                else:
+                    response, body = await self._fetch(method, url, headers, max_bytes, kwargs)
+                if span is not None:
+                    span.set(status=response.status_code, bytes=len(body))
+                return response, body
+
+    async def _fetch(self, method, url, headers, max_bytes, kwargs):
+        """Envoie la requête et lit le corps (au plus max_bytes)"""
+        async with self._client.stream(method, url, headers=headers, **kwargs) as response:
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    logger.warning(f"⚠️ Réponse tronquée à {max_bytes} octets: {url}")
+                    break
+            return response, b''.join(chunks)[:max_bytes]
+
+    async def download_into(self, url, buffer, max_bytes):
+        """
+        Télécharge un fichier en streaming directement dans un bytearray
+        réutilisable (écrit depuis le début, agrandi seulement si besoin).
+        Fichiers de l'API Telegram : seule la limite globale s'applique.
+
+        Args:
+            url (str): File URL
+            buffer (bytearray): Destination buffer
+            max_bytes (int): Maximum accepted size
+
+        Returns:
+            int: Number of bytes written
+
+        Raises:
+            OverflowError: File larger than max_bytes
+            httpx.HTTPStatusError: Non-2xx response
+        """
+        async with self._global:
+            async with self._client.stream('GET', url, extensions={'trace': tracer.http_trace()}) as response:
+                response.raise_for_status()
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    end = size + len(chunk)
+                    if end > max_bytes:
+                        raise OverflowError(end)
+                    buffer[size:end] = chunk
+                    size = end
+                return size
+
+    async def get(self, url, headers=None, **kwargs):
+        """GET request, see request()"""
+        return await self.request('GET', url, headers=headers, **kwargs)
+
+    async def post(self, url, headers=None, **kwargs):
+        """POST request, see request()"""
+        return await self.request('POST', url, headers=headers, **kwargs)
+
+    async def aclose(self):
+        """Ferme les connexions du pool"""
+        await self._client.aclose()
+
+
+_client = None
+
+
+def get_http_client():
+    """
+    Retourne le client partagé de la boucle d'événements courante.
+    Un nouveau client est créé si la boucle a changé (ex: asyncio.run).
+
+    Returns:
+        HttpClient: Shared client
+    """
+    global _client
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.loop is not loop:
+        _client = HttpClient()
+        logger.debug("Client HTTP partagé initialisé")
+    return _client
+
+
+async def close_http_client():
+    """Ferme le client partagé (à appeler à l'arrêt du bot)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
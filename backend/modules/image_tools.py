@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Image preprocessing module for IsItTrue Bot
+
+Avant l'appel multimodal, chaque image est :
+- refusée si elle est trop lourde ou si c'est une bombe de décompression
+- décodée directement à taille réduite quand c'est un JPEG (draft)
+- remise à l'endroit selon l'EXIF, puis réduite à MAX_IMAGE_SIDE
+- ré-encodée en JPEG sans métadonnées
+
+Le travail tourne dans un pool de threads dédié (Pillow libère le GIL
+pendant le décodage et le redimensionnement).
+"""
+
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from modules.config import (
+    MAX_IMAGE_BYTES, MAX_IMAGE_PIXELS, MAX_IMAGE_SIDE, IMAGE_JPEG_QUALITY, IMAGE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pillow refuse lui-même les images au-delà de 2x cette limite
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+_image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='image')
+
+
+class ImageRejected(ValueError):
+    """Image refusée avant décodage (taille, pixels)"""
+
+
+def _flatten(img):
+    """Convertit en RGB, la transparence étant posée sur fond blanc"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB') if img.mode != 'RGB' else img
+
+
+def dhash(img, hash_size=8):
+    """
+    Empreinte perceptuelle par différence (dHash) : stable après
+    recompression et redimensionnement.
+
+    Args:
+        img (PIL.Image.Image): Image déjà remise à l'endroit
+        hash_size (int): Côté de la grille (8 -> 64 bits)
+
+    Returns:
+        int: Empreinte de hash_size² bits
+    """
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def preprocess_image(image_data):
+    """
+    Prépare une image pour Gemini et calcule son empreinte perceptuelle.
+
+    Args:
+        image_data (bytes): Octets bruts reçus
+
+    Returns:
+        tuple: (partie de prompt {'mime_type', 'data'}, dHash 64 bits)
+
+    Raises:
+        ImageRejected: Image trop lourde ou trop de pixels
+        OSError: Image illisible
+    """
+    started = time.perf_counter()
+    if len(image_data) > MAX_IMAGE_BYTES:
+        raise ImageRejected(f"image trop lourde ({len(image_data) // 1024} Ko)")
+
+    img = Image.open(io.BytesIO(image_data))
+    source_format, source_size = img.format, img.size
+    # Vérifié sur l'en-tête, avant de décompresser quoi que ce soit
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise ImageRejected(f"image trop grande ({img.width}x{img.height})")
+
+    # JPEG déjà compact, à l'endroit et sans métadonnées : envoyé tel quel
+    if (source_format == 'JPEG' and max(source_size) <= MAX_IMAGE_SIDE
+            and img.mode == 'RGB' and 'exif' not in img.info and 'icc_profile' not in img.info):
+        img.draft('RGB', (64, 64))
+        return {'mime_type': 'image/jpeg', 'data': bytes(image_data)}, dhash(img)
+
+    # Décodage JPEG à l'échelle 1/2, 1/4 ou 1/8 la plus proche de la cible
+    if source_format == 'JPEG':
+        img.draft('RGB', (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    img = ImageOps.exif_transpose(img)
+    img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+    img = _flatten(img)
+
+    output = io.BytesIO()
+    # Captures d'écran (PNG, GIF...) : pas de sous-échantillonnage, le texte reste net
+    subsampling = 2 if source_format == 'JPEG' else 0
+    img.save(output, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True, subsampling=subsampling)
+    data = output.getvalue()
+
+    logger.info(f"🖼️ Image {source_format} {source_size[0]}x{source_size[1]} {len(image_data) // 1024} Ko "
+                f"-> {img.width}x{img.height} {len(data) // 1024} Ko "
+                f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+    return {'mime_type': 'image/jpeg', 'data': data}, dhash(img)
+
+
+async def preprocess_image_async(image_data):
+    """Variante async de preprocess_image, exécutée dans le pool d'images"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_image_pool, preprocess_image, image_data)
@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
 """
 Language detection module for IsItTrue Bot
+
+Ordre de détection (du moins cher au plus cher) :
+1. Écriture Unicode dominante (arabe, CJK, cyrillique, grec...) -> direct
+2. Textes courts en alphabet latin -> vote sur des mots-outils
+3. langdetect, avec une graine fixe (résultat déterministe)
+
+Les résultats sont mémorisés dans un LRU indexé par empreinte du texte.
 """
 
-from langdetect import detect, LangDetectException
+import hashlib
+import re
+import string
+from langdetect import detect, DetectorFactory, LangDetectException
 import logging
 
+from core.cache import LRUCache
+from core.metrics import metrics
+from modules.config import LANGUAGE_CACHE_SIZE
+
 logger = logging.getLogger(__name__)
 
+# langdetect est probabiliste : sans graine, le même texte peut changer de langue
+DetectorFactory.seed = 0
+
 # Mapping des codes de langue ISO vers noms complets
 LANGUAGE_NAMES = {
     'fr': 'Français',
@@ -37,6 +54,9 @@ LANGUAGE_NAMES = {
     'ro': 'Roumain',
     'hu': 'Hongrois',
     'el': 'Grec',
+    'he': 'Hébreu',
+    'fa': 'Persan',
+    'ur': 'Ourdou',
 }
 
 # Instructions de réponse par langue
@@ -54,41 +74,192 @@ LANGUAGE_INSTRUCTIONS = {
     'ko': "항상 한국어로 답변하세요. 한국어를 사용하는 사람들과 대화하고 있습니다!",
 }
 
+# Écritures reconnues sans langdetect : (début, fin, écriture)
+_SCRIPT_RANGES = (
+    (0x0600, 0x06FF, 'arabic'), (0x0750, 0x077F, 'arabic'),
+    (0xFB50, 0xFDFF, 'arabic'), (0xFE70, 0xFEFF, 'arabic'),
+    (0x0400, 0x04FF, 'cyrillic'),
+    (0x0370, 0x03FF, 'greek'),
+    (0x0590, 0x05FF, 'hebrew'),
+    (0x0900, 0x097F, 'devanagari'),
+    (0x0E00, 0x0E7F, 'thai'),
+    (0x3040, 0x30FF, 'kana'),
+    (0x4E00, 0x9FFF, 'han'), (0x3400, 0x4DBF, 'han'),
+    (0xAC00, 0xD7AF, 'hangul'), (0x1100, 0x11FF, 'hangul'),
+)
+_SCRIPT_LANGUAGES = {
+    'arabic': 'ar', 'cyrillic': 'ru', 'greek': 'el', 'hebrew': 'he',
+    'devanagari': 'hi', 'thai': 'th', 'kana': 'ja', 'han': 'zh-cn', 'hangul': 'ko',
+}
+# Lettres propres à une langue partageant l'écriture
+_PERSIAN_LETTERS = frozenset('پچژگ')
+_URDU_LETTERS = frozenset('ٹڈڑںے')
+_UKRAINIAN_LETTERS = frozenset('іїєґ')
+SCRIPT_SAMPLE = 400  # caractères examinés pour l'écriture
+
+# Mots-outils pour les textes courts, où langdetect se trompe souvent
+SHORT_TEXT_LENGTH = 60
+STOPWORDS = {
+    'fr': frozenset("le la les un une des est et je tu il elle nous vous ce c cette que qui "
+                    "pas pour dans sur avec du au mais ou vrai faux bonjour merci salut "
+                    "quoi comment pourquoi".split()),
+    'en': frozenset("the a an is are was were and i you he she it we they this that what who "
+                    "not for in on with of to do does true fake hello hi thanks how why".split()),
+    'es': frozenset("el la los las un una es son y yo tú que qué no para en con de del por "
+                    "verdad hola gracias cómo".split()),
+    'de': frozenset("der die das ein eine ist sind und ich du er sie wir nicht für mit von "
+                    "zu auf wahr hallo danke wie warum".split()),
+    'it': frozenset("il lo la gli le un una è sono e io tu che non per con di del vero ciao "
+                    "grazie come perché".split()),
+    'pt': frozenset("o a os as um uma é são e eu você que não para com de do da em verdade "
+                    "olá obrigado como".split()),
+    'nl': frozenset("de het een is zijn en ik jij wij niet voor met van op waar hallo dank "
+                    "hoe".split()),
+}
+_SEPARATORS = string.punctuation + '¿¡«»’'
+_SEPARATOR_TABLE = str.maketrans(_SEPARATORS, ' ' * len(_SEPARATORS))
+
+# Les liens ne disent rien de la langue du message
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+
+DEFAULT_LANGUAGE = 'fr'
+
+# Mémo des détections : empreinte du texte -> code langue
+_language_cache = LRUCache(max_entries=LANGUAGE_CACHE_SIZE, ttl=None)
+metrics.register_collector('language_cache', _language_cache.stats)
+
+
+def _script_language(text):
+    """
+    Langue déduite de l'écriture dominante, ou None pour l'alphabet latin.
+    """
+    counts = {}
+    latin = 0
+    for char in text[:SCRIPT_SAMPLE]:
+        if char < '\u0370':
+            if char.isalpha():
+                latin += 1
+            continue
+        code = ord(char)
+        for start, end, script in _SCRIPT_RANGES:
+            if start <= code <= end:
+                counts[script] = counts.get(script, 0) + 1
+                break
+
+    if not counts or sum(counts.values()) < latin:
+        return None
+
+    # Les kanas suffisent à distinguer le japonais des idéogrammes chinois
+    if 'kana' in counts:
+        return 'ja'
+    script = max(counts, key=counts.get)
+    sample = text[:SCRIPT_SAMPLE]
+    if script == 'arabic':
+        if _URDU_LETTERS.intersection(sample):
+            return 'ur'
+        if _PERSIAN_LETTERS.intersection(sample):
+            return 'fa'
+    elif script == 'cyrillic' and _UKRAINIAN_LETTERS.intersection(sample.lower()):
+        return 'uk'
+    return _SCRIPT_LANGUAGES[script]
+
+
+def _stopword_language(text):
+    """
+    Langue d'un texte court d'après ses mots-outils, ou None si ambigu.
+    """
+    words = text.lower().translate(_SEPARATOR_TABLE).split()
+    scores = {lang: len(stopwords.intersection(words)) for lang, stopwords in STOPWORDS.items()}
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    (best, best_score), (_, second_score) = ranked[0], ranked[1]
+    if best_score and best_score > second_score:
+        return best
+    return None
+
 
 class LanguageDetector:
     """Détecteur de langue pour IsItTrue"""
     
     @staticmethod
-    def detect_language(text):
+    def identify_language(text):
         """
-        Détecte la langue du texte fourni.
+        Identifie la langue du texte, sans passer par le mémo.
         
         Args:
             text (str): Texte à analyser
             
         Returns:
-            tuple: (code_langue, nom_langue, instruction)
+            str: Code ISO de la langue (français par défaut)
         """
-        if not text or len(text.strip()) < 3:
-            # Par défaut, français
-            return 'fr', 'Français', LANGUAGE_INSTRUCTIONS.get('fr', '')
+        if '://' in text or 'www.' in text:
+            text = _URL_RE.sub(' ', text)
+        text = text.strip()
+        if len(text) < 3:
+            return DEFAULT_LANGUAGE
+        
+        lang_code = _script_language(text)
+        if lang_code:
+            return lang_code
+        
+        if len(text) <= SHORT_TEXT_LENGTH:
+            lang_code = _stopword_language(text)
+            if lang_code:
+                return lang_code
         
         try:
-            lang_code = detect(text)
-            lang_name = LANGUAGE_NAMES.get(lang_code, lang_code.upper())
-            instruction = LANGUAGE_INSTRUCTIONS.get(lang_code, 
-                                                   f"Respond in {lang_name}.")
-            
-            logger.info(f"🌐 Langue détectée: {lang_name} ({lang_code})")
-            return lang_code, lang_name, instruction
-            
+            return detect(text)
         except LangDetectException as e:
             logger.warning(f"Impossible de détecter la langue: {e}")
-            # Fallback au français
-            return 'fr', 'Français', LANGUAGE_INSTRUCTIONS.get('fr', '')
         except Exception as e:
             logger.error(f"Erreur lors de la détection: {e}")
-            return 'fr', 'Français', LANGUAGE_INSTRUCTIONS.get('fr', '')
+        return DEFAULT_LANGUAGE
+    
+    @staticmethod
+    def detect_language(text):
+        """
+        Détecte la langue du texte fourni (résultat mémorisé).
+        
+        Args:
+            text (str): Texte à analyser
+            
+        Returns:
+            tuple: (code_langue, nom_langue, instruction)
+        """
+        if not text or len(text.strip()) < 3:
+            # Par défaut, français
+            return LanguageDetector.describe(DEFAULT_LANGUAGE)
+        
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        lang_code = _language_cache.get(key)
+        if lang_code is None:
+            with metrics.stage('detect_language'):
+                lang_code = LanguageDetector.identify_language(text)
+            _language_cache.set(key, lang_code)
+            logger.info(f"🌐 Langue détectée: {LANGUAGE_NAMES.get(lang_code, lang_code.upper())} ({lang_code})")
+        
+        return LanguageDetector.describe(lang_code)
+    
+    @staticmethod
+    def describe(lang_code):
+        """
+        Nom et instruction de réponse d'un code langue.
+        
+        Returns:
+            tuple: (code_langue, nom_langue, instruction)
+        """
+        lang_name = LANGUAGE_NAMES.get(lang_code, lang_code.upper())
+        instruction = LANGUAGE_INSTRUCTIONS.get(lang_code, f"Respond in {lang_name}.")
+        return lang_code, lang_name, instruction
+    
+    @staticmethod
+    def cache_stats():
+        """
+        Statistiques du mémo de détection.
+        
+        Returns:
+            dict: Hits, misses, taille...
+        """
+        return _language_cache.stats()
     
     @staticmethod
     def get_instruction_for_language(lang_code):
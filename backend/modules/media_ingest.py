@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Media ingestion module for IsItTrue Bot
+
+Téléchargement des photos et audios Telegram :
+- la plus petite déclinaison de la photo qui suffit au modèle est choisie
+  (inutile de rapatrier une version 2560 px réduite ensuite à 1536 px)
+- les tailles annoncées par Telegram sont vérifiées avant tout téléchargement
+- le fichier est lu en streaming dans un tampon réutilisé d'un message à
+  l'autre, puis transmis à l'analyseur sous forme de memoryview (sans copie)
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from core.metrics import metrics
+from modules.config import PHOTO_TARGET_SIDE, MAX_IMAGE_BYTES, MEDIA_BUFFER_POOL_BYTES
+from modules.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Les tampons sont alloués par paliers, pour être réutilisables
+BUFFER_STEP = 256 * 1024
+
+
+class MediaTooLarge(ValueError):
+    """Fichier trop lourd, refusé avant ou pendant le téléchargement"""
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):.1f} Mo"
+
+
+def pick_photo(photos, target_side=PHOTO_TARGET_SIDE, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Choisit la déclinaison à télécharger parmi les PhotoSize d'un message.
+
+    Args:
+        photos (list): PhotoSize du message (Telegram les classe par taille)
+        target_side (int): Plus grand côté suffisant pour l'analyse
+        max_bytes (int): Taille maximale acceptée
+
+    Returns:
+        PhotoSize: Plus petite déclinaison atteignant target_side, sinon la plus grande
+
+    Raises:
+        MediaTooLarge: Toutes les déclinaisons dépassent max_bytes
+    """
+    candidates = sorted(
+        (photo for photo in photos if not photo.file_size or photo.file_size <= max_bytes),
+        key=lambda photo: photo.width * photo.height
+    )
+    if not candidates:
+        raise MediaTooLarge(f"photo trop lourde ({_mb(photos[-1].file_size)}, max {_mb(max_bytes)})")
+    for photo in candidates:
+        if max(photo.width, photo.height) >= target_side:
+            return photo
+    return candidates[-1]
+
+
+class BufferPool:
+    """Tampons de téléchargement réutilisables, bornés en mémoire totale"""
+
+    def __init__(self, max_bytes=MEDIA_BUFFER_POOL_BYTES):
+        """
+        Args:
+            max_bytes (int): Taille cumulée maximale des tampons inactifs conservés
+        """
+        self.max_bytes = max_bytes
+        self._free = []
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+
+    def acquire(self, size_hint):
+        """Plus petit tampon libre d'au moins size_hint octets (alloué sinon)"""
+        with self._lock:
+            for i, buffer in enumerate(self._free):
+                if len(buffer) >= size_hint:
+                    self.reused += 1
+                    return self._free.pop(i)
+            self.allocated += 1
+        return bytearray(-(-max(size_hint, 1) // BUFFER_STEP) * BUFFER_STEP)
+
+    def release(self, buffer):
+        """Rend un tampon ; il est gardé tant que la réserve reste sous max_bytes"""
+        with self._lock:
+            if sum(map(len, self._free)) + len(buffer) <= self.max_bytes:
+                self._free.append(buffer)
+                self._free.sort(key=len)
+
+    def stats(self):
+        """
+        Statistiques de la réserve.
+
+        Returns:
+            dict: Tampons libres, octets gardés, réutilisations, allocations
+        """
+        with self._lock:
+            return {
+                'free_buffers': len(self._free),
+                'free_bytes': sum(map(len, self._free)),
+                'reused': self.reused,
+                'allocated': self.allocated,
+            }
+
+
+_buffers = BufferPool()
+metrics.register_collector('media_buffers', _buffers.stats)
+
+
+@asynccontextmanager
+async def download_media(media, max_bytes):
+    """
+    Télécharge une pièce jointe Telegram dans un tampon réutilisable.
+
+    Le memoryview fourni n'est valable que dans le bloc `async with` :
+    le tampon est rendu à la réserve en sortie.
+
+    Args:
+        media: PhotoSize, Voice ou Audio (None : rien à télécharger)
+        max_bytes (int): Taille maximale acceptée
+
+    Yields:
+        memoryview or None: Octets du fichier
+
+    Raises:
+        MediaTooLarge: Fichier plus lourd que max_bytes
+    """
+    if media is None:
+        yield None
+        return
+    if media.file_size and media.file_size > max_bytes:
+        raise MediaTooLarge(f"fichier trop lourd ({_mb(media.file_size)}, max {_mb(max_bytes)})")
+
+    started = time.perf_counter()
+    tg_file = await media.get_file()
+    buffer = _buffers.acquire(media.file_size or tg_file.file_size or BUFFER_STEP)
+    view = None
+    try:
+        with metrics.stage('media_download'):
+            if tg_file.file_path.startswith(('http://', 'https://')):
+                try:
+                    size = await get_http_client().download_into(tg_file.file_path, buffer, max_bytes)
+                except OverflowError as e:
+                    raise MediaTooLarge(f"fichier trop lourd (max {_mb(max_bytes)})") from e
+            else:
+                # Serveur Bot API local : le fichier est déjà sur disque
+                data = await asyncio.to_thread(Path(tg_file.file_path).read_bytes)
+                if len(data) > max_bytes:
+                    raise MediaTooLarge(f"fichier trop lourd ({_mb(len(data))}, max {_mb(max_bytes)})")
+                size = len(data)
+                buffer[:size] = data
+
+        logger.info(f"📥 Média téléchargé: {size // 1024} Ko en {(time.perf_counter() - started) * 1000:.0f} ms")
+        view = memoryview(buffer)[:size]
+        yield view
+    finally:
+        if view is not None:
+            view.release()
+        _buffers.release(buffer)
+
+
+def buffer_stats():
+    """
+    Statistiques de la réserve de tampons de téléchargement.
+
+    Returns:
+        dict: Tampons libres, octets gardés, réutilisations, allocations
+    """
+    return _buffers.stats()
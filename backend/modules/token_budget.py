@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Token budget module for IsItTrue Bot
+
+Compte les tokens de chaque partie du prompt (estimateur local ou
+count_tokens du SDK, résultats mémorisés) et rogne les parties les moins
+prioritaires quand le prompt dépasse son budget.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+
+from core.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Idéogrammes, kanas et hangul : environ un token par caractère
+_CJK_RE = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+CHARS_PER_TOKEN_LATIN = 4.0   # ASCII et Latin-1 (accents)
+CHARS_PER_TOKEN_OTHER = 2.5   # arabe, cyrillique, grec, hébreu...
+TRIM_MARKER = " […]"
+
+
+def estimate_tokens(text):
+    """
+    Estimation locale du nombre de tokens, selon l'écriture.
+
+    Args:
+        text (str): Texte à compter
+
+    Returns:
+        int: Nombre de tokens estimé
+    """
+    if not text:
+        return 0
+    if text.isascii():
+        return int(len(text) / CHARS_PER_TOKEN_LATIN) + 1
+
+    cjk = len(_CJK_RE.findall(text))
+    latin = len(text.encode('latin-1', 'ignore'))
+    other = len(text) - cjk - latin
+    return int(cjk + latin / CHARS_PER_TOKEN_LATIN + other / CHARS_PER_TOKEN_OTHER) + 1
+
+
+class TokenCounter:
+    """Compteur de tokens avec mémo (local par défaut, API en option)"""
+
+    def __init__(self, model=None, cache_size=2048):
+        """
+        Args:
+            model: GenerativeModel utilisé pour count_tokens (None = estimation locale)
+            cache_size (int): Nombre de comptes mémorisés
+        """
+        self.model = model
+        self._cache = LRUCache(max_entries=cache_size, ttl=None)
+
+    async def count(self, text):
+        """
+        Compte les tokens d'un texte (mémorisé par empreinte).
+
+        Returns:
+            int: Nombre de tokens
+        """
+        if not text:
+            return 0
+
+        key = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            return tokens
+
+        if self.model is not None:
+            try:
+                tokens = (await self.model.count_tokens_async(text)).total_tokens
+            except Exception as e:
+                logger.warning(f"⚠️ count_tokens indisponible, estimation locale: {e}")
+        if tokens is None:
+            tokens = estimate_tokens(text)
+
+        self._cache.set(key, tokens)
+        return tokens
+
+
+def trim_to_tokens(text, tokens, budget):
+    """
+    Rogne un texte à environ `budget` tokens, sur une frontière de mot.
+
+    Args:
+        text (str): Texte à rogner
+        tokens (int): Nombre de tokens actuel du texte
+        budget (int): Nombre de tokens visé
+
+    Returns:
+        tuple: (texte rogné, nombre de tokens estimé)
+    """
+    if budget <= 0:
+        return "", 0
+    if tokens <= budget:
+        return text, tokens
+
+    cut = int(len(text) * budget / tokens) - len(TRIM_MARKER)
+    space = text.rfind(' ', 0, cut)
+    if space > cut // 2:
+        cut = space
+    trimmed = text[:max(cut, 0)].rstrip() + TRIM_MARKER
+    return trimmed, min(budget, round(tokens * len(trimmed) / len(text)))
+
+
+class TokenBudget:
+    """Répartit un budget de tokens entre les parties d'un prompt"""
+
+    def __init__(self, counter, total, part_budgets):
+        """
+        Args:
+            counter (TokenCounter): Compteur de tokens
+            total (int): Budget total du prompt (hors réponse)
+            part_budgets (dict): Nom de partie -> budget (None = jamais rognée),
+                dans l'ordre de priorité décroissante
+        """
+        self.counter = counter
+        self.total = total
+        self.part_budgets = part_budgets
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.tokens_sent = 0
+
+    async def fit(self, parts, reserved=0):
+        """
+        Compte les parties et rogne les moins prioritaires pour tenir le budget.
+
+        Args:
+            parts (dict): Nom de partie -> texte
+            reserved (int): Tokens déjà pris par ailleurs (images, audio)
+
+        Returns:
+            tuple: (parties rognées, rapport {'tokens', 'original', 'trimmed', 'total'})
+        """
+        order = sorted(parts, key=lambda name: list(self.part_budgets).index(name)
+                       if name in self.part_budgets else len(self.part_budgets))
+        texts = dict(parts)
+        original = {name: await self.counter.count(texts[name]) for name in order}
+        counts = dict(original)
+        trimmed = []
+
+        def shrink(name, budget):
+            texts[name], counts[name] = trim_to_tokens(texts[name], counts[name], budget)
+            if name not in trimmed:
+                trimmed.append(name)
+
+        # 1. Budget propre à chaque partie
+        for name in order:
+            budget = self.part_budgets.get(name)
+            if budget is not None and counts[name] > budget:
+                shrink(name, budget)
+
+        # 2. Budget global : on rogne en partant de la moins prioritaire
+        overflow = sum(counts.values()) + reserved - self.total
+        for name in reversed(order):
+            if overflow <= 0:
+                break
+            if self.part_budgets.get(name) is None or not counts[name]:
+                continue
+            before = counts[name]
+            shrink(name, max(0, before - overflow))
+            overflow -= before - counts[name]
+
+        total = sum(counts.values()) + reserved
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += total
+            if trimmed:
+                self.trimmed_requests += 1
+
+        return texts, {'tokens': counts, 'original': original, 'trimmed': trimmed, 'total': total}
+
+    def stats(self):
+        """
+        Statistiques cumulées du budget.
+
+        Returns:
+            dict: Requêtes, requêtes rognées, tokens moyens par prompt
+        """
+        with self._lock:
+            return {
+                'budget': self.total,
+                'requests': self.requests,
+                'trimmed_requests': self.trimmed_requests,
+                'avg_prompt_tokens': round(self.tokens_sent / self.requests) if self.requests else 0,
+            }
@@ -4,55 +4,157 @@ Web extraction and search tools for IsItTrue Bot
 """
 
 import re
+import time
+import asyncio
 import logging
+from html import unescape
+from urllib.parse import urlsplit, parse_qs
 import trafilatura
-from duckduckgo_search import DDGS
-from modules.config import MAX_URL_CONTENT, MAX_QUERY_LENGTH
+from trafilatura.settings import use_config
+from lxml import html as lxml_html
+from core.cache import LRUCache
+from core.metrics import metrics
+from core.tracing import tracer
+from core.singleflight import SingleFlight
+from modules.http_client import get_http_client
+from modules.config import (
+    MAX_URL_CONTENT, MAX_QUERY_LENGTH,
+    URL_CACHE_SIZE, URL_CACHE_TTL,
+    SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL,
+)
 
 logger = logging.getLogger(__name__)
 
+DDG_HTML_URL = "https://html.duckduckgo.com/html/"
+DDG_MAX_RESULTS = 5
 
-def extract_url_content(text):
+# L'extraction tourne dans un thread : le timeout de trafilatura repose
+# sur signal.alarm, qui n'est disponible que dans le thread principal
+TRAFILATURA_CONFIG = use_config()
+TRAFILATURA_CONFIG.set('DEFAULT', 'EXTRACTION_TIMEOUT', '0')
+
+# Cache des articles extraits par URL. Les entrées survivent à leur TTL
+# pour pouvoir être revalidées (ETag / Last-Modified) sans re-extraction.
+_url_cache = LRUCache(max_entries=URL_CACHE_SIZE, ttl=None)
+
+# Cache des résultats de recherche, indexé par requête normalisée.
+# Les recherches identiques simultanées partagent un seul appel DuckDuckGo.
+_search_cache = LRUCache(max_entries=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_search_flight = SingleFlight()
+
+metrics.register_collector('url_cache', _url_cache.stats)
+metrics.register_collector('search_cache', _search_cache.stats)
+metrics.register_collector('search_flight', _search_flight.stats)
+
+_QUERY_PUNCT_RE = re.compile(r'[^\w\s]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+_TAG_RE = re.compile(r'<[^>]+>')
+_URL_RE = re.compile(r'(https?://[^\s]+)')
+
+
+async def _fetch_article(url):
     """
-    Détecte un lien URL, télécharge la page et extrait le texte principal.
-    Supporte les protocoles http et https.
+    Télécharge et extrait un article, en passant par le cache par URL.
+    Une entrée expirée est revalidée par requête conditionnelle : une
+    réponse 304 évite le téléchargement et l'extraction.
+    
+    Args:
+        url (str): Article URL
+        
+    Returns:
+        str: Extracted article text, or None
+    """
+    entry = _url_cache.get(url)
+    now = time.monotonic()
+    
+    if entry and now - entry['fetched_at'] < URL_CACHE_TTL:
+        logger.info(f"⚡ Contenu en cache pour {url}")
+        return entry['content']
+    
+    headers = {}
+    if entry:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    
+    logger.info(f"⏳ Téléchargement de {url}...")
+    response, body = await get_http_client().get(url, headers=headers)
+    
+    if response.status_code == 304 and entry:
+        logger.info(f"♻️ Page inchangée (304), contenu en cache réutilisé: {url}")
+        _url_cache.set(url, dict(entry, fetched_at=now))
+        return entry['content']
+    
+    if response.status_code != 200 or not body:
+        logger.warning(f"❌ Impossible de télécharger {url} (HTTP {response.status_code})")
+        return None
+    
+    # Extraction du texte principal (CPU) hors de la boucle d'événements
+    with metrics.stage('html_extract'):
+        article_text = await asyncio.to_thread(trafilatura.extract, body, config=TRAFILATURA_CONFIG)
+        tracer.annotate(html_bytes=len(body), text_chars=len(article_text or ''))
+    if not article_text:
+        logger.warning(f"❌ Pas de contenu extractible de {url}")
+        return None
+    
+    # Limite la taille pour ne pas saturer le prompt
+    content = article_text[:MAX_URL_CONTENT]
+    _url_cache.set(url, {
+        'content': content,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': now,
+    })
+    return content
+
+
+def find_url(text):
+    """
+    Détecte le premier lien http(s) du texte, sans le télécharger.
     
     Args:
         text (str): Text potentially containing a URL
         
     Returns:
-        tuple: (url, content) or (None, None) if no URL found
+        str: Cleaned URL, or None
     """
     if not text or not isinstance(text, str):
-        return None, None
+        return None
     
     # Regex pour trouver http ou https URLs
-    url_match = re.search(r'(https?://[^\s]+)', text)
+    url_match = _URL_RE.search(text)
     if not url_match:
         logger.debug(f"Pas d'URL trouvée dans: {text[:50]}")
-        return None, None
+        return None
+    
+    return url_match.group(0).rstrip('.,;:!?\'"')  # Nettoie les caractères finaux
 
-    url = url_match.group(0).rstrip('.,;:!?\'"')  # Nettoie les caractères finaux
+
+@metrics.timed('fetch_url')
+async def extract_url_content(text):
+    """
+    Détecte un lien URL, télécharge la page et extrait le texte principal.
+    Supporte les protocoles http et https.
+    
+    Args:
+        text (str): Text potentially containing a URL
+        
+    Returns:
+        tuple: (url, content) or (None, None) if no URL found
+    """
+    url = find_url(text)
+    if not url:
+        return None, None
+    
     logger.info(f"📄 URL détectée: {url}")
     
     try:
         # Trafilatura est excellent pour ignorer les pubs, menus, etc.
-        logger.info(f"⏳ Téléchargement de {url}...")
-        downloaded = trafilatura.fetch_url(url, timeout=10)
-        
-        if not downloaded:
-            logger.warning(f"❌ Impossible de télécharger {url}")
-            return url, None
-        
-        # Extraction du texte principal
-        article_text = trafilatura.extract(downloaded)
-        
-        if not article_text:
-            logger.warning(f"❌ Pas de contenu extractible de {url}")
+        content = await _fetch_article(url)
+        if not content:
             return url, None
         
-        # Limite la taille pour ne pas saturer le prompt
-        content = article_text[:MAX_URL_CONTENT]
         logger.info(f"✅ Contenu extrait: {len(content)} caractères")
         return url, content
         
@@ -61,9 +163,115 @@ def extract_url_content(text):
         return url, None
 
 
-def search_web(query):
+def normalize_query(query):
+    """
+    Normalise une requête pour que les variantes quasi identiques
+    (casse, ponctuation, espaces) partagent la même entrée de cache.
+    
+    Args:
+        query (str): Search query
+        
+    Returns:
+        str: Normalized cache key
+    """
+    query = _QUERY_PUNCT_RE.sub(' ', query.casefold())
+    return _WHITESPACE_RE.sub(' ', query).strip()
+
+
+class SearchUnavailable(RuntimeError):
+    """Page DuckDuckGo inexploitable (limitation, CAPTCHA) : ne jamais la mettre en cache"""
+
+
+def _clean_html_text(raw):
+    """Supprime les balises et décode les entités HTML"""
+    return unescape(_TAG_RE.sub('', raw or '')).strip()
+
+
+def _result_url(href):
+    """Résout les liens de redirection DuckDuckGo (/l/?uddg=...)"""
+    target = parse_qs(urlsplit(href).query).get('uddg')
+    return target[0] if target else href
+
+
+def _parse_results(page):
+    """
+    Extrait les résultats de la page HTML de DuckDuckGo.
+    
+    Args:
+        page (bytes): DuckDuckGo HTML results page
+        
+    Returns:
+        list: Dicts with title, body and href
+    """
+    tree = lxml_html.fromstring(page)
+    results = []
+    for element in tree.xpath('//div[contains(@class, "results_links")]'):
+        href = element.xpath('.//a[contains(@class, "result__a")]/@href')
+        if not href:
+            continue
+        title = element.xpath('.//a[contains(@class, "result__a")]//text()')
+        body = element.xpath('.//a[contains(@class, "result__snippet")]//text()')
+        results.append({
+            'title': _clean_html_text(''.join(title)),
+            'body': _clean_html_text(''.join(body)),
+            'href': _result_url(href[0]),
+        })
+        if len(results) >= DDG_MAX_RESULTS:
+            break
+    return results
+
+
+async def _run_search(clean_query):
+    """
+    Exécute la recherche DuckDuckGo et formate le contexte.
+    Les erreurs sont propagées pour ne jamais être mises en cache.
+    
+    Args:
+        clean_query (str): Cleaned search query
+        
+    Returns:
+        str: Formatted search results
+    """
+    logger.info(f"🔍 Recherche Web lancée pour : {clean_query}")
+    # df='w' force les résultats de la semaine passée
+    response, page = await get_http_client().post(
+        DDG_HTML_URL,
+        data={'q': clean_query, 'kl': 'wt-wt', 'df': 'w'},
+        headers={'Referer': 'https://duckduckgo.com/'},
+    )
+    response.raise_for_status()
+    if response.status_code != 200:
+        # DuckDuckGo répond 202 avec une page de limitation au lieu d'une erreur
+        raise SearchUnavailable(f"réponse DuckDuckGo {response.status_code}")
+    
+    results = _parse_results(page)
+    if not results:
+        if b'no-results' not in page:
+            # Page reçue mais rien d'extrait : CAPTCHA ou balisage de DuckDuckGo modifié
+            metrics.inc('search_parse_failures_total')
+            logger.warning(f"⚠️ Aucun résultat extrait de la page DuckDuckGo ({len(page)} octets), "
+                           f"balisage inattendu pour : {clean_query[:50]}")
+            raise SearchUnavailable("aucun résultat extrait de la page DuckDuckGo")
+        return ""
+    
+    context = "--- RÉSULTATS RECHERCHE WEB RÉCENTS ---\n"
+    for r in results:
+        context += f"• Source: {r['title']}\n  Extrait: {r['body']}\n  Lien: {r['href']}\n\n"
+    return context
+
+
+async def _cached_search(key, clean_query):
+    """Recherche avec remplissage du cache (exécutée une seule fois par clé)"""
+    context = await _run_search(clean_query)
+    _search_cache.set(key, context)
+    return context
+
+
+@metrics.timed('web_search')
+async def search_web(query):
     """
     Recherche sur DuckDuckGo avec un filtre 'actualité récente' (1 semaine).
+    Les résultats sont mis en cache par requête normalisée.
     
     Args:
         query (str): Search query
@@ -76,19 +284,15 @@ def search_web(query):
     
     # Nettoyage de la requête
     clean_query = query[:MAX_QUERY_LENGTH].replace("\n", " ")
-    logger.info(f"🔍 Recherche Web lancée pour : {clean_query}")
+    key = normalize_query(clean_query)
+    
+    context = _search_cache.get(key)
+    if context is not None:
+        logger.info(f"⚡ Recherche en cache pour : {clean_query[:50]}")
+        return context
     
     try:
-        with DDGS() as ddgs:
-            # timelimit='w' force les résultats de la semaine passée
-            results = ddgs.text(clean_query, max_results=5, timelimit='w')
-            if not results:
-                return ""
-            
-            context = "--- RÉSULTATS RECHERCHE WEB RÉCENTS ---\n"
-            for r in results:
-                context += f"• Source: {r['title']}\n  Extrait: {r['body']}\n  Lien: {r['href']}\n\n"
-            return context
+        return await _search_flight.do_async(key, _cached_search, key, clean_query)
     except Exception as e:
         logger.error(f"Erreur DuckDuckGo: {e}")
         return ""
@@ -12,22 +12,45 @@ from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential,
-    retry_if_exception_type
+    retry_if_not_exception_type
 )
 
+from core.cassette import CassetteModel
+from core.limiter import ConcurrencyLimiter
+from core.metrics import metrics
+from core.quota import QuotaExceeded, is_quota_error, retry_after_from_error
+from core.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 
+def _count_retry(retry_state) -> None:
+    """tenacity hook: count attempts that will be retried"""
+    metrics.inc('gemini_retries_total', source='api')
+
+
 class GeminiService:
     """Professional Gemini API integration with retry logic"""
     
-    def __init__(self, api_key: str, model: str = 'gemini-2.5-flash'):
+    SAFETY_SETTINGS = {
+        "HARM_CATEGORY_HARASSMENT": "BLOCK_ONLY_HIGH",
+        "HARM_CATEGORY_HATE_SPEECH": "BLOCK_ONLY_HIGH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_ONLY_HIGH",
+        "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_ONLY_HIGH",
+    }
+    
+    # Cooldown applied when a 429 does not say how long to wait
+    DEFAULT_QUOTA_COOLDOWN = 30.0
+    
+    def __init__(self, api_key: str, model: str = 'gemini-2.5-flash', max_concurrency: int = 8, quota=None):
         """
         Initialize Gemini service
         
         Args:
             api_key: Google API key
             model: Model name to use
+            max_concurrency: Maximum in-flight Gemini calls for this process
+            quota: Optional QuotaGovernor shared with other processes
         """
         if not api_key or api_key == "YOUR_API_KEY_HERE":
             raise ValueError("CRITICAL: Gemini API key not configured in .env")
@@ -35,16 +58,108 @@ class GeminiService:
         self.api_key = api_key
         self.model_name = model
         
+        # Shared by sync (Flask threads) and async (event loop) callers
+        self.limiter = ConcurrencyLimiter(max_concurrency)
+        self.quota = quota
+        
         # Configure API
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model)
+        self.model = CassetteModel(genai.GenerativeModel(model))
+        
+        logger.info(f"[OK] Gemini service initialized with model: {model} (max {max_concurrency} in flight)")
+    
+    @staticmethod
+    def _build_request(prompt: str, system_prompt: str, temperature: float, max_tokens: int):
+        """
+        Build the prompt and generation config shared by sync and async paths
+        
+        Returns:
+            Tuple of (full_prompt, generation_config)
+        """
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\nUser Input:\n{prompt}"
         
-        logger.info(f"[OK] Gemini service initialized with model: {model}")
+        generation_config = genai.types.GenerationConfig(
+            temperature=temperature,
+            top_p=0.95,
+            top_k=40,
+            max_output_tokens=max_tokens,
+            candidate_count=1,
+        )
+        return full_prompt, generation_config
+    
+    @staticmethod
+    def _estimate_tokens(full_prompt: str, max_tokens: int) -> int:
+        """Rough token cost of a call (~4 chars per token + output budget)"""
+        return len(full_prompt) // 4 + max_tokens
+    
+    def _settle_quota(self, response, estimate: int) -> None:
+        """Correct the token bucket when the SDK reports real usage"""
+        usage = getattr(response, 'usage_metadata', None)
+        if self.quota is not None and usage is not None:
+            self.quota.settle(estimate, usage.total_token_count)
     
+    async def _settle_quota_async(self, response, estimate: int) -> None:
+        """Async variant of _settle_quota (SQLite write off the event loop)"""
+        usage = getattr(response, 'usage_metadata', None)
+        if self.quota is not None and usage is not None:
+            await self.quota.settle_async(estimate, usage.total_token_count)
+    
+    async def _handle_error_async(self, e: Exception):
+        """Async variant of _handle_error: a 429 cooldown is written off the event loop"""
+        if self.quota is not None and not isinstance(e, QuotaExceeded) and is_quota_error(e):
+            metrics.inc('gemini_quota_errors_total', source='api')
+            retry_after = retry_after_from_error(e) or self.DEFAULT_QUOTA_COOLDOWN
+            await self.quota.penalize_async(retry_after)
+            logger.warning(f"[WARNING] Gemini quota exceeded: {e}")
+            raise QuotaExceeded(retry_after) from e
+        self._handle_error(e)
+    
+    def _handle_error(self, e: Exception):
+        """
+        Map SDK errors to service errors (always raises)
+        
+        Raises:
+            QuotaExceeded: For 429 errors (after starting a shared cooldown)
+            ValueError: For safety blocks and stopped generations
+            Exception: Original error otherwise
+        """
+        if isinstance(e, QuotaExceeded):
+            metrics.inc('quota_rejections_total', source='api')
+            logger.warning(f"[WARNING] {e}")
+            raise e
+        
+        if is_quota_error(e):
+            metrics.inc('gemini_quota_errors_total', source='api')
+            retry_after = retry_after_from_error(e) or self.DEFAULT_QUOTA_COOLDOWN
+            if self.quota is not None:
+                self.quota.penalize(retry_after)
+            logger.warning(f"[WARNING] Gemini quota exceeded: {e}")
+            raise QuotaExceeded(retry_after) from e
+        
+        if isinstance(e, ValueError):
+            logger.warning(f"[WARNING] Value error: {e}")
+            raise e
+        
+        error_str = str(e).lower()
+        if "blocked" in error_str or "safety" in error_str:
+            logger.warning(f"[WARNING] Blocked by safety filter: {e}")
+            raise ValueError("Content blocked by safety filter")
+        elif "stop" in error_str:
+            logger.warning(f"[WARNING] Generation stopped: {e}")
+            raise ValueError("Generation stopped - please rephrase")
+        else:
+            logger.error(f"[ERROR] Gemini API error: {e}", exc_info=True)
+            raise e
+    
+    @tracer.traced('gemini_service.generate_response')
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type(Exception),
+        # Safety blocks and quota errors would fail (and spend quota) again
+        retry=retry_if_not_exception_type((ValueError, QuotaExceeded)),
+        before_sleep=_count_retry,
         reraise=True
     )
     def generate_response(
@@ -69,73 +184,217 @@ class GeminiService:
         Raises:
             Exception: If generation fails after retries
         """
+        full_prompt, generation_config = self._build_request(
+            prompt, system_prompt, temperature, max_tokens
+        )
+        
+        estimate = self._estimate_tokens(full_prompt, max_tokens)
+        
         try:
-            # Combine prompts
-            full_prompt = prompt
-            if system_prompt:
-                full_prompt = f"{system_prompt}\n\nUser Input:\n{prompt}"
-            
-            # Configure generation
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=max_tokens,
-                candidate_count=1,
-            )
+            if self.quota is not None:
+                with metrics.stage('quota_wait'):
+                    self.quota.acquire(estimate)
             
             # Generate content
             logger.debug(f"Sending request to Gemini: {full_prompt[:100]}...")
-            response = self.model.generate_content(
-                full_prompt,
-                generation_config=generation_config,
-                safety_settings={
-                    "HARM_CATEGORY_HARASSMENT": "BLOCK_ONLY_HIGH",
-                    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_ONLY_HIGH",
-                    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_ONLY_HIGH",
-                    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_ONLY_HIGH",
-                }
-            )
+            with self.limiter, metrics.stage('gemini_api'):
+                response = self.model.generate_content(
+                    full_prompt,
+                    generation_config=generation_config,
+                    safety_settings=self.SAFETY_SETTINGS
+                )
+            self._settle_quota(response, estimate)
             
             result = response.text if response.text else "No response generated"
             logger.info(f"[OK] Response generated successfully ({len(result)} chars)")
             
             return result
         
-        except ValueError as e:
-            logger.warning(f"[WARNING] Value error: {e}")
-            raise
-        
         except Exception as e:
-            error_str = str(e).lower()
-            if "blocked" in error_str or "safety" in error_str:
-                logger.warning(f"[WARNING] Blocked by safety filter: {e}")
-                raise ValueError("Content blocked by safety filter")
-            elif "stop" in error_str:
-                logger.warning(f"[WARNING] Generation stopped: {e}")
-                raise ValueError("Generation stopped - please rephrase")
-            else:
-                logger.error(f"[ERROR] Gemini API error: {e}", exc_info=True)
-                raise
+            self._handle_error(e)
     
+    @tracer.traced('gemini_service.generate_response')
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        # Safety blocks and quota errors would fail (and spend quota) again
+        retry=retry_if_not_exception_type((ValueError, QuotaExceeded)),
+        before_sleep=_count_retry,
+        reraise=True
+    )
     async def generate_response_async(
         self,
         prompt: str,
-        system_prompt: str = None
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
     ) -> str:
         """
-        Async wrapper for generate_response
+        Generate response from Gemini without blocking the event loop
+        
+        Uses the SDK's native async call; retries back off with asyncio.sleep
+        and each attempt waits for a free concurrency slot.
         
         Args:
-            prompt: User prompt
-            system_prompt: System prompt
+            prompt: User prompt/input
+            system_prompt: System prompt for context
+            temperature: Response creativity (0.0-1.0)
+            max_tokens: Maximum response length
             
         Returns:
-            Generated response
+            Generated response text
+            
+        Raises:
+            Exception: If generation fails after retries
         """
-        # Note: Gemini SDK doesn't have true async, so we run in executor
-        # In production, consider using aiohttp with REST API
-        return self.generate_response(prompt, system_prompt)
+        full_prompt, generation_config = self._build_request(
+            prompt, system_prompt, temperature, max_tokens
+        )
+        
+        estimate = self._estimate_tokens(full_prompt, max_tokens)
+        
+        try:
+            if self.quota is not None:
+                async with metrics.stage('quota_wait'):
+                    await self.quota.acquire_async(estimate)
+            
+            logger.debug(f"Sending async request to Gemini: {full_prompt[:100]}...")
+            async with self.limiter, metrics.stage('gemini_api'):
+                response = await self.model.generate_content_async(
+                    full_prompt,
+                    generation_config=generation_config,
+                    safety_settings=self.SAFETY_SETTINGS
+                )
+            await self._settle_quota_async(response, estimate)
+            
+            result = response.text if response.text else "No response generated"
+            logger.info(f"[OK] Response generated successfully ({len(result)} chars)")
+            
+            return result
+        
+        except Exception as e:
+            await self._handle_error_async(e)
+    
+    def generate_response_stream(
+        self,
+        prompt: str,
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ):
+        """
+        Stream response text from Gemini as it is generated
+        
+        Not retried: chunks may already have reached the client. The
+        concurrency slot is held until the stream is exhausted or closed.
+        
+        Args:
+            prompt: User prompt/input
+            system_prompt: System prompt for context
+            temperature: Response creativity (0.0-1.0)
+            max_tokens: Maximum response length
+            
+        Yields:
+            Response text chunks
+        """
+        full_prompt, generation_config = self._build_request(
+            prompt, system_prompt, temperature, max_tokens
+        )
+        
+        estimate = self._estimate_tokens(full_prompt, max_tokens)
+        
+        try:
+            if self.quota is not None:
+                with metrics.stage('quota_wait'):
+                    self.quota.acquire(estimate)
+            
+            with self.limiter, metrics.stage('gemini_api_stream'):
+                response = self.model.generate_content(
+                    full_prompt,
+                    generation_config=generation_config,
+                    safety_settings=self.SAFETY_SETTINGS,
+                    stream=True
+                )
+                for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+            # Usage is only known once the stream is exhausted
+            self._settle_quota(response, estimate)
+        
+        except Exception as e:
+            self._handle_error(e)
+    
+    async def generate_response_stream_async(
+        self,
+        prompt: str,
+        system_prompt: str = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000
+    ):
+        """
+        Async variant of generate_response_stream
+        
+        Yields:
+            Response text chunks
+        """
+        full_prompt, generation_config = self._build_request(
+            prompt, system_prompt, temperature, max_tokens
+        )
+        
+        estimate = self._estimate_tokens(full_prompt, max_tokens)
+        
+        try:
+            if self.quota is not None:
+                async with metrics.stage('quota_wait'):
+                    await self.quota.acquire_async(estimate)
+            
+            async with self.limiter, metrics.stage('gemini_api_stream'):
+                response = await self.model.generate_content_async(
+                    full_prompt,
+                    generation_config=generation_config,
+                    safety_settings=self.SAFETY_SETTINGS,
+                    stream=True
+                )
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+            await self._settle_quota_async(response, estimate)
+        
+        except Exception as e:
+            await self._handle_error_async(e)
+    
+    def stats(self) -> dict:
+        """
+        Get concurrency, queue-wait and quota statistics
+        
+        Returns:
+            Limiter statistics dictionary (with the quota bucket state)
+        """
+        stats = self.limiter.stats()
+        stats['quota'] = self.quota.state() if self.quota is not None else None
+        return stats
+    
+    def _reserve_probe(self, max_wait: float = 0) -> bool:
+        """Take quota for a health probe without waiting (False = throttled)"""
+        if self.quota is None:
+            return True
+        try:
+            self.quota.acquire(self._estimate_tokens("test", 0), max_wait=max_wait)
+            return True
+        except QuotaExceeded as e:
+            logger.info(f"[INFO] Health probe skipped, quota reserved for user requests ({e})")
+            return False
+    
+    async def _reserve_probe_async(self) -> bool:
+        """Async variant of _reserve_probe"""
+        if self.quota is None:
+            return True
+        try:
+            await self.quota.acquire_async(self._estimate_tokens("test", 0), max_wait=0)
+            return True
+        except QuotaExceeded as e:
+            logger.info(f"[INFO] Health probe skipped, quota reserved for user requests ({e})")
+            return False
     
     def health_check(self) -> bool:
         """
@@ -144,12 +403,33 @@ class GeminiService:
         Returns:
             True if service is healthy
         """
+        # Throttled is not unhealthy: leave the budget to real requests
+        if not self._reserve_probe():
+            return True
+        
         try:
             response = self.model.generate_content("test")
             return bool(response.text)
         except Exception as e:
             logger.error(f"[ERROR] Health check failed: {e}")
             return False
+    
+    async def health_check_async(self) -> bool:
+        """
+        Check if Gemini service is available (non-blocking)
+        
+        Returns:
+            True if service is healthy
+        """
+        if not await self._reserve_probe_async():
+            return True
+        
+        try:
+            response = await self.model.generate_content_async("test")
+            return bool(response.text)
+        except Exception as e:
+            logger.error(f"[ERROR] Health check failed: {e}")
+            return False
 
 
 class AIResponseFormatter:
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Analysis Module - Bounded parallel and packed Gemini calls
+Senior Python Developer - High-Throughput Moderation Support
+"""
+
+import json
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from core.quota import QuotaExceeded
+
+logger = logging.getLogger(__name__)
+
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+
+PACKED_INSTRUCTIONS = """
+
+You will receive several independent inputs as a JSON array of objects
+{{"id": <number>, "text": "<input>"}}. Analyze EACH input on its own, using
+the format above for every answer.
+
+Return ONLY a JSON array with exactly {count} objects, in the same order:
+[{{"id": <number>, "answer": "<your full answer for that input>"}}]"""
+
+
+def build_packed_prompt(texts: List[str], system_prompt: str) -> tuple:
+    """
+    Pack several inputs into one prompt asking for per-item answers
+
+    Args:
+        texts: Input texts (their position is their id)
+        system_prompt: System prompt of the shared request type
+
+    Returns:
+        Tuple of (prompt, system_prompt)
+    """
+    items = [{'id': i, 'text': text} for i, text in enumerate(texts)]
+    packed_system = (system_prompt or '') + PACKED_INSTRUCTIONS.format(count=len(texts))
+    return json.dumps(items, ensure_ascii=False), packed_system
+
+
+def parse_packed_response(response: str, count: int) -> Dict[int, str]:
+    """
+    Parse a packed answer into per-item responses
+
+    Args:
+        response: Raw model output (JSON array, possibly fenced)
+        count: Number of packed inputs
+
+    Returns:
+        Dictionary id -> answer (missing or malformed items are left out)
+    """
+    try:
+        data = json.loads(_CODE_FENCE_RE.sub('', response or ''))
+    except ValueError:
+        logger.warning("[WARNING] Packed response is not valid JSON")
+        return {}
+
+    if not isinstance(data, list):
+        return {}
+
+    answers = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        item_id, answer = entry.get('id'), entry.get('answer')
+        if isinstance(item_id, int) and 0 <= item_id < count and isinstance(answer, str) and answer.strip():
+            answers[item_id] = answer.strip()
+    return answers
+
+
+def _reached_gemini(error: Exception) -> bool:
+    """False when the quota governor refused the call before it was sent"""
+    return not (isinstance(error, QuotaExceeded) and error.__cause__ is None)
+
+
+class BatchRunner:
+    """Run unique analysis jobs on a bounded worker pool"""
+
+    def __init__(
+        self,
+        gemini_service,
+        max_workers: int = 4,
+        pack_size: int = 8,
+        pack_max_chars: int = 400,
+        pack_tokens_per_item: int = 600
+    ):
+        """
+        Initialize batch runner
+
+        Args:
+            gemini_service: GeminiService used for packed calls
+            max_workers: Worker threads shared by all batch requests
+            pack_size: Maximum inputs per packed prompt
+            pack_max_chars: Only inputs up to this length are packed
+            pack_tokens_per_item: Output budget per packed input
+        """
+        self.gemini_service = gemini_service
+        self.max_workers = max_workers
+        self.pack_size = pack_size
+        self.pack_max_chars = pack_max_chars
+        self.pack_tokens_per_item = pack_tokens_per_item
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch')
+        logger.info(f"[OK] Batch runner initialized ({max_workers} workers, packs of {pack_size})")
+
+    def _plan(self, jobs: Dict[str, dict], pack: bool) -> tuple:
+        """Split jobs into packs (same type and temperature) and single calls"""
+        if not pack or self.pack_size < 2:
+            return [], list(jobs)
+
+        groups = {}
+        singles = []
+        for key, job in jobs.items():
+            if len(job['text']) <= self.pack_max_chars:
+                groups.setdefault((job['request_type'], job['temperature']), []).append(key)
+            else:
+                singles.append(key)
+
+        packs = []
+        for keys in groups.values():
+            for i in range(0, len(keys), self.pack_size):
+                chunk = keys[i:i + self.pack_size]
+                if len(chunk) > 1:
+                    packs.append(chunk)
+                else:
+                    singles.extend(chunk)
+        return packs, singles
+
+    def _run_pack(self, keys: List[str], jobs: Dict[str, dict], generate_one: Callable,
+                  counters: dict) -> dict:
+        """
+        Answer several jobs with one call, falling back per missing item
+
+        A failed packed call fails the whole pack: it has already been
+        retried (or waited for quota), and N single calls would only spend
+        more of the same budget. Items missing from a successful answer are
+        retried one by one.
+
+        Packed answers follow PACKED_INSTRUCTIONS (short per-item fields), so
+        unlike single answers they are not written to the response cache.
+        """
+        first = jobs[keys[0]]
+        prompt, system_prompt = build_packed_prompt([jobs[k]['text'] for k in keys], first['system_prompt'])
+
+        try:
+            response = self.gemini_service.generate_response(
+                prompt=prompt,
+                system_prompt=system_prompt,
+                temperature=first['temperature'],
+                max_tokens=self.pack_tokens_per_item * len(keys)
+            )
+        except Exception as e:
+            logger.warning(f"[WARNING] Packed call failed for {len(keys)} items: {e}")
+            if _reached_gemini(e):
+                self._count(counters, 'gemini_calls')
+            return {key: e for key in keys}
+
+        self._count(counters, 'gemini_calls')
+        answers = parse_packed_response(response, len(keys))
+
+        results = {}
+        for i, key in enumerate(keys):
+            if i in answers:
+                results[key] = answers[i]
+                self._count(counters, 'packed')
+            else:
+                results.update(self._run_single(key, jobs, generate_one, counters))
+        return results
+
+    def _run_single(self, key: str, jobs: Dict[str, dict], generate_one: Callable, counters: dict) -> dict:
+        try:
+            result = generate_one(jobs[key])
+        except Exception as e:
+            if _reached_gemini(e):
+                self._count(counters, 'gemini_calls')
+            return {key: e}
+        self._count(counters, 'gemini_calls')
+        return {key: result}
+
+    @staticmethod
+    def _count(counters: dict, name: str) -> None:
+        with counters['lock']:
+            counters[name] += 1
+
+    def run(self, jobs: Dict[str, dict], generate_one: Callable, pack: bool = False) -> tuple:
+        """
+        Answer unique jobs with bounded parallelism
+
+        Args:
+            jobs: Deduplicated jobs keyed by content key
+            generate_one: Function answering a single job (str) or raising
+            pack: Pack short inputs of the same type into shared prompts
+
+        Returns:
+            Tuple of (results, stats) where results maps key -> response
+            text or the exception raised for that job
+        """
+        counters = {'lock': threading.Lock(), 'gemini_calls': 0, 'packed': 0}
+        packs, singles = self._plan(jobs, pack)
+
+        futures = [self.executor.submit(self._run_pack, keys, jobs, generate_one, counters) for keys in packs]
+        futures += [self.executor.submit(self._run_single, key, jobs, generate_one, counters) for key in singles]
+
+        results = {}
+        for future in futures:
+            results.update(future.result())
+
+        return results, {'gemini_calls': counters['gemini_calls'], 'packed': counters['packed']}
@@ -12,7 +12,17 @@ from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, Comma
 # Import from modules
 from modules.analyzer import IsItTrueAnalyzer
 from modules.logger import setup_logger
-from modules.config import TELEGRAM_TOKEN
+from core.metrics import metrics
+from core.cassette import cassette
+from core.tracing import tracer
+from modules.config import (
+    TELEGRAM_TOKEN, MAX_IMAGE_BYTES, MAX_AUDIO_BYTES,
+    METRICS_DUMP_INTERVAL, TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS,
+    CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE,
+)
+from modules.dispatch import update_processor
+from modules.http_client import close_http_client
+from modules.media_ingest import MediaTooLarge, pick_photo, download_media
 
 logger = setup_logger(__name__)
 
@@ -44,29 +54,40 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     image_bytes = None
     audio_bytes = None
 
+    media, max_bytes = None, None
+
     # 1. HANDLE PHOTOS
     if user_msg.photo:
         await context.bot.send_message(chat_id=chat_id, text="🧐 J'analyse l'image...")
-        photo_file = await user_msg.photo[-1].get_file()
-        image_bytes = await photo_file.download_as_bytearray()
 
     # 2. HANDLE AUDIO
     elif user_msg.voice or user_msg.audio:
         await context.bot.send_message(chat_id=chat_id, text="🎧 J'écoute l'audio...")
-        audio_obj = user_msg.voice or user_msg.audio
-        audio_file = await audio_obj.get_file()
-        audio_bytes = await audio_file.download_as_bytearray()
+        media, max_bytes = user_msg.voice or user_msg.audio, MAX_AUDIO_BYTES
 
     # 3. ANALYZE
     try:
-        response = await IsItTrueAnalyzer.process_input(
-            user_text=text_content,
-            image_data=image_bytes,
-            audio_data=audio_bytes
-        )
+        if user_msg.photo:
+            media, max_bytes = pick_photo(user_msg.photo), MAX_IMAGE_BYTES
+
+        # The downloaded bytes are only valid inside this block
+        async with download_media(media, max_bytes) as media_bytes:
+            if user_msg.photo:
+                image_bytes = media_bytes
+            else:
+                audio_bytes = media_bytes
+            response = await IsItTrueAnalyzer.process_input(
+                user_text=text_content,
+                image_data=image_bytes,
+                audio_data=audio_bytes
+            )
         
         await context.bot.send_message(chat_id=chat_id, text=response)
         
+    except MediaTooLarge as e:
+        logger.warning(f"Media refused: {e}")
+        await context.bot.send_message(chat_id=chat_id, text=f"⚠️ {str(e).capitalize()}")
+
     except Exception as e:
         logger.error(f"Error in handle_message: {e}")
         await context.bot.send_message(
@@ -75,16 +96,36 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+async def post_shutdown(application):
+    """Release pooled HTTP connections"""
+    await close_http_client()
+
+
 async def main():
     """Start the Telegram bot"""
     logger.info("🚀 IsItTrue Telegram Bot Starting...")
     
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    application = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(update_processor())
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(MessageHandler(filters.ALL & (~filters.COMMAND), handle_message))
     
+    # Stage latencies, retries and cache ratios in the logs
+    metrics.start_periodic_dump(METRICS_DUMP_INTERVAL, logger)
+    # Per-update spans (JSONL), off unless TRACE_FILE is set
+    if TRACE_FILE:
+        tracer.configure(TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS)
+    # Recorded Gemini / web responses, off unless CASSETTE_MODE is set
+    if CASSETTE_MODE != 'off':
+        cassette.configure(CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE)
+    
     logger.info("✅ Bot initialized successfully!")
     logger.info("📡 Starting polling...")
     
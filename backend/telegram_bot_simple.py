@@ -5,13 +5,27 @@ Simplified implementation without event loop issues
 Enhanced with multilingual support
 """
 
+import asyncio
 import logging
+import re
+import time
 from telegram import Update, constants
+from telegram.error import BadRequest, RetryAfter
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, CommandHandler, filters
 import sys
 from modules.analyzer import IsItTrueAnalyzer
 from modules.logger import setup_logger
-from modules.config import TELEGRAM_TOKEN
+from core.metrics import metrics
+from core.cassette import cassette
+from core.tracing import tracer
+from modules.config import (
+    TELEGRAM_TOKEN, STREAM_EDIT_INTERVAL, TELEGRAM_MAX_MESSAGE, MAX_IMAGE_BYTES, MAX_AUDIO_BYTES,
+    METRICS_DUMP_INTERVAL, TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS,
+    CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE,
+)
+from modules.dispatch import update_processor
+from modules.http_client import close_http_client
+from modules.media_ingest import MediaTooLarge, pick_photo, download_media
 from modules.language_detector import LanguageDetector
 
 logger = setup_logger(__name__)
@@ -36,6 +50,70 @@ ERROR_MESSAGES = {
 }
 
 
+# Caption tag asking to re-analyze an image the bot has already checked
+RECHECK_TAG = "#recheck"
+
+THINKING_MESSAGES = {
+    'fr': "🧐 Analyse en cours...",
+    'en': "🧐 Analyzing...",
+}
+
+
+class StreamingReply:
+    """
+    Telegram message progressively edited as the analysis streams in
+    
+    Edits are spaced by at least STREAM_EDIT_INTERVAL seconds to stay under
+    Telegram's flood limits; text beyond 4096 characters is sent as
+    follow-up messages once the stream ends.
+    """
+    
+    def __init__(self, message):
+        self.message = message
+        self.text = ""
+        self.shown = ""
+        self.last_edit = 0.0
+    
+    async def _edit(self, text):
+        try:
+            await self.message.edit_text(text)
+            self.shown = text
+        except RetryAfter as e:
+            # Flood control: skip this edit, the next one catches up
+            logger.warning(f"⏳ Edit rate-limited by Telegram ({e.retry_after}s)")
+            self.last_edit = time.monotonic() + float(e.retry_after)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                raise
+    
+    async def append(self, chunk):
+        """Add a chunk and refresh the message if the interval elapsed"""
+        self.text += chunk
+        visible = self.text[:TELEGRAM_MAX_MESSAGE]
+        if visible.strip() and visible != self.shown and time.monotonic() - self.last_edit >= STREAM_EDIT_INTERVAL:
+            self.last_edit = time.monotonic()
+            await self._edit(visible)
+    
+    async def finish(self):
+        """Show the complete response and send any overflow"""
+        text = self.text or "❌"
+        visible = text[:TELEGRAM_MAX_MESSAGE]
+        for attempt in range(2):
+            try:
+                if visible != self.shown:
+                    await self.message.edit_text(visible)
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(float(e.retry_after))
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+                break
+        
+        for i in range(TELEGRAM_MAX_MESSAGE, len(text), TELEGRAM_MAX_MESSAGE):
+            await self.message.reply_text(text[i:i+TELEGRAM_MAX_MESSAGE])
+
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with language detection"""
     # Detect user language from their message
@@ -62,46 +140,70 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         text_content = user_msg.text or user_msg.caption or ""
         image_bytes = None
         audio_bytes = None
+        image_source_id = None
         
-        # Detect user language from text
-        lang_code, lang_name, _ = LanguageDetector.detect_language(text_content)
+        # "#recheck" in a caption forces a new analysis of an already seen image
+        fresh = RECHECK_TAG in text_content.lower()
+        if fresh:
+            text_content = re.sub(re.escape(RECHECK_TAG), '', text_content, flags=re.IGNORECASE).strip()
+        
+        # Detect user language from text (passed down so the pipeline reuses it)
+        language = LanguageDetector.detect_language(text_content)
+        lang_code, lang_name, _ = language
         logger.info(f"🌐 Message language: {lang_name} ({lang_code})")
 
-        # Handle photos
+        if not (text_content or user_msg.photo or user_msg.voice or user_msg.audio):
+            error_msg = ERROR_MESSAGES.get(lang_code, ERROR_MESSAGES['fr'])
+            await update.message.reply_text(error_msg)
+            return
+
+        # Placeholder message, replaced progressively by the response
         if user_msg.photo:
             loading_msg = "🧐 Analyse de l'image..." if lang_code == 'fr' else "🧐 Analyzing image..."
-            await update.message.reply_text(loading_msg)
-            photo_file = await user_msg.photo[-1].get_file()
-            image_bytes = await photo_file.download_as_bytearray()
+        elif user_msg.voice or user_msg.audio:
+            loading_msg = "🎧 Traitement de l'audio..." if lang_code == 'fr' else "🎧 Processing audio..."
+        else:
+            loading_msg = THINKING_MESSAGES.get(lang_code, THINKING_MESSAGES['en'])
+        reply = StreamingReply(await update.message.reply_text(loading_msg))
+
+        # Handle photos (the exact same file already checked needs no download)
+        media, max_bytes = None, None
+        if user_msg.photo:
+            photo = pick_photo(user_msg.photo)
+            image_source_id = photo.file_unique_id
+            previous = None if fresh else await IsItTrueAnalyzer.indexed_verdict(image_source_id, text_content)
+            if previous is not None:
+                await reply.append(previous)
+                await reply.finish()
+                return
+            media, max_bytes = photo, MAX_IMAGE_BYTES
 
         # Handle audio
         elif user_msg.voice or user_msg.audio:
-            processing_msg = "🎧 Traitement de l'audio..." if lang_code == 'fr' else "🎧 Processing audio..."
-            await update.message.reply_text(processing_msg)
-            audio_obj = user_msg.voice or user_msg.audio
-            audio_file = await audio_obj.get_file()
-            audio_bytes = await audio_file.download_as_bytearray()
-
-        # Analyze
-        if text_content or image_bytes or audio_bytes:
-            response = await IsItTrueAnalyzer.process_input(
+            media, max_bytes = user_msg.voice or user_msg.audio, MAX_AUDIO_BYTES
+
+        # Analyze (streamed); the downloaded bytes are only valid inside this block
+        async with download_media(media, max_bytes) as media_bytes:
+            if user_msg.photo:
+                image_bytes = media_bytes
+            else:
+                audio_bytes = media_bytes
+            async for chunk in IsItTrueAnalyzer.process_input_stream(
                 user_text=text_content,
                 image_data=image_bytes,
-                audio_data=audio_bytes
-            )
-            
-            logger.info(f"📤 Sending response in {lang_name}")
-            
-            # Split response if too long
-            max_length = 4096
-            if len(response) > max_length:
-                for i in range(0, len(response), max_length):
-                    await update.message.reply_text(response[i:i+max_length])
-            else:
-                await update.message.reply_text(response)
-        else:
-            error_msg = ERROR_MESSAGES.get(lang_code, ERROR_MESSAGES['fr'])
-            await update.message.reply_text(error_msg)
+                audio_data=audio_bytes,
+                language=language if text_content else None,
+                image_source_id=image_source_id,
+                fresh=fresh
+            ):
+                await reply.append(chunk)
+        
+        logger.info(f"📤 Sending response in {lang_name}")
+        await reply.finish()
+
+    except MediaTooLarge as e:
+        logger.warning(f"⚠️ Media refused: {e}")
+        await update.message.reply_text(f"⚠️ {str(e).capitalize()}")
 
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -109,21 +211,61 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(error_response)
 
 
-def main():
-    """Start bot"""
-    logger.info("=" * 60)
-    logger.info("🤖 IsItTrue Telegram Bot v2.1 (Multilingual)")
-    logger.info("=" * 60)
-    
-    app = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+async def post_shutdown(application):
+    """Release pooled HTTP connections"""
+    await close_http_client()
+
+
+def build_application(updater=True, base_url=None):
+    """
+    Build the bot application with its handlers
+
+    Args:
+        updater: Keep PTB's Updater (polling); the webhook server feeds updates itself
+        base_url: Bot API base URL (None = api.telegram.org)
+
+    Returns:
+        Application: Configured application, not yet initialized
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(update_processor())
+        .post_shutdown(post_shutdown)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
     
     # Add handlers
     app.add_handler(CommandHandler("start", start_command))
     app.add_handler(CommandHandler("help", start_command))  # /help does the same
     app.add_handler(MessageHandler(filters.ALL & (~filters.COMMAND), handle_message))
     
+    # Stage latencies, retries and cache ratios in the logs
+    metrics.start_periodic_dump(METRICS_DUMP_INTERVAL, logger)
+    # Per-update spans (JSONL), off unless TRACE_FILE is set
+    if TRACE_FILE:
+        tracer.configure(TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS)
+    # Recorded Gemini / web responses, off unless CASSETTE_MODE is set
+    if CASSETTE_MODE != 'off':
+        cassette.configure(CASSETTE_MODE, CASSETTE_PATH, CASSETTE_LATENCY_SCALE)
+    
     logger.info("✅ Bot initialized with multilingual support")
     logger.info("🌐 Supported languages: French, English, Spanish, German, Italian, Portuguese")
+    return app
+
+
+def main():
+    """Start bot (long polling)"""
+    logger.info("=" * 60)
+    logger.info("🤖 IsItTrue Telegram Bot v2.1 (Multilingual)")
+    logger.info("=" * 60)
+    
+    app = build_application()
+    
     logger.info("📡 Starting polling...")
     
     app.run_polling()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+IsItTrue Telegram Bot - Webhook Mode
+Receives updates over HTTPS instead of long polling
+
+A small ASGI application served by uvicorn:
+- POST {webhook_path}: checks the secret token, queues the update and
+  answers 200 immediately; the concurrent update processor does the work
+- GET /health: liveness and dispatch queue statistics
+- GET /metrics: stage latencies and counters (Prometheus text format)
+- GET/POST/DELETE /admin/profile: on-demand profiling, requires the
+  X-Admin-Token header to match ADMIN_TOKEN (disabled when it is empty)
+
+Settings come from TELEGRAM_CONFIG in config.py. Run with:
+    python telegram_webhook.py
+"""
+
+import hmac
+import json
+
+from telegram import Update
+
+from config import TELEGRAM_CONFIG
+from core.metrics import metrics
+from core.profiler import profiler, profile_command
+from modules.logger import setup_logger
+from telegram_bot_simple import build_application
+
+logger = setup_logger(__name__)
+
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+
+
+class TelegramWebhookApp:
+    """ASGI application feeding webhook updates to a PTB Application"""
+
+    def __init__(self, application, settings=None):
+        """
+        Args:
+            application: Application built without an Updater
+            settings: Webhook settings (defaults to TELEGRAM_CONFIG)
+        """
+        self.application = application
+        self.settings = settings or TELEGRAM_CONFIG
+        self.path = self.settings['webhook_path'].rstrip('/') or '/'
+        self.secret = self.settings['webhook_secret'].encode()
+        self.admin_token = self.settings.get('admin_token', '').encode()
+        self.max_body = self.settings['webhook_max_body']
+        self._record = None
+        self.received = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        route = (scope['method'], scope['path'].rstrip('/') or '/')
+        if route == ('GET', '/health'):
+            await self._send_json(send, self.health(), 200)
+            return
+        if route == ('GET', '/metrics'):
+            body = metrics.render().encode('utf-8')
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/plain; version=0.0.4; charset=utf-8'),
+                (b'content-length', str(len(body)).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        headers = dict(scope['headers'])
+        if route[1] == '/admin/profile' and self.admin_token:
+            await self._admin_profile(scope, receive, send, headers)
+            return
+        if route != ('POST', self.path):
+            await self._send_json(send, {'error': 'Not found'}, 404)
+            return
+
+        # Telegram sends the secret given to setWebhook in this header
+        if self.secret and not hmac.compare_digest(headers.get(SECRET_HEADER, b''), self.secret):
+            self.rejected += 1
+            logger.warning(f"⚠️ Webhook: invalid secret token ({scope.get('client')})")
+            await self._send_json(send, {'error': 'Forbidden'}, 403)
+            return
+
+        try:
+            body = await self._read_body(receive)
+            data = json.loads(body)
+            if not isinstance(data, dict) or 'update_id' not in data:
+                raise ValueError("not an update object")
+            update = Update.de_json(data, self.application.bot)
+        except OverflowError:
+            await self._send_json(send, {'error': 'Request payload too large'}, 413)
+            return
+        except (ValueError, TypeError, KeyError) as e:
+            self.rejected += 1
+            logger.warning(f"⚠️ Webhook: unreadable update: {e}")
+            await self._send_json(send, {'error': 'Invalid update'}, 400)
+            return
+
+        # Acknowledge first: processing happens on the application's update fetcher
+        await self.application.update_queue.put(update)
+        self.received += 1
+        if self._record is not None:
+            self._record.write(json.dumps(data, ensure_ascii=False) + '\n')
+            self._record.flush()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [(b'content-length', b'0')]})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _admin_profile(self, scope, receive, send, headers):
+        """Profiler control, same contract as /api/admin/profile"""
+        if not hmac.compare_digest(headers.get(b'x-admin-token', b''), self.admin_token):
+            await self._send_json(send, {'error': 'Forbidden'}, 403)
+            return
+        if scope['method'] == 'GET' and b'format=raw' in scope.get('query_string', b''):
+            body = profiler.collapsed().encode('utf-8')
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/plain; charset=utf-8'),
+                (b'content-length', str(len(body)).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        try:
+            body = await self._read_body(receive)
+            data = json.loads(body) if body else {}
+        except (OverflowError, ValueError):
+            data = None
+        if not isinstance(data, dict):
+            await self._send_json(send, {'error': 'Invalid JSON body'}, 400)
+            return
+        payload, status = profile_command(scope['method'], data)
+        await self._send_json(send, payload, status)
+
+    def health(self):
+        """
+        Liveness payload with webhook and dispatch counters
+
+        Returns:
+            dict: Status, received/rejected updates, queue statistics
+        """
+        payload = {
+            'status': 'ok' if self.application.running else 'starting',
+            'received': self.received,
+            'rejected': self.rejected,
+            'queued': self.application.update_queue.qsize(),
+        }
+        processor = self.application.update_processor
+        if hasattr(processor, 'stats'):
+            payload['dispatch'] = processor.stats()
+        return payload
+
+    # ==================== LIFECYCLE ====================
+
+    async def startup(self):
+        """Start the application and register the webhook with Telegram"""
+        await self.application.initialize()
+        await self.application.start()
+
+        if self.settings['record_updates']:
+            self._record = open(self.settings['record_updates'], 'a', encoding='utf-8')
+            logger.info(f"📼 Recording updates to {self.settings['record_updates']}")
+
+        url = self.settings['webhook_url']
+        if url:
+            await self.application.bot.set_webhook(
+                url=url.rstrip('/') + self.path,
+                secret_token=self.settings['webhook_secret'] or None,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=self.settings['webhook_max_connections'],
+                drop_pending_updates=self.settings['drop_pending_updates'],
+            )
+            logger.info(f"🔗 Webhook registered: {url.rstrip('/') + self.path}")
+        else:
+            logger.info("🔗 TELEGRAM_WEBHOOK_URL is empty: webhook not registered (local mode)")
+
+    async def shutdown(self):
+        """Drain queued updates and release resources"""
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+        if self.application.post_shutdown:
+            await self.application.post_shutdown(self.application)
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.error(f"❌ Webhook startup failed: {e}", exc_info=True)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ==================== PROTOCOL HELPERS ====================
+
+    async def _read_body(self, receive):
+        """Read the request body, enforcing webhook_max_body"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body:
+                raise OverflowError(size)
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    @staticmethod
+    async def _send_json(send, payload, status):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json; charset=utf-8'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_webhook_app(settings=None):
+    """
+    Build the bot application and wrap it for webhook serving
+
+    Args:
+        settings: Webhook settings (defaults to TELEGRAM_CONFIG)
+
+    Returns:
+        TelegramWebhookApp: ASGI application
+    """
+    settings = settings or TELEGRAM_CONFIG
+    if settings['webhook_url'] and not settings['webhook_secret']:
+        raise ValueError("TELEGRAM_WEBHOOK_SECRET is required when TELEGRAM_WEBHOOK_URL is set")
+    application = build_application(updater=False, base_url=settings['api_base_url'] or None)
+    return TelegramWebhookApp(application, settings)
+
+
+def main():
+    """Start bot (webhook)"""
+    import uvicorn
+
+    logger.info("=" * 60)
+    logger.info("🤖 IsItTrue Telegram Bot v2.1 (Webhook)")
+    logger.info("=" * 60)
+
+    app = create_webhook_app()
+    logger.info(f"📡 Listening on {TELEGRAM_CONFIG['webhook_host']}:{TELEGRAM_CONFIG['webhook_port']}"
+                f"{app.path}")
+    uvicorn.run(app, host=TELEGRAM_CONFIG['webhook_host'], port=TELEGRAM_CONFIG['webhook_port'],
+                log_level='warning')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        logger.info("\n🛑 Bot stopped")
+    except Exception as e:
+        logger.error(f"Critical error: {e}")
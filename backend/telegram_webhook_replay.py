@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IsItTrue Telegram Bot - Webhook Replay
+Local stand-in for Telegram: posts recorded updates to the webhook
+
+Updates come from a JSONL file (one Update per line, e.g. written by the
+webhook with TELEGRAM_RECORD_UPDATES) or are generated. Each one is posted
+with the secret token header, and acknowledgement times are reported.
+
+With --fake-api, a minimal Bot API also runs on the given port and records
+the bot's replies. Start the webhook against it with
+TELEGRAM_API_BASE_URL=http://127.0.0.1:<port>/bot so nothing reaches Telegram.
+
+Usage (from backend/):
+    python telegram_webhook_replay.py --updates updates.jsonl
+    python telegram_webhook_replay.py --synthetic 50 --chats 5 --fake-api 8081
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import parse_qs
+
+import httpx
+
+from config import TELEGRAM_CONFIG
+
+
+def load_updates(path):
+    """Read one Update object per line"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthetic_updates(count, chats):
+    """Text messages spread round-robin over `chats` private chats"""
+    now = int(time.time())
+    updates = []
+    for i in range(count):
+        chat_id = 100000 + i % chats
+        updates.append({
+            'update_id': i + 1,
+            'message': {
+                'message_id': i + 1,
+                'date': now,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Replay'},
+                'text': f"Message {i // chats + 1} : la Terre est plate ?",
+            },
+        })
+    return updates
+
+
+class FakeBotApi:
+    """Minimal Bot API answering every method with a plausible result"""
+
+    def __init__(self):
+        self.calls = []
+        self._message_id = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+
+        method = scope['path'].rsplit('/', 1)[-1]
+        params = {k: v[0] for k, v in parse_qs(body.decode('utf-8', 'replace')).items()}
+        self.calls.append((method, params))
+
+        payload = json.dumps({'ok': True, 'result': self._result(method, params)}).encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    def _result(self, method, params):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'IsItTrue', 'username': 'isittrue_replay_bot'}
+        if method.startswith('send') or method.startswith('edit'):
+            self._message_id += 1
+            chat_id = int(params.get('chat_id', 0))
+            return {
+                'message_id': int(params.get('message_id', self._message_id)),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return True
+
+
+async def post_all(updates, url, secret, concurrency):
+    """Post updates in order, up to `concurrency` in flight"""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    limit = asyncio.Semaphore(concurrency)
+    results = []
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(update):
+            async with limit:
+                started = time.perf_counter()
+                try:
+                    response = await client.post(url, json=update, headers=headers)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                results.append((status, time.perf_counter() - started))
+
+        await asyncio.gather(*(post(update) for update in updates))
+    return results
+
+
+async def run(args):
+    server = api = None
+    if args.fake_api:
+        import uvicorn
+        api = FakeBotApi()
+        server = uvicorn.Server(uvicorn.Config(api, host='127.0.0.1', port=args.fake_api, log_level='warning'))
+        server_task = asyncio.create_task(server.serve())
+        print(f"Fake Bot API on http://127.0.0.1:{args.fake_api}/bot")
+        if args.wait:
+            print(f"Waiting {args.wait:.0f}s for the webhook to start...")
+            await asyncio.sleep(args.wait)
+
+    updates = load_updates(args.updates) if args.updates else synthetic_updates(args.synthetic, args.chats)
+    results = await post_all(updates, args.url, args.secret, args.concurrency)
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    acks = sorted(elapsed * 1000 for _, elapsed in results)
+    print(f"Posted {len(results)} updates to {args.url}: {statuses}")
+    if acks:
+        p95 = acks[min(len(acks) - 1, int(len(acks) * 0.95))]
+        print(f"Ack time: median {statistics.median(acks):.1f} ms, p95 {p95:.1f} ms, max {acks[-1]:.1f} ms")
+
+    if server is not None:
+        await asyncio.sleep(args.settle)
+        methods = {}
+        for method, _ in api.calls:
+            methods[method] = methods.get(method, 0) + 1
+        print(f"Bot API calls after {args.settle:.0f}s: {methods}")
+        server.should_exit = True
+        await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--updates', help='JSONL file of recorded updates')
+    source.add_argument('--synthetic', type=int, default=20, help='number of generated text messages')
+    parser.add_argument('--chats', type=int, default=4, help='chats used by generated messages')
+    parser.add_argument('--url', default=f"http://127.0.0.1:{TELEGRAM_CONFIG['webhook_port']}"
+                                         f"{TELEGRAM_CONFIG['webhook_path']}")
+    parser.add_argument('--secret', default=TELEGRAM_CONFIG['webhook_secret'])
+    parser.add_argument('--concurrency', type=int, default=8, help='updates posted at once')
+    parser.add_argument('--fake-api', type=int, metavar='PORT', help='serve a fake Bot API on this port')
+    parser.add_argument('--wait', type=float, default=0, help='seconds to wait before posting (with --fake-api)')
+    parser.add_argument('--settle', type=float, default=10, help='seconds to collect bot replies (with --fake-api)')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
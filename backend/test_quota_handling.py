@@ -55,8 +55,8 @@ async def test_retry_mechanism():
             
             # Call analyzer
             result = await IsItTrueAnalyzer.process_input(
-                user_input=test_case['text'],
-                source="test_script"
+                user_text=test_case['text'],
+                fresh=True
             )
             
             elapsed = time.time() - start_time
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""Make the backend packages (core, services, modules) importable from tests"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
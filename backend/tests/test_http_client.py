@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for modules.http_client - per-host limits
+"""
+
+import asyncio
+
+import httpx
+
+from modules.http_client import HttpClient
+
+
+def test_per_host_cap_and_idle_hosts_are_forgotten():
+    in_flight = {}
+    peak = {}
+
+    async def handler(request):
+        host = request.url.host
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        await asyncio.sleep(0.02)
+        in_flight[host] -= 1
+        return httpx.Response(200, content=b'ok')
+
+    async def main():
+        client = HttpClient(max_connections=10, max_per_host=2)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        urls = [f'https://site{i % 3}.example/page{i}' for i in range(12)]
+        responses = await asyncio.gather(*(client.request('GET', url) for url in urls))
+        hosts_left = dict(client._hosts)
+        await client._client.aclose()
+        return responses, hosts_left
+
+    responses, hosts_left = asyncio.run(main())
+    assert all(body == b'ok' for _, body in responses)
+    assert max(peak.values()) == 2
+    assert hosts_left == {}
+
+
+def test_failed_request_releases_its_host():
+    async def handler(request):
+        raise httpx.ConnectError('refused', request=request)
+
+    async def main():
+        client = HttpClient(max_connections=10, max_per_host=1)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        for _ in range(3):
+            try:
+                await client.request('GET', 'https://down.example/')
+            except httpx.ConnectError:
+                pass
+        hosts_left = dict(client._hosts)
+        await client._client.aclose()
+        return hosts_left
+
+    assert asyncio.run(main()) == {}
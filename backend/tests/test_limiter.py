@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for core.limiter - one slot pool shared by threads and coroutines
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.limiter import ConcurrencyLimiter
+
+
+def test_rejects_empty_pool():
+    with pytest.raises(ValueError):
+        ConcurrencyLimiter(0)
+
+
+def test_threads_never_exceed_the_cap():
+    limiter = ConcurrencyLimiter(2)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def work():
+        with limiter:
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert peak[0] == 2
+    stats = limiter.stats()
+    assert stats['in_flight'] == 0
+    assert stats['acquired'] == 8
+    assert stats['queued'] >= 6
+
+
+def test_thread_timeout_gives_up_its_place():
+    limiter = ConcurrencyLimiter(1)
+    limiter.acquire()
+
+    assert limiter.acquire(timeout=0.05) is False
+    assert limiter.stats()['waiting'] == 0
+    limiter.release()
+    assert limiter.acquire(timeout=0) is True
+    limiter.release()
+
+
+def test_waiters_are_served_in_order():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    async def work(name):
+        async with limiter:
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(work(i) for i in range(5)))
+
+    asyncio.run(main())
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_cancelled_async_waiter_does_not_leak_a_slot():
+    limiter = ConcurrencyLimiter(1)
+
+    async def main():
+        await limiter.acquire_async()
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        await asyncio.wait_for(limiter.acquire_async(), 1)
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_release_from_a_thread_wakes_a_coroutine():
+    limiter = ConcurrencyLimiter(1)
+    limiter.acquire()
+
+    async def main():
+        waiter = asyncio.create_task(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await asyncio.to_thread(limiter.release)
+        await asyncio.wait_for(waiter, 1)
+        limiter.release()
+
+    asyncio.run(main())
+    assert limiter.stats()['in_flight'] == 0
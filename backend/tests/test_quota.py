@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for core.quota - SQLite token buckets shared across processes
+"""
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from core.quota import QuotaExceeded, QuotaGovernor, is_quota_error, retry_after_from_error
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'quota.sqlite3')
+
+
+def test_rejects_non_positive_limits(db_path):
+    with pytest.raises(ValueError):
+        QuotaGovernor(db_path, 0, 1000)
+
+
+def test_grants_within_budget_and_rejects_past_it(db_path):
+    governor = QuotaGovernor(db_path, requests_per_minute=2, tokens_per_minute=1000)
+    governor.acquire(100, max_wait=0)
+    governor.acquire(100, max_wait=0)
+
+    with pytest.raises(QuotaExceeded) as excinfo:
+        governor.acquire(100, max_wait=0)
+    # One request refills every 30 s at 2 req/min
+    assert 25 < excinfo.value.retry_after <= 30
+    assert governor.state()['rejected'] == 1
+
+
+def test_waits_for_the_bucket_to_refill(db_path):
+    # 6000 tokens/min = 100 tokens/s
+    governor = QuotaGovernor(db_path, requests_per_minute=100, tokens_per_minute=6000)
+    governor.acquire(6000, max_wait=0)
+
+    start = time.monotonic()
+    governor.acquire(10, max_wait=1)
+    assert time.monotonic() - start >= 0.05
+    assert governor.state()['throttled'] == 1
+
+
+def test_token_bucket_and_settle(db_path):
+    governor = QuotaGovernor(db_path, requests_per_minute=100, tokens_per_minute=1000)
+    governor.acquire(900, max_wait=0)
+    with pytest.raises(QuotaExceeded):
+        governor.acquire(500, max_wait=0)
+
+    # The call used far less than estimated: the difference comes back
+    governor.settle(900, 100)
+    governor.acquire(500, max_wait=0)
+
+
+def test_penalize_blocks_every_process(db_path):
+    first = QuotaGovernor(db_path, requests_per_minute=100, tokens_per_minute=1000)
+    second = QuotaGovernor(db_path, requests_per_minute=100, tokens_per_minute=1000)
+    first.penalize(20)
+
+    with pytest.raises(QuotaExceeded) as excinfo:
+        second.acquire(0, max_wait=0)
+    assert excinfo.value.retry_after > 19
+    assert second.state()['cooldown_seconds'] > 19
+
+
+def test_budget_is_shared_through_the_database(db_path):
+    first = QuotaGovernor(db_path, requests_per_minute=3, tokens_per_minute=1000)
+    second = QuotaGovernor(db_path, requests_per_minute=3, tokens_per_minute=1000)
+    first.acquire(0, max_wait=0)
+    second.acquire(0, max_wait=0)
+    first.acquire(0, max_wait=0)
+
+    with pytest.raises(QuotaExceeded):
+        second.acquire(0, max_wait=0)
+
+
+def test_async_acquire_keeps_the_loop_running_while_the_database_is_locked(db_path):
+    governor = QuotaGovernor(db_path, requests_per_minute=100, tokens_per_minute=1000)
+    locked = threading.Event()
+
+    def hold_lock():
+        connection = sqlite3.connect(db_path)
+        connection.execute("BEGIN EXCLUSIVE")
+        locked.set()
+        time.sleep(0.5)
+        connection.commit()
+        connection.close()
+
+    async def main():
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        await asyncio.to_thread(locked.wait)
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await governor.acquire_async(10, max_wait=0)
+        await governor.settle_async(10, 5)
+        ticker.cancel()
+        await asyncio.to_thread(holder.join)
+        return ticks
+
+    # The loop kept ticking for the ~0.5 s the write lock was held
+    assert asyncio.run(main()) >= 20
+
+
+def test_quota_error_helpers():
+    assert is_quota_error(RuntimeError("429 Resource has been exhausted"))
+    assert not is_quota_error(RuntimeError("500 internal error"))
+    assert retry_after_from_error("Please retry in 37.5s") == 37.5
+    assert retry_after_from_error("boom") is None
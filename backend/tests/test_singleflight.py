@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for core.singleflight - coalescing across threads and coroutines
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+
+def _slow(result, delay=0.2, calls=None):
+    def fn():
+        if calls is not None:
+            calls.append(threading.get_ident())
+        time.sleep(delay)
+        return result
+    return fn
+
+
+def _slow_async(result, delay=0.2, calls=None):
+    async def fn():
+        if calls is not None:
+            calls.append(asyncio.current_task())
+        await asyncio.sleep(delay)
+        return result
+    return fn
+
+
+def _in_threads(count, target):
+    results = [None] * count
+
+    def run(i):
+        try:
+            results[i] = target()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = _in_threads(5, lambda: flight.do('k', _slow('r', calls=calls)))
+
+    assert results == ['r'] * 5
+    assert len(calls) == 1
+    assert flight.stats()['leaders'] == 1
+    assert flight.stats()['coalesced'] == 4
+    assert flight.in_flight() == 0
+
+
+def test_thread_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    def fail():
+        time.sleep(0.2)
+        raise ValueError('boom')
+
+    results = _in_threads(3, lambda: flight.do('k', fail))
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.in_flight() == 0
+
+
+def test_thread_waiter_timeout_leaves_leader_running():
+    flight = SingleFlight(wait_timeout=0.05)
+    leader = threading.Thread(target=flight.do, args=('k', _slow('r', delay=0.3)))
+    leader.start()
+    time.sleep(0.05)
+
+    with pytest.raises(TimeoutError):
+        flight.do('k', _slow('other'))
+    leader.join()
+    assert flight.stats()['timeouts'] == 1
+    assert flight.in_flight() == 0
+
+
+def test_coroutines_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async('k', _slow_async('r', calls=calls)) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['r'] * 5
+    assert len(calls) == 1
+
+
+def test_coroutine_error_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.1)
+        raise ValueError('boom')
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async('k', fail) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in asyncio.run(main()))
+    assert flight.in_flight() == 0
+
+
+def test_coroutine_waiter_timeout_leaves_leader_running():
+    flight = SingleFlight(wait_timeout=0.05)
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('r')))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            await flight.do_async('k', _slow_async('other'))
+        return await leader
+
+    assert asyncio.run(main()) == 'r'
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    flight = SingleFlight()
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('r')))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async('k', _slow_async('other')))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(main()) == 'r'
+
+
+def test_waiter_takes_over_from_cancelled_leader():
+    flight = SingleFlight()
+    calls = []
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('leader', calls=calls)))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do_async('k', _slow_async('waiter', calls=calls)))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == 'waiter'
+    assert len(calls) == 2
+    assert flight.in_flight() == 0
+
+
+def test_thread_waits_for_coroutine_leader():
+    flight = SingleFlight()
+    calls = []
+    thread_result = []
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('async', calls=calls)))
+        await asyncio.sleep(0.05)
+        thread = threading.Thread(target=lambda: thread_result.append(flight.do('k', _slow('sync', calls=calls))))
+        thread.start()
+        result = await leader
+        await asyncio.to_thread(thread.join)
+        return result
+
+    assert asyncio.run(main()) == 'async'
+    assert thread_result == ['async']
+    assert len(calls) == 1
+
+
+def test_coroutine_waits_for_thread_leader():
+    flight = SingleFlight()
+    calls = []
+    thread_result = []
+    thread = threading.Thread(target=lambda: thread_result.append(flight.do('k', _slow('sync', calls=calls))))
+    thread.start()
+    time.sleep(0.05)
+
+    result = asyncio.run(flight.do_async('k', _slow_async('async', calls=calls)))
+    thread.join()
+
+    assert result == 'sync'
+    assert thread_result == ['sync']
+    assert len(calls) == 1
+
+
+def test_thread_takes_over_from_cancelled_coroutine_leader():
+    flight = SingleFlight()
+    thread_result = []
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('async')))
+        await asyncio.sleep(0.05)
+        thread = threading.Thread(target=lambda: thread_result.append(flight.do('k', _slow('sync', delay=0.05))))
+        thread.start()
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(main())
+    assert thread_result == ['sync']
+
+
+def test_sync_call_on_leader_loop_runs_on_its_own():
+    flight = SingleFlight()
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('k', _slow_async('async')))
+        await asyncio.sleep(0)
+        # Waiting here would block the loop the leader needs to finish
+        assert flight.do('k', lambda: 'sync') == 'sync'
+        return await leader
+
+    assert asyncio.run(main()) == 'async'